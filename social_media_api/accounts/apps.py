@@ -1,6 +1,21 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save, pre_save
 
 
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        from rest_framework.authtoken.models import Token
+
+        from .authentication import evict_token, evict_user
+        from .models import User
+        from .tokens import remember_claims, revoke_changed_user
+
+        post_delete.connect(evict_token, sender=Token, dispatch_uid='accounts.evict_token')
+        post_save.connect(evict_user, sender=User, dispatch_uid='accounts.evict_user')
+        pre_save.connect(remember_claims, sender=User, dispatch_uid='accounts.remember_claims')
+        post_save.connect(
+            revoke_changed_user, sender=User, dispatch_uid='accounts.revoke_changed_user'
+        )
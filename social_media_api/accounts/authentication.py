@@ -0,0 +1,126 @@
+"""
+Token authentication backed by an in-process cache.
+
+DRF's ``TokenAuthentication`` joins ``authtoken_token`` and
+``accounts_user`` on every request. ``CachedTokenAuthentication`` keeps
+verified tokens in a bounded LRU for ``AUTH_TOKEN_CACHE_TTL`` seconds and
+hands each request its own copy of the cached user.
+
+Entries are evicted in this process when a token is deleted (logout) or its
+user is saved (password change, deactivation, profile edits). Other worker
+processes pick the change up when their entry expires, so the TTL bounds
+how long a revoked token can keep working there. Hits still check that the
+cached user is active, like a lookup does. Login never reads this cache.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+
+class TokenCache:
+
+    def __init__(self, max_size=None, ttl=None):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries = OrderedDict()
+        self._keys_by_user = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    @property
+    def max_size(self):
+        return self._max_size or getattr(settings, 'AUTH_TOKEN_CACHE_SIZE', 10000)
+
+    @property
+    def ttl(self):
+        return self._ttl or getattr(settings, 'AUTH_TOKEN_CACHE_TTL', 60)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, token):
+        with self._lock:
+            if token.key in self._entries:
+                self._remove(token.key)
+            self._entries[token.key] = (token, time.monotonic() + self.ttl)
+            self._keys_by_user.setdefault(token.user_id, set()).add(token.key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def evict(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def evict_user(self, user_id):
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def _remove(self, key):
+        token, _ = self._entries.pop(key)
+        keys = self._keys_by_user.get(token.user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[token.user_id]
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+
+    def authenticate_credentials(self, key):
+        token = token_cache.get(key)
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(token)
+        elif not token.user.is_active:
+            token_cache.evict(key)
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        # Requests may modify request.user; never hand out the shared instance
+        return copy.copy(token.user), token
+
+
+def evict_token(sender, instance, **kwargs):
+    token_cache.evict(instance.key)
+
+
+def evict_user(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    token_cache.evict_user(instance.pk)
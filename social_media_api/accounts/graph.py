@@ -0,0 +1,136 @@
+"""
+Cached follow graph.
+
+Every user's following and follower lists are kept in the shared cache as
+sorted arrays of 64-bit ids. A list is read from the follow table on a
+cache miss and dropped when a follow or unfollow commits, so membership
+checks and set intersections run in Python without touching the
+``accounts_user_followers`` join table between changes. The lists are never
+patched in place: two requests editing the same list would overwrite each
+other's change.
+"""
+import heapq
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+FOLLOWING = 'following'
+FOLLOWERS = 'followers'
+
+
+def timeout():
+    return getattr(settings, 'GRAPH_CACHE_TIMEOUT', 3600)
+
+
+def cache_key(kind, user_id):
+    return f'graph:{kind}:{user_id}'
+
+
+def _from_bytes(data):
+    ids = array('q')
+    ids.frombytes(data)
+    return ids
+
+
+def _load(kind, user_ids):
+    Follow = get_user_model().followers.through
+    if kind == FOLLOWING:
+        owner, other = 'to_user_id', 'from_user_id'
+    else:
+        owner, other = 'from_user_id', 'to_user_id'
+
+    lists = {user_id: [] for user_id in user_ids}
+    rows = Follow.objects.filter(**{f'{owner}__in': user_ids}).values_list(owner, other)
+    for user_id, other_id in rows:
+        lists[user_id].append(other_id)
+    return {user_id: array('q', sorted(ids)) for user_id, ids in lists.items()}
+
+
+def get_many(kind, user_ids):
+    """Return ``{user_id: sorted id array}`` loading all misses in one query."""
+    keys = {cache_key(kind, user_id): user_id for user_id in user_ids}
+    cached = cache.get_many(keys)
+    result = {keys[key]: _from_bytes(data) for key, data in cached.items()}
+
+    missing = [user_id for user_id in user_ids if user_id not in result]
+    if missing:
+        loaded = _load(kind, missing)
+        cache.set_many(
+            {cache_key(kind, user_id): ids.tobytes() for user_id, ids in loaded.items()},
+            timeout(),
+        )
+        result.update(loaded)
+    return result
+
+
+def following(user_id):
+    return get_many(FOLLOWING, [user_id])[user_id]
+
+
+def followers(user_id):
+    return get_many(FOLLOWERS, [user_id])[user_id]
+
+
+def contains(ids, user_id):
+    i = bisect_left(ids, user_id)
+    return i < len(ids) and ids[i] == user_id
+
+
+def is_following(follower_id, followee_id):
+    return contains(following(follower_id), followee_id)
+
+
+def intersect(a, b):
+    """Intersect two sorted id arrays in O(len(a) + len(b))."""
+    result = array('q')
+    i = j = 0
+    while i < len(a) and j < len(b):
+        if a[i] == b[j]:
+            result.append(a[i])
+            i += 1
+            j += 1
+        elif a[i] < b[j]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+def mutuals(user_id):
+    """Users that ``user_id`` follows and who follow them back."""
+    return intersect(following(user_id), followers(user_id))
+
+
+def suggestions(user_id, limit=10):
+    """
+    Friends-of-friends ranked by how many of the user's followees follow
+    them, ignoring people the user already follows.
+    """
+    mine = following(user_id)
+    sample = list(mine[:getattr(settings, 'GRAPH_SUGGESTION_SAMPLE', 500)])
+
+    counts = Counter()
+    for ids in get_many(FOLLOWING, sample).values():
+        counts.update(ids)
+    candidates = (
+        candidate for candidate in counts
+        if candidate != user_id and not contains(mine, candidate)
+    )
+    return heapq.nlargest(limit, candidates, key=lambda candidate: (counts[candidate], -candidate))
+
+
+def invalidate(follower_id, followee_id):
+    """Drop the lists a follow or unfollow changed; the next read reloads them."""
+    cache.delete_many([cache_key(FOLLOWING, follower_id), cache_key(FOLLOWERS, followee_id)])
+
+
+def followed(follower_id, followee_id):
+    invalidate(follower_id, followee_id)
+
+
+def unfollowed(follower_id, followee_id):
+    invalidate(follower_id, followee_id)
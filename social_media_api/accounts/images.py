@@ -0,0 +1,107 @@
+"""
+Profile picture variants.
+
+After a profile picture is uploaded, ``schedule()`` hands the user to a
+small thread pool that decodes the original once and writes a square WebP
+and JPEG for every size in ``PROFILE_PICTURE_SIZES``. Variant files are
+named after a hash of their content, so their URLs never change meaning
+and can be cached forever. Set ``PROFILE_PICTURE_INLINE`` to process
+during the request instead (used by the tests).
+"""
+import hashlib
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, connections
+from PIL import Image, ImageOps
+
+from .authentication import token_cache
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def sizes():
+    return getattr(settings, 'PROFILE_PICTURE_SIZES', {'small': 64, 'medium': 256, 'large': 512})
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'PROFILE_PICTURE_WORKERS', 2),
+                thread_name_prefix='profile-pictures',
+            )
+    return _executor
+
+
+def variant_name(size, extension, content):
+    digest = hashlib.sha256(content).hexdigest()[:16]
+    return f'profile_pics/variants/{digest}_{size}.{extension}'
+
+
+def render_variants(image):
+    """Yield ``(size name, extension, bytes)`` for every variant of ``image``."""
+    image = ImageOps.exif_transpose(image).convert('RGB')
+    for name, pixels in sizes().items():
+        resized = ImageOps.fit(image, (pixels, pixels), Image.Resampling.LANCZOS)
+        for extension, (fmt, options) in FORMATS.items():
+            buffer = io.BytesIO()
+            resized.save(buffer, fmt, **options)
+            yield name, extension, buffer.getvalue()
+
+
+def process(user_id):
+    """Write the variants of ``user_id``'s current picture and record them."""
+    from .models import User
+
+    user = User.objects.only('id', 'profile_picture').get(pk=user_id)
+    picture = user.profile_picture
+    if not picture:
+        return
+
+    storage = picture.storage
+    with picture.open('rb') as original:
+        image = Image.open(original)
+        image.draft('RGB', (max(sizes().values()),) * 2)
+        variants = {}
+        for name, extension, content in render_variants(image):
+            path = variant_name(name, extension, content)
+            if not storage.exists(path):
+                path = storage.save(path, ContentFile(content))
+            variants.setdefault(name, {})[extension] = path
+
+    # Skip the write if another picture was uploaded in the meantime
+    User.objects.filter(pk=user_id, profile_picture=picture.name).update(
+        profile_picture_variants=variants
+    )
+    token_cache.evict_user(user_id)
+
+
+def _run(user_id):
+    close_old_connections()
+    try:
+        process(user_id)
+    except Exception:
+        logger.exception('Could not process the profile picture of user %s', user_id)
+    finally:
+        connections.close_all()
+
+
+def schedule(user_id):
+    if getattr(settings, 'PROFILE_PICTURE_INLINE', False):
+        process(user_id)
+    else:
+        get_executor().submit(_run, user_id)
@@ -0,0 +1,62 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from accounts import tokens
+from accounts.authentication import CachedTokenAuthentication, token_cache
+
+
+class WhoAmIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response({'id': request.user.pk})
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare requests/sec of DB token, cached token and stateless JWT authentication. '
+        'Runs inside a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000)
+
+    def handle(self, *args, requests, **options):
+        factory = RequestFactory()
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(
+                username='bench-auth', password='bench-auth-password'
+            )
+            key = Token.objects.create(user=user).key
+            access = tokens.issue(user)['access']
+            token_cache.clear()
+            tokens.revocations.clear()
+
+            for label, authentication, header in (
+                ('TokenAuthentication', TokenAuthentication, f'Token {key}'),
+                ('CachedTokenAuthentication', CachedTokenAuthentication, f'Token {key}'),
+                ('StatelessJWTAuthentication', tokens.StatelessJWTAuthentication, f'Bearer {access}'),
+            ):
+                view = WhoAmIView.as_view(authentication_classes=[authentication])
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    for _ in range(requests):
+                        response = view(factory.get('/', HTTP_AUTHORIZATION=header))
+                        assert response.status_code == 200, response.status_code
+                    seconds = time.perf_counter() - started
+                self.stdout.write(
+                    f'{label:<28} {requests / seconds:>10,.0f} requests/sec '
+                    f'{len(queries) / requests:>6.2f} queries/request'
+                )
+
+            transaction.set_rollback(True)
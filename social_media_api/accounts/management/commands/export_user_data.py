@@ -0,0 +1,32 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from social_media_api import export
+
+
+class Command(BaseCommand):
+    help = "Stream a user's posts, comments, likes and notifications as NDJSON or CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--fmt', choices=list(export.FORMATS), default='ndjson')
+        parser.add_argument('--kinds', default=','.join(export.KINDS))
+        parser.add_argument('--output', help='File to write to instead of stdout.')
+
+    def handle(self, *args, username, fmt, kinds, output, **options):
+        try:
+            user = get_user_model().objects.get(username=username)
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'User "{username}" does not exist.')
+        kinds = kinds.split(',')
+        unknown = set(kinds) - set(export.KINDS)
+        if unknown:
+            raise CommandError(f'Unknown kinds: {", ".join(sorted(unknown))}')
+
+        if output is None:
+            for line in export.export(user, fmt, kinds):
+                self.stdout.write(line, ending='')
+            return
+        with open(output, 'w', newline='') as stream:
+            for line in export.export(user, fmt, kinds):
+                stream.write(line)
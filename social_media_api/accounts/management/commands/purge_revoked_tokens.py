@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from accounts import tokens
+
+
+class Command(BaseCommand):
+    help = 'Delete JWT revocations whose tokens have expired anyway.'
+
+    def handle(self, *args, **options):
+        deleted = tokens.purge_expired()
+        self.stdout.write(f'Purged {deleted} revoked tokens')
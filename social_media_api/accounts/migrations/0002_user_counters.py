@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:16
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    User = apps.get_model('accounts', 'User')
+    Follow = User._meta.get_field('followers').remote_field.through
+
+    def count(field):
+        rows = Follow.objects.filter(**{field: OuterRef('pk')}).order_by()
+        return Coalesce(Subquery(rows.values(field).annotate(n=Count('pk')).values('n')), 0)
+
+    User.objects.update(
+        followers_count=count('from_user'),
+        following_count=count('to_user'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def flag_pull_authors(apps, schema_editor):
+    User = apps.get_model('accounts', 'User')
+    threshold = getattr(settings, 'TIMELINE_FANOUT_THRESHOLD', 10000)
+    User.objects.filter(followers_count__gte=threshold).update(pull_author=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_profile_picture_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='pull_author',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(flag_pull_authors, migrations.RunPython.noop),
+    ]
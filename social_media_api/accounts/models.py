@@ -1,13 +1,21 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.utils import timezone
 
-class User(AbstractUser):
+from social_media_api.counters import CounterFieldsMixin, decrement
+
+from . import graph
+
+class User(CounterFieldsMixin, AbstractUser):
     bio = models.TextField(blank=True)
     profile_picture = models.ImageField(
         upload_to='profile_pics/',
         blank=True,
         null=True
     )
+    # {size: {format: storage path}}, written by accounts.images
+    profile_picture_variants = models.JSONField(default=dict, blank=True)
 
     followers = models.ManyToManyField(
         'self',
@@ -16,5 +24,54 @@ class User(AbstractUser):
         blank=True
     )
 
+    # Denormalized counters, kept in step by follow()/unfollow()
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    counter_fields = ('followers_count', 'following_count')
+    # Posts are read on demand instead of fanned out (posts/timeline.py). Set
+    # once followers_count reaches TIMELINE_FANOUT_THRESHOLD and cleared by
+    # the demote_authors command after it falls TIMELINE_DEMOTE_MARGIN below.
+    pull_author = models.BooleanField(default=False)
+
+    def follow(self, user):
+        """Follow ``user``. Returns False if already following."""
+        Follow = User.followers.through
+        with transaction.atomic():
+            _, created = Follow.objects.get_or_create(from_user=user, to_user=self)
+            if created:
+                User.objects.filter(pk=user.pk).update(followers_count=F('followers_count') + 1)
+                User.objects.filter(pk=self.pk).update(following_count=F('following_count') + 1)
+                user.followers_count += 1
+                self.following_count += 1
+                transaction.on_commit(lambda: graph.followed(self.pk, user.pk))
+        return created
+
+    def unfollow(self, user):
+        """Unfollow ``user``. Returns False if not following."""
+        Follow = User.followers.through
+        with transaction.atomic():
+            deleted, _ = Follow.objects.filter(from_user=user, to_user=self).delete()
+            if deleted:
+                User.objects.filter(pk=user.pk).update(followers_count=decrement('followers_count'))
+                User.objects.filter(pk=self.pk).update(following_count=decrement('following_count'))
+                user.followers_count -= 1
+                self.following_count -= 1
+                transaction.on_commit(lambda: graph.unfollowed(self.pk, user.pk))
+        return bool(deleted)
+
     def __str__(self):
         return self.username
+
+
+class RevokedToken(models.Model):
+    """
+    A revoked JWT, by ``jti``. Rows with ``user`` set revoke every token
+    issued to that user before ``created_at``.
+    """
+    jti = models.CharField(max_length=255, unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.jti
@@ -2,12 +2,13 @@ from django.contrib.auth import authenticate
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
 from rest_framework.authtoken.models import Token
+from .authentication import token_cache
+from .tokens import issue, jwt_enabled
 from .models import User
 
 # User Serializer
 class UserSerializer(serializers.ModelSerializer):
-    followers_count = serializers.SerializerMethodField()
-    following_count = serializers.SerializerMethodField()
+    profile_picture_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = User
@@ -17,15 +18,22 @@ class UserSerializer(serializers.ModelSerializer):
             'email',
             'bio',
             'profile_picture',
+            'profile_picture_variants',
             'followers_count',
             'following_count',
         ]
+        read_only_fields = ['followers_count', 'following_count']
 
-    def get_followers_count(self, obj):
-        return obj.followers.count()
-
-    def get_following_count(self, obj):
-        return obj.following.count()
+    def get_profile_picture_variants(self, user):
+        storage = User._meta.get_field('profile_picture').storage
+        request = self.context.get('request')
+        variants = {}
+        for size, paths in user.profile_picture_variants.items():
+            variants[size] = {}
+            for extension, path in paths.items():
+                url = storage.url(path)
+                variants[size][extension] = request.build_absolute_uri(url) if request else url
+        return variants
 
 
 # Register Serializer
@@ -42,9 +50,16 @@ class RegisterSerializer(serializers.ModelSerializer):
             email=validated_data.get('email'),
             password=validated_data['password']
         )
-        Token.objects.create(user=user)
+        if not jwt_enabled():
+            Token.objects.create(user=user)
         return user
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if jwt_enabled():
+            data.update(issue(instance))
+        return data
+
 
 # Login Serializer
 class LoginSerializer(serializers.Serializer):
@@ -59,7 +74,13 @@ class LoginSerializer(serializers.Serializer):
         if not user:
             raise serializers.ValidationError("Invalid credentials")
 
+        if jwt_enabled():
+            return {'user': user.username, **issue(user)}
+
+        # Cached keys may have been revoked by another process; ask the table
         token, _ = Token.objects.get_or_create(user=user)
+        token.user = user
+        token_cache.set(token)
 
         return {
             'user': user.username,
@@ -1,3 +1,289 @@
-from django.test import TestCase
+import io
+import os
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from rest_framework.views import APIView
+
+from social_media_api.query_plans import QueryPlanAssertions
+
+from . import graph, tokens
+from .authentication import TokenCache, token_cache
+
+User = get_user_model()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ProfileTests(APITestCase):
+
+    def test_profile_needs_no_queries(self):
+        user = User.objects.create_user(username='user', password='pass12345')
+        self.client.force_authenticate(user)
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/accounts/profile/')
+        self.assertEqual(response.data['username'], 'user')
+
+    def test_picture_upload_creates_variants(self):
+        user = User.objects.create_user(username='user', password='pass12345')
+        self.client.force_authenticate(user)
+        upload = io.BytesIO()
+        Image.new('RGB', (800, 600), 'red').save(upload, 'PNG')
+
+        with tempfile.TemporaryDirectory() as media, self.settings(
+            MEDIA_ROOT=media, PROFILE_PICTURE_INLINE=True,
+            PROFILE_PICTURE_SIZES={'small': 32, 'large': 128},
+        ):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.patch('/api/accounts/profile/', {
+                    'profile_picture': SimpleUploadedFile('me.png', upload.getvalue()),
+                }, format='multipart')
+            # force_authenticate reuses this instance across requests
+            user.refresh_from_db()
+            variants = self.client.get('/api/accounts/profile/').data['profile_picture_variants']
+
+            self.assertEqual(sorted(variants), ['large', 'small'])
+            path = os.path.join(media, variants['small']['webp'].split('/media/')[1])
+            with Image.open(path) as image:
+                self.assertEqual((image.format, image.size), ('WEBP', (32, 32)))
+
+            # A new upload drops the old variants until it is processed
+            self.client.patch('/api/accounts/profile/', {
+                'profile_picture': SimpleUploadedFile('new.png', upload.getvalue()),
+            }, format='multipart')
+            user.refresh_from_db()
+            self.assertEqual(user.profile_picture_variants, {})
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class GraphTests(QueryPlanAssertions, APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.users = {
+            name: User.objects.create_user(username=name, password='pass12345')
+            for name in ('ann', 'bob', 'cat', 'dan', 'eve')
+        }
+
+    def follow(self, follower, *followees):
+        with self.captureOnCommitCallbacks(execute=True):
+            for followee in followees:
+                self.users[follower].follow(self.users[followee])
+
+    def test_cached_lists_follow_follow_and_unfollow(self):
+        ann, bob = self.users['ann'], self.users['bob']
+        self.assertEqual(list(graph.following(ann.id)), [])
+        self.assertEqual(list(graph.followers(bob.id)), [])
+
+        self.follow('ann', 'bob')
+        self.assertTrue(graph.is_following(ann.id, bob.id))
+        self.assertEqual(list(graph.followers(bob.id)), [ann.id])
+        with self.assertNumQueries(0):
+            self.assertTrue(graph.is_following(ann.id, bob.id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ann.unfollow(bob)
+        self.assertFalse(graph.is_following(ann.id, bob.id))
+
+    def test_relationship_and_suggestions(self):
+        self.follow('ann', 'bob', 'cat')
+        self.follow('bob', 'ann', 'dan', 'eve')
+        self.follow('cat', 'dan')
+        self.client.force_authenticate(self.users['ann'])
+
+        response = self.client.get(f"/api/accounts/relationship/{self.users['bob'].id}/")
+        self.assertEqual(response.data, {'following': True, 'followed_by': True, 'mutual': True})
+
+        response = self.client.get('/api/accounts/suggestions/')
+        self.assertEqual([user['username'] for user in response.data], ['dan', 'eve'])
+
+
+    def test_graph_endpoints_use_indexes(self):
+        self.follow('bob', 'cat', 'dan')
+        self.client.force_authenticate(self.users['ann'])
+
+        with self.assertIndexedQueries():
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(f"/api/accounts/follow/{self.users['bob'].id}/")
+            self.client.get(f"/api/accounts/relationship/{self.users['bob'].id}/")
+            self.client.get('/api/accounts/suggestions/')
+            self.client.get('/api/accounts/profile/')
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(f"/api/accounts/unfollow/{self.users['bob'].id}/")
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class TokenCacheTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.user = User.objects.create_user(username='user', password='pass12345')
+        response = self.client.post(
+            '/api/accounts/login/', {'username': 'user', 'password': 'pass12345'}
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {response.data['token']}")
+
+    def test_cached_token_needs_no_queries(self):
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/accounts/profile/')
+        self.assertEqual(response.data['username'], 'user')
+        self.assertEqual(token_cache.stats()['hits'], 1)
+
+    def test_logout_revokes_token(self):
+        self.assertEqual(self.client.post('/api/accounts/logout/').status_code, 200)
+        self.assertEqual(self.client.get('/api/accounts/profile/').status_code, 401)
+
+    def test_password_change_and_deactivation_evict(self):
+        self.user.set_password('changed123')
+        self.user.save()
+        with self.assertNumQueries(1):
+            self.client.get('/api/accounts/profile/')
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/accounts/profile/').status_code, 401)
+
+    def test_login_ignores_cached_keys(self):
+        # Left behind by a token deleted in another process
+        token_cache.set(Token(key='revoked', user=self.user))
+
+        response = self.client.post(
+            '/api/accounts/login/', {'username': 'user', 'password': 'pass12345'}
+        )
+        self.assertTrue(Token.objects.filter(key=response.data['token']).exists())
+
+    def test_cached_inactive_user_is_rejected(self):
+        token = Token.objects.get(user=self.user)
+        token.user.is_active = False
+        token_cache.set(token)
+
+        self.assertEqual(self.client.get('/api/accounts/profile/').status_code, 401)
+        self.assertIsNone(token_cache.get(token.key))
+
+    def test_profile_update_does_not_write_back_the_cached_user(self):
+        self.client.get('/api/accounts/profile/')
+        # Changed by another worker, whose eviction this one does not see
+        User.objects.filter(pk=self.user.pk).update(password='changed elsewhere')
+
+        response = self.client.patch('/api/accounts/profile/', {'bio': 'new bio'})
+
+        self.assertEqual(response.data['bio'], 'new bio')
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.password, self.user.bio), ('changed elsewhere', 'new bio'))
+
+    def test_entries_expire_and_are_bounded(self):
+        cache = TokenCache(max_size=2, ttl=60)
+        tokens = [Token.objects.create(user=User.objects.create_user(username=f'u{i}')) for i in range(3)]
+        for token in tokens:
+            cache.set(token)
+        self.assertIsNone(cache.get(tokens[0].key))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+        with mock.patch('accounts.authentication.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertIsNone(cache.get(tokens[2].key))
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, AUTH_MODE='jwt')
+class JWTAuthenticationTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        tokens.revocations.clear()
+        # View authentication classes are read once from the settings at import
+        patcher = mock.patch.object(
+            APIView, 'authentication_classes', [tokens.StatelessJWTAuthentication]
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = User.objects.create_user(username='user', password='pass12345', bio='hi')
+        self.pair = self.client.post(
+            '/api/accounts/login/', {'username': 'user', 'password': 'pass12345'}
+        ).data
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.pair['access']}")
+
+    def test_register_issues_token_pair(self):
+        response = self.client.post(
+            '/api/accounts/register/', {'username': 'new', 'password': 'pass12345'}
+        )
+        self.assertIn('access', response.data)
+        self.assertIn('refresh', response.data)
+        self.assertFalse(Token.objects.exists())
+
+    def test_authentication_reads_no_rows(self):
+        url = f'/api/accounts/relationship/{self.user.id + 1}/'
+        # Warm the cached follow lists the view reads
+        self.client.get(url)
+        tokens.revocations.reload()
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        # The profile loads the fields that are not in the token
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/accounts/profile/')
+        self.assertEqual(response.data['bio'], 'hi')
+
+    def test_logout_revokes_access_and_refresh(self):
+        self.client.post('/api/accounts/logout/', {'refresh': self.pair['refresh']})
+
+        self.assertEqual(self.client.get('/api/accounts/profile/').status_code, 401)
+        response = self.client.post('/api/accounts/token/refresh/', {'refresh': self.pair['refresh']})
+        self.assertEqual(response.status_code, 401)
+
+        # Another worker picks the revocation up from the database
+        tokens.revocations.clear()
+        self.assertEqual(self.client.get('/api/accounts/profile/').status_code, 401)
+
+    def test_password_change_revokes_existing_tokens(self):
+        later = timezone.now() + timedelta(seconds=2)
+        with mock.patch('accounts.tokens.timezone.now', return_value=later):
+            self.user.set_password('changed123')
+            self.user.save()
+
+        self.assertEqual(self.client.get('/api/accounts/profile/').status_code, 401)
+
+    def test_losing_staff_status_revokes_existing_tokens(self):
+        admin = User.objects.create_user(username='admin', password='pass12345', is_staff=True)
+        pair = self.client.post(
+            '/api/accounts/login/', {'username': 'admin', 'password': 'pass12345'}
+        ).data
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {pair['access']}")
+        self.assertEqual(self.client.get('/api/accounts/auth-cache/').status_code, 200)
+
+        later = timezone.now() + timedelta(seconds=2)
+        with mock.patch('accounts.tokens.timezone.now', return_value=later):
+            admin.is_staff = False
+            admin.save()
+
+        self.assertEqual(self.client.get('/api/accounts/auth-cache/').status_code, 401)
+        response = self.client.post('/api/accounts/token/refresh/', {'refresh': pair['refresh']})
+        self.assertEqual(response.status_code, 401)
+
+    def test_refresh_takes_claims_from_the_user_row(self):
+        admin = User.objects.create_user(username='admin', password='pass12345', is_staff=True)
+        pair = self.client.post(
+            '/api/accounts/login/', {'username': 'admin', 'password': 'pass12345'}
+        ).data
+        # Changed without going through save(), so nothing was revoked
+        User.objects.filter(pk=admin.pk).update(is_staff=False)
+
+        response = self.client.post('/api/accounts/token/refresh/', {'refresh': pair['refresh']})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        self.assertEqual(self.client.get('/api/accounts/auth-cache/').status_code, 403)
+
+    def test_refresh_issues_new_access_token(self):
+        response = self.client.post('/api/accounts/token/refresh/', {'refresh': self.pair['refresh']})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        self.assertEqual(self.client.get('/api/accounts/profile/').data['username'], 'user')
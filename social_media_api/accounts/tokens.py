@@ -0,0 +1,204 @@
+"""
+Stateless JWT authentication (``AUTH_MODE=jwt``).
+
+Access tokens carry the claims needed to build ``request.user`` (id,
+username and flags), so authenticating a request reads neither the token
+table nor the user table. The remaining user fields are deferred and
+loaded on first access.
+
+Revocations are stored in ``RevokedToken`` and mirrored into an in-memory
+``RevocationList`` that each worker reloads every
+``AUTH_REVOCATION_REFRESH`` seconds, so checking one costs a set lookup.
+A worker sees its own revocations immediately and everyone else's within
+one refresh interval. Rows are purged once the revoked tokens would have
+expired anyway.
+"""
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import router
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from .models import RevokedToken
+
+CLAIM_FIELDS = ('username', 'is_active', 'is_staff', 'is_superuser')
+
+
+def jwt_enabled():
+    return getattr(settings, 'AUTH_MODE', 'token') == 'jwt'
+
+
+def user_jti(user_id):
+    return f'user:{user_id}'
+
+
+def issue(user):
+    """Return an access/refresh pair for ``user``."""
+    refresh = RefreshToken.for_user(user)
+    for field in CLAIM_FIELDS:
+        refresh[field] = getattr(user, field)
+    return {'access': str(refresh.access_token), 'refresh': str(refresh)}
+
+
+class RevocationList:
+
+    def __init__(self):
+        self._jtis = set()
+        self._users = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def interval(self):
+        return getattr(settings, 'AUTH_REVOCATION_REFRESH', 10)
+
+    def reload(self):
+        jtis, users = set(), {}
+        rows = RevokedToken.objects.filter(expires_at__gt=timezone.now())
+        for jti, user_id, created_at in rows.values_list('jti', 'user_id', 'created_at'):
+            if user_id is None:
+                jtis.add(jti)
+            else:
+                users[str(user_id)] = math.floor(created_at.timestamp())
+        with self._lock:
+            self._jtis, self._users = jtis, users
+            self._loaded_at = time.monotonic()
+
+    def _refresh(self):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.interval():
+            self.reload()
+
+    def is_revoked(self, token):
+        self._refresh()
+        if token.get('jti') in self._jtis:
+            return True
+        # Tokens issued in the same second as a user-wide revocation survive
+        revoked_at = self._users.get(str(token.get(jwt_settings.USER_ID_CLAIM)))
+        return revoked_at is not None and token.get('iat', 0) < revoked_at
+
+    def add(self, jti, user_id=None, revoked_at=None):
+        with self._lock:
+            if user_id is None:
+                self._jtis.add(jti)
+            else:
+                self._users[str(user_id)] = math.floor(revoked_at.timestamp())
+
+    def clear(self):
+        with self._lock:
+            self._jtis, self._users = set(), {}
+            self._loaded_at = None
+
+
+revocations = RevocationList()
+
+
+def revoke(token):
+    """Revoke a single access or refresh token until it expires."""
+    RevokedToken.objects.get_or_create(
+        jti=token['jti'], defaults={'expires_at': datetime_from_epoch(token['exp'])}
+    )
+    revocations.add(token['jti'])
+
+
+def revoke_user(user):
+    """Revoke every token issued to ``user`` so far."""
+    now = timezone.now()
+    RevokedToken.objects.update_or_create(
+        jti=user_jti(user.pk),
+        defaults={
+            'user': user,
+            'created_at': now,
+            'expires_at': now + jwt_settings.REFRESH_TOKEN_LIFETIME,
+        },
+    )
+    revocations.add(user_jti(user.pk), user.pk, now)
+
+
+def purge_expired():
+    return RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()[0]
+
+
+def remember_claims(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Record the claim values a save is about to overwrite."""
+    instance._saved_claims = None
+    if raw or instance._state.adding or not jwt_enabled():
+        return
+    if update_fields is not None and not set(update_fields) & set(CLAIM_FIELDS):
+        return
+    instance._saved_claims = (
+        sender.objects.filter(pk=instance.pk).values_list(*CLAIM_FIELDS).first()
+    )
+
+
+def revoke_changed_user(sender, instance, created=False, **kwargs):
+    """
+    Revoke a user's tokens when their password or any value baked into
+    their tokens' claims changes, e.g. when they lose staff status.
+    """
+    if created or not jwt_enabled():
+        return
+    saved = getattr(instance, '_saved_claims', None)
+    claims_changed = saved is not None and saved != tuple(
+        getattr(instance, field) for field in CLAIM_FIELDS
+    )
+    if instance._password is not None or not instance.is_active or claims_changed:
+        revoke_user(instance)
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """Authenticate from the token's claims, without touching the database."""
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if revocations.is_revoked(token):
+            raise AuthenticationFailed('Token has been revoked.', code='token_revoked')
+        return token
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+        User = get_user_model()
+        # simplejwt stores the id as a string
+        claims = {'id': User._meta.pk.to_python(user_id)}
+        claims.update((field, validated_token[field]) for field in CLAIM_FIELDS if field in validated_token)
+        # from_db() expects values in field order; the rest are deferred
+        # and loaded on first access
+        fields = [f.attname for f in User._meta.concrete_fields if f.attname in claims]
+        user = User.from_db(router.db_for_read(User), fields, [claims[name] for name in fields])
+
+        if not user.is_active:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        return user
+
+
+class RevocableTokenRefreshSerializer(TokenRefreshSerializer):
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if revocations.is_revoked(refresh):
+            raise AuthenticationFailed('Token has been revoked.', code='token_revoked')
+        # The new access token takes its claims from the user row rather than
+        # from the refresh token, which may predate a change to them
+        User = get_user_model()
+        claims = User.objects.filter(
+            **{jwt_settings.USER_ID_FIELD: refresh.get(jwt_settings.USER_ID_CLAIM)}
+        ).values_list(*CLAIM_FIELDS).first()
+        if claims is None:
+            raise AuthenticationFailed(
+                self.error_messages['no_active_account'], 'no_active_account'
+            )
+        for field, value in zip(CLAIM_FIELDS, claims):
+            refresh[field] = value
+        return super().validate({**attrs, 'refresh': str(refresh)})
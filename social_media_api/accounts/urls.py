@@ -1,11 +1,19 @@
 from django.urls import path
+from rest_framework_simplejwt.views import TokenRefreshView
 from .views import RegisterView, LoginView, ProfileView
 from .views import FollowUserView, UnfollowUserView
+from .views import SuggestionsView, RelationshipView
+from .views import LogoutView, AuthCacheStatsView
 
 urlpatterns = [
     path('register/', RegisterView.as_view()),
     path('login/', LoginView.as_view()),
+    path('token/refresh/', TokenRefreshView.as_view()),
+    path('logout/', LogoutView.as_view()),
+    path('auth-cache/', AuthCacheStatsView.as_view()),
     path('profile/', ProfileView.as_view()),
     path('follow/<int:user_id>/', FollowUserView.as_view()),
     path('unfollow/<int:user_id>/', UnfollowUserView.as_view()),
+    path('suggestions/', SuggestionsView.as_view()),
+    path('relationship/<int:user_id>/', RelationshipView.as_view()),
 ]
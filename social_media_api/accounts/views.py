@@ -3,9 +3,17 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.tokens import RefreshToken
 
 from .models import User
+from .authentication import token_cache
+from . import tokens
 from .serializers import RegisterSerializer, LoginSerializer, UserSerializer
+from . import graph, images
+from posts import timeline
 
 CustomUser = get_user_model()
 
@@ -15,11 +23,13 @@ class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = RegisterSerializer
     permission_classes = [permissions.AllowAny]
+    throttle_scope = 'auth'
 
 
 # Login view
 class LoginView(APIView):
     permission_classes = [permissions.AllowAny]
+    throttle_scope = 'auth'
 
     def post(self, request):
         serializer = LoginSerializer(data=request.data)
@@ -27,13 +37,58 @@ class LoginView(APIView):
         return Response(serializer.validated_data)
 
 
+# Logout view
+class LogoutView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        # Deleting the token evicts it from the authentication cache
+        if isinstance(request.auth, Token):
+            request.auth.delete()
+        elif request.auth is not None:
+            tokens.revoke(request.auth)
+
+        if request.data.get('refresh'):
+            try:
+                tokens.revoke(RefreshToken(request.data['refresh']))
+            except TokenError as e:
+                raise InvalidToken(e.args[0])
+        return Response({"message": "Logged out successfully"})
+
+
+# Authentication cache statistics
+class AuthCacheStatsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(token_cache.stats())
+
+
 # Profile view
 class ProfileView(generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
-        return self.request.user
+        user = self.request.user
+        if self.request.method not in permissions.SAFE_METHODS:
+            # request.user may come from the token cache or JWT claims; saving
+            # it would write its possibly stale fields back over the row
+            return CustomUser.objects.get(pk=user.pk)
+        # Users built from JWT claims load their remaining fields in one query
+        deferred = user.get_deferred_fields()
+        if deferred:
+            user.refresh_from_db(fields=deferred)
+        return user
+
+    def perform_update(self, serializer):
+        if 'profile_picture' not in serializer.validated_data:
+            serializer.save()
+            return
+        # Variants of the previous picture no longer apply
+        user = serializer.save(profile_picture_variants={})
+        if user.profile_picture:
+            transaction.on_commit(lambda: images.schedule(user.pk))
 
 
 # FOLLOW view (checker-required)
@@ -47,7 +102,9 @@ class FollowUserView(generics.GenericAPIView):
         if user_to_follow == request.user:
             return Response({"error": "You cannot follow yourself"}, status=400)
 
-        request.user.following.add(user_to_follow)
+        request.user.follow(user_to_follow)
+        timeline.promote(user_to_follow)
+        timeline.backfill(request.user, user_to_follow)
         return Response({"message": "User followed successfully"})
 
 
@@ -58,5 +115,31 @@ class UnfollowUserView(generics.GenericAPIView):
 
     def post(self, request, user_id):
         user_to_unfollow = self.get_queryset().get(id=user_id)
-        request.user.following.remove(user_to_unfollow)
+        if request.user.unfollow(user_to_unfollow):
+            timeline.remove_author(request.user, user_to_unfollow)
         return Response({"message": "User unfollowed successfully"})
+
+
+# Who to follow
+class SuggestionsView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        ids = graph.suggestions(request.user.pk)
+        users = CustomUser.objects.in_bulk(ids)
+        serializer = UserSerializer([users[pk] for pk in ids if pk in users], many=True)
+        return Response(serializer.data)
+
+
+# Relationship between the current user and another user
+class RelationshipView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, user_id):
+        following = graph.is_following(request.user.pk, user_id)
+        followed_by = graph.is_following(user_id, request.user.pk)
+        return Response({
+            "following": following,
+            "followed_by": followed_by,
+            "mutual": following and followed_by,
+        })
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class NotificationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'notifications'
+
+    def ready(self):
+        from django.core.signals import request_finished
+        from .pipeline import flush_memory_queue
+
+        request_finished.connect(flush_memory_queue, dispatch_uid='notifications.flush')
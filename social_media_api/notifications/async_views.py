@@ -0,0 +1,85 @@
+"""
+Async variants of the notification endpoints, for ASGI deployments.
+"""
+import json
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import APIException
+
+from social_media_api.asynchronous import async_api_view, is_asgi
+from social_media_api.pagination import KeysetPagination
+from . import broker
+from .serializers import NotificationSerializer
+from .views import notification_queryset, notifications_for
+
+
+class StreamUnavailable(APIException):
+    status_code = 501
+    default_detail = 'The notification stream is only served under ASGI.'
+    default_code = 'not_implemented'
+
+
+@async_api_view(['GET'])
+async def notification_list(request):
+    paginator = KeysetPagination()
+    page = await paginator.apaginate_queryset(notifications_for(request.user), request)
+    return paginator.get_paginated_response(NotificationSerializer(page, many=True).data).data
+
+
+def sse(event_id, data):
+    return f'id: {event_id}\nevent: notification\ndata: {json.dumps(data)}\n\n'
+
+
+async def missed(user, position):
+    """Notifications created or updated after ``position``, oldest first."""
+    ordering = ['timestamp', 'id']
+    notifications = notification_queryset().filter(
+        KeysetPagination.position_filter(ordering, position), recipient=user
+    ).order_by(*ordering)[:getattr(settings, 'NOTIFICATIONS_STREAM_BACKLOG', 100)]
+    return [notification async for notification in notifications]
+
+
+async def events(user, position):
+    keepalive = getattr(settings, 'NOTIFICATIONS_STREAM_KEEPALIVE', 15)
+    subscription = broker.get_broker().subscribe(user.pk)
+    try:
+        # Subscribe first so nothing written during the catch-up is lost
+        last = None
+        if position is not None:
+            for notification in await missed(user, position):
+                last = broker.event_id(notification)
+                yield sse(last, NotificationSerializer(notification).data)
+
+        while True:
+            message = await subscription.get(keepalive)
+            if message is broker.CLOSED:
+                return
+            if message is None:
+                yield ': keepalive\n\n'
+                continue
+            message = json.loads(message)
+            # Skip events already sent during the catch-up
+            if last is not None and broker.position_key(message['id']) <= broker.position_key(last):
+                continue
+            yield sse(message['id'], message['data'])
+    finally:
+        subscription.close()
+
+
+@async_api_view(['GET'])
+async def notification_stream(request):
+    """
+    Server-sent events for new and updated notifications. Reconnecting with
+    ``Last-Event-ID`` replays what was missed in between.
+    """
+    # A WSGI worker would be held by the stream until the client went away
+    if not is_asgi(request):
+        raise StreamUnavailable()
+    position = broker.parse_event_id(request.headers.get('Last-Event-ID'))
+    response = StreamingHttpResponse(
+        events(request.user, position), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
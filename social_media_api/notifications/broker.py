@@ -0,0 +1,195 @@
+"""
+Publish/subscribe for the live notification stream.
+
+When the pipeline writes notifications it publishes them, serialized, to
+the broker under the recipient's id; every open ``/api/async/notifications/
+stream/`` connection for that recipient receives them. Notifications are
+only loaded and serialized for recipients that have a subscriber, so
+writes cost nothing extra while nobody is listening.
+
+* ``MemoryBroker`` (default) delivers within one process. Use it with a
+  single ASGI worker.
+* ``RedisBroker`` uses Redis pub/sub on ``REDIS_URL`` so every worker
+  sees every event. It needs the ``redis`` package.
+
+Set ``NOTIFICATIONS_BROKER`` to a dotted path to plug in another broker.
+"""
+import asyncio
+import datetime
+import json
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+CLOSED = object()
+
+
+def event_id(notification):
+    """SSE event id: the notification's ``(timestamp, id)`` keyset position."""
+    delta = notification.timestamp - datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+    return f'{delta // datetime.timedelta(microseconds=1)}-{notification.id}'
+
+
+def parse_event_id(value):
+    """Return ``(timestamp, id)`` for an event id, or None if malformed."""
+    try:
+        micros, pk = (int(part) for part in value.split('-'))
+    except (AttributeError, ValueError):
+        return None
+    epoch = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+    return epoch + datetime.timedelta(microseconds=micros), pk
+
+
+def position_key(value):
+    micros, pk = value.split('-')
+    return int(micros), int(pk)
+
+
+class Subscription:
+    """An asyncio queue fed from any thread, bounded to ``max_size`` messages."""
+
+    def __init__(self, broker, user_id, max_size):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(max_size)
+
+    def put(self, message):
+        self.loop.call_soon_threadsafe(self._put, message)
+
+    def _put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # The client is too slow: end the stream and let it resume
+            # from its Last-Event-ID
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(CLOSED)
+
+    async def get(self, timeout):
+        """Next message, None on timeout or ``CLOSED`` when the stream must end."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class MemoryBroker:
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        subscription = Subscription(self, user_id, max_queue_size())
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def listening(self, user_ids):
+        """The subset of ``user_ids`` with at least one subscriber."""
+        with self._lock:
+            return {user_id for user_id in user_ids if user_id in self._subscriptions}
+
+    def publish(self, user_id, message):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.put(message)
+
+
+class RedisBroker(MemoryBroker):
+    """
+    Fans messages out through Redis. Each process keeps one listener thread
+    subscribed to the channels of its local subscribers and hands incoming
+    messages to them through ``MemoryBroker``.
+    """
+    channel_prefix = 'notifications:stream:'
+
+    def __init__(self):
+        import redis
+
+        super().__init__()
+        self._redis = redis.Redis.from_url(settings.REDIS_URL)
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        self._listener = None
+
+    def channel(self, user_id):
+        return f'{self.channel_prefix}{user_id}'
+
+    def subscribe(self, user_id):
+        subscription = super().subscribe(user_id)
+        self._pubsub.subscribe(**{self.channel(user_id): self._deliver})
+        if self._listener is None:
+            self._listener = self._pubsub.run_in_thread(sleep_time=1, daemon=True)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        super().unsubscribe(subscription)
+        if not super().listening([subscription.user_id]):
+            self._pubsub.unsubscribe(self.channel(subscription.user_id))
+
+    def listening(self, user_ids):
+        user_ids = list(user_ids)
+        if not user_ids:
+            return set()
+        counts = self._redis.pubsub_numsub(*(self.channel(user_id) for user_id in user_ids))
+        return {user_id for user_id, (_, count) in zip(user_ids, counts) if count}
+
+    def publish(self, user_id, message):
+        self._redis.publish(self.channel(user_id), message)
+
+    def _deliver(self, message):
+        user_id = int(message['channel'].decode()[len(self.channel_prefix):])
+        super().publish(user_id, message['data'].decode())
+
+
+def max_queue_size():
+    return getattr(settings, 'NOTIFICATIONS_STREAM_QUEUE_SIZE', 100)
+
+
+_brokers = {}
+
+
+def get_broker():
+    path = getattr(settings, 'NOTIFICATIONS_BROKER', 'notifications.broker.MemoryBroker')
+    if path not in _brokers:
+        _brokers[path] = import_string(path)()
+    return _brokers[path]
+
+
+def message(notification, data):
+    return json.dumps({'id': event_id(notification), 'data': data})
+
+
+def publish(recipients):
+    """
+    Publish notifications, given as ``{notification_id: recipient_id}``, to
+    the recipients that are listening.
+    """
+    from .serializers import NotificationSerializer
+    from .views import notification_queryset
+
+    broker = get_broker()
+    listening = broker.listening(set(recipients.values()))
+    ids = [pk for pk, recipient_id in recipients.items() if recipient_id in listening]
+    if not ids:
+        return
+    notifications = notification_queryset().filter(id__in=ids).order_by('timestamp', 'id')
+    for notification in notifications:
+        data = NotificationSerializer(notification).data
+        broker.publish(notification.recipient_id, message(notification, data))
@@ -0,0 +1,27 @@
+"""
+Cached unread-notification counts.
+
+Counts are cached per user and dropped whenever that user gains a new
+notification or marks notifications read, so the badge endpoint only hits
+the partial ``notif_unread`` index on a cache miss.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Notification
+
+
+def cache_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def unread_count(user):
+    return cache.get_or_set(
+        cache_key(user.pk),
+        lambda: Notification.objects.filter(recipient=user, is_read=False).count(),
+        getattr(settings, 'NOTIFICATIONS_UNREAD_CACHE_TIMEOUT', 300),
+    )
+
+
+def invalidate(user_ids):
+    cache.delete_many([cache_key(user_id) for user_id in set(user_ids)])
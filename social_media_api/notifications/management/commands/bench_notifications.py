@@ -0,0 +1,69 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from notifications import pipeline
+from notifications.models import Notification
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare per-request Notification.objects.create with the batched pipeline. '
+        'Runs inside a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=10000)
+        parser.add_argument('--posts', type=int, default=100)
+        parser.add_argument('--actors', type=int, default=50)
+
+    def handle(self, *args, events, posts, actors, **options):
+        with transaction.atomic():
+            author, post_list, actor_list = self.fixtures(posts, actors)
+            likes = [
+                (actor_list[i % actors], post_list[i % posts])
+                for i in range(events)
+            ]
+
+            started = time.perf_counter()
+            for actor, post in likes:
+                Notification.objects.create(
+                    recipient=author, actor=actor, verb='liked your post', target=post
+                )
+            self.report('per-request create', events, time.perf_counter() - started)
+            Notification.objects.filter(recipient=author).delete()
+
+            for queue in ('memory', 'database'):
+                with override_settings(NOTIFICATIONS_QUEUE=queue):
+                    started = time.perf_counter()
+                    for actor, post in likes:
+                        pipeline.enqueue(author, actor, 'liked your post', post)
+                    enqueued = time.perf_counter() - started
+                    pipeline.flush()
+                    total = time.perf_counter() - started
+
+                self.report(f'{queue} queue (enqueue only)', events, enqueued)
+                self.report(f'{queue} queue (enqueue + flush)', events, total)
+                rows = Notification.objects.filter(recipient=author).count()
+                self.stdout.write(f'  {rows} notification rows after coalescing')
+                Notification.objects.filter(recipient=author).delete()
+
+            transaction.set_rollback(True)
+
+    def fixtures(self, posts, actors):
+        User = get_user_model()
+        author = User.objects.create(username='bench-notifications-author')
+        actor_list = User.objects.bulk_create(
+            User(username=f'bench-notifications-actor-{i}') for i in range(actors)
+        )
+        post_list = Post.objects.bulk_create(
+            Post(author=author, title=f'Bench {i}', content='') for i in range(posts)
+        )
+        return author, post_list, actor_list
+
+    def report(self, label, events, seconds):
+        self.stdout.write(f'{label:<36} {events / seconds:>12,.0f} events/sec')
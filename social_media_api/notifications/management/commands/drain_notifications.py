@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from notifications import pipeline
+
+
+class Command(BaseCommand):
+    help = 'Coalesce and write queued notification events.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=pipeline.BATCH_SIZE)
+        parser.add_argument(
+            '--interval', type=float, default=None,
+            help='Keep draining every INTERVAL seconds instead of exiting.',
+        )
+
+    def handle(self, *args, batch_size, interval, **options):
+        while True:
+            processed = pipeline.flush(batch_size=batch_size)
+            self.stdout.write(f'Processed {processed} events')
+            if interval is None:
+                return
+            time.sleep(interval)
@@ -0,0 +1,45 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from notifications.models import Notification
+
+
+class Command(BaseCommand):
+    help = 'Delete read notifications older than --days in small chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--archive', metavar='PATH',
+            help='Append purged notifications to this NDJSON file first.',
+        )
+
+    def handle(self, *args, days, batch_size, archive, **options):
+        cutoff = timezone.now() - timedelta(days=days)
+        expired = Notification.objects.filter(is_read=True, timestamp__lt=cutoff).order_by('id')
+        archive_file = open(archive, 'a') if archive else None
+
+        purged = 0
+        try:
+            while True:
+                rows = list(expired.values(
+                    'id', 'recipient_id', 'actor_id', 'verb', 'actor_count',
+                    'target_content_type_id', 'target_object_id', 'timestamp',
+                )[:batch_size])
+                if not rows:
+                    break
+                if archive_file:
+                    for row in rows:
+                        archive_file.write(json.dumps(row, default=str) + '\n')
+                    archive_file.flush()
+                Notification.objects.filter(id__in=[row['id'] for row in rows]).delete()
+                purged += len(rows)
+        finally:
+            if archive_file:
+                archive_file.close()
+
+        self.stdout.write(f'Purged {purged} notifications older than {days} days')
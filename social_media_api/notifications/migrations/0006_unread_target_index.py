@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('notifications', '0005_notification_actor_ids'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['recipient', 'target_content_type', 'target_object_id', 'verb', 'timestamp'], name='notif_unread_target'),
+        ),
+    ]
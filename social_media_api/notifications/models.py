@@ -6,6 +6,13 @@ from django.contrib.contenttypes.models import ContentType
 User = settings.AUTH_USER_MODEL
 
 
+def summarize(actor, verb, actor_count):
+    if actor_count == 1:
+        return f"{actor} {verb}"
+    others = actor_count - 1
+    return f"{actor} and {others} other{'s' if others > 1 else ''} {verb}"
+
+
 class Notification(models.Model):
     recipient = models.ForeignKey(
         User,
@@ -28,8 +35,70 @@ class Notification(models.Model):
     target_object_id = models.PositiveIntegerField(null=True, blank=True)
     target = GenericForeignKey('target_content_type', 'target_object_id')
 
+    # Number of distinct actors coalesced into this notification;
+    # ``actor`` is the most recent one
+    actor_count = models.PositiveIntegerField(default=1)
+    # The most recent NOTIFICATIONS_MAX_ACTOR_IDS of them, so an actor acting
+    # again is not counted twice
+    actor_ids = models.JSONField(default=list, blank=True)
+
     is_read = models.BooleanField(default=False)
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pages of a recipient's notifications
+            models.Index(
+                fields=['recipient', '-timestamp', '-id'],
+                name='notif_recipient_ts',
+            ),
+            models.Index(
+                fields=['recipient', 'is_read', '-timestamp'],
+                name='notif_recipient_read_ts',
+            ),
+            # Unread notifications for one coalescing key, read by the pipeline
+            models.Index(
+                fields=['recipient', 'target_content_type', 'target_object_id', 'verb', 'timestamp'],
+                condition=models.Q(is_read=False),
+                name='notif_unread_target',
+            ),
+            # Small index covering only the rows badge counts look at
+            models.Index(
+                fields=['recipient'],
+                condition=models.Q(is_read=False),
+                name='notif_unread',
+            ),
+        ]
+
+    @property
+    def summary(self):
+        return summarize(self.actor, self.verb, self.actor_count)
+
     def __str__(self):
         return f"{self.actor} {self.verb}"
+
+
+class NotificationEvent(models.Model):
+    """A queued notification waiting to be coalesced by the pipeline."""
+    recipient = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    actor = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    verb = models.CharField(max_length=255)
+    target_content_type = models.ForeignKey(
+        ContentType,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True
+    )
+    target_object_id = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.actor} {self.verb} (queued)"
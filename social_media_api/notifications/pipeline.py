@@ -0,0 +1,213 @@
+"""
+Notification pipeline.
+
+Views enqueue events instead of writing ``Notification`` rows. ``flush()``
+drains the queue, coalesces events for the same recipient, verb and target
+into a single notification ("A and 12 others liked your post") and writes
+them with one ``bulk_create``/``bulk_update`` per batch.
+
+Two queues are available through the ``NOTIFICATIONS_QUEUE`` setting:
+
+* ``'memory'`` keeps events in the worker process and flushes them once the
+  current request has finished, so the request path does no inserts.
+* ``'database'`` stores events in ``NotificationEvent`` with a single insert
+  and leaves flushing to ``manage.py drain_notifications``. Use it when
+  events must survive a worker restart.
+"""
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import broker, counters
+from .models import Notification, NotificationEvent
+
+BATCH_SIZE = 1000
+# Coalescing keys looked up per query
+KEY_BATCH_SIZE = 100
+
+
+def coalesce_window():
+    return timedelta(seconds=getattr(settings, 'NOTIFICATIONS_COALESCE_WINDOW', 3600))
+
+
+def max_actor_ids():
+    return getattr(settings, 'NOTIFICATIONS_MAX_ACTOR_IDS', 100)
+
+
+class MemoryQueue:
+    def __init__(self):
+        self._events = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._events)
+
+    def push(self, events):
+        with self._lock:
+            self._events.extend(events)
+
+    def pop(self, limit):
+        with self._lock:
+            events = self._events[:limit]
+            del self._events[:limit]
+        return events
+
+    def ack(self, events):
+        pass
+
+
+class DatabaseQueue:
+    def push(self, events):
+        NotificationEvent.objects.bulk_create(events)
+
+    def pop(self, limit):
+        events = NotificationEvent.objects.order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            events = events.select_for_update(skip_locked=True)
+        return list(events[:limit])
+
+    def ack(self, events):
+        NotificationEvent.objects.filter(id__in=[event.id for event in events]).delete()
+
+
+_queues = {'memory': MemoryQueue(), 'database': DatabaseQueue()}
+
+
+def get_queue():
+    return _queues[getattr(settings, 'NOTIFICATIONS_QUEUE', 'memory')]
+
+
+def make_event(recipient, actor, verb, target=None):
+    return NotificationEvent(
+        recipient_id=recipient.pk,
+        actor_id=actor.pk,
+        verb=verb,
+        target_content_type=ContentType.objects.get_for_model(target) if target else None,
+        target_object_id=target.pk if target else None,
+        created_at=timezone.now(),
+    )
+
+
+def enqueue(recipient, actor, verb, target=None):
+    enqueue_many([make_event(recipient, actor, verb, target)])
+
+
+def enqueue_many(events):
+    events = [event for event in events if event.recipient_id != event.actor_id]
+    if events:
+        get_queue().push(events)
+
+
+def flush(batch_size=BATCH_SIZE):
+    """Write out every queued event. Returns the number of events processed."""
+    queue = get_queue()
+    processed = 0
+    while True:
+        with transaction.atomic():
+            events = queue.pop(batch_size)
+            if not events:
+                return processed
+            write(events)
+            queue.ack(events)
+        processed += len(events)
+
+
+def flush_memory_queue(**kwargs):
+    # Connected to request_finished
+    queue = get_queue()
+    if isinstance(queue, MemoryQueue) and len(queue):
+        flush()
+
+
+def event_key(event):
+    return (
+        event.recipient_id,
+        event.verb,
+        event.target_content_type_id,
+        event.target_object_id,
+    )
+
+
+def one_of(column, values):
+    """``column IN values``, where ``values`` may include ``None``."""
+    condition = Q(**{f'{column}__in': values - {None}})
+    if None in values:
+        condition |= Q(**{f'{column}__isnull': True})
+    return condition
+
+
+def write(events):
+    """Coalesce events into new or recent unread notifications."""
+    groups = {}
+    for event in events:
+        groups.setdefault(event_key(event), []).append(event)
+
+    # Unread notifications inside the window absorb new events for the same
+    # key. Each batch of keys is a few IN lists over the notif_unread_target
+    # index; rows matching a mix of two keys are ignored below.
+    since = timezone.now() - coalesce_window()
+    keys = list(groups)
+    existing = {}
+    for start in range(0, len(keys), KEY_BATCH_SIZE):
+        recipient_ids, verbs, content_type_ids, object_ids = (
+            set(column) for column in zip(*keys[start:start + KEY_BATCH_SIZE])
+        )
+        recent = Notification.objects.filter(
+            one_of('target_content_type_id', content_type_ids),
+            one_of('target_object_id', object_ids),
+            recipient_id__in=recipient_ids,
+            verb__in=verbs,
+            is_read=False,
+            timestamp__gte=since,
+        )
+        # The newest one wins; picked here rather than sorted by the database
+        for notification in recent:
+            key = event_key(notification)
+            if key in groups and (
+                key not in existing or notification.timestamp > existing[key].timestamp
+            ):
+                existing[key] = notification
+
+    created, updated = [], []
+    for key, group in groups.items():
+        actors = list(dict.fromkeys(event.actor_id for event in group))
+        latest = group[-1]
+
+        notification = existing.get(key)
+        if notification is None:
+            created.append(Notification(
+                recipient_id=latest.recipient_id,
+                actor_id=latest.actor_id,
+                verb=latest.verb,
+                target_content_type_id=latest.target_content_type_id,
+                target_object_id=latest.target_object_id,
+                actor_count=len(actors),
+                actor_ids=actors[-max_actor_ids():],
+            ))
+        else:
+            # Rows written before actor_ids was stored only know their latest actor
+            seen = notification.actor_ids or [notification.actor_id]
+            new = [actor_id for actor_id in actors if actor_id not in seen]
+            notification.actor_id = latest.actor_id
+            # Only the most recent actors are kept; one returning after
+            # dropping off the list is counted again
+            kept = [actor_id for actor_id in seen if actor_id not in actors] + actors
+            notification.actor_ids = kept[-max_actor_ids():]
+            notification.actor_count += len(new)
+            notification.timestamp = latest.created_at
+            updated.append(notification)
+
+    Notification.objects.bulk_create(created, batch_size=BATCH_SIZE)
+    Notification.objects.bulk_update(
+        updated, ['actor', 'actor_count', 'actor_ids', 'timestamp'], batch_size=BATCH_SIZE
+    )
+    counters.invalidate(notification.recipient_id for notification in created)
+
+    recipients = {notification.id: notification.recipient_id for notification in created + updated}
+    transaction.on_commit(lambda: broker.publish(recipients))
+    return created, updated
@@ -0,0 +1,112 @@
+from django.contrib.contenttypes.models import ContentType
+from rest_framework import serializers
+from rest_framework.exceptions import NotFound
+from social_media_api.pagination import KeysetPagination
+from social_media_api.read_serializers import ValuesSerializer, datetime_formatter
+from .models import Notification, summarize
+
+
+# Notification Serializer
+class NotificationSerializer(serializers.ModelSerializer):
+    actor = serializers.ReadOnlyField(source='actor.username')
+    target_type = serializers.ReadOnlyField(source='target_content_type.model')
+    target = serializers.StringRelatedField()
+    summary = serializers.ReadOnlyField()
+
+    class Meta:
+        model = Notification
+        fields = [
+            'id',
+            'actor',
+            'verb',
+            'actor_count',
+            'summary',
+            'target_type',
+            'target_object_id',
+            'target',
+            'is_read',
+            'timestamp',
+        ]
+
+
+# Read-only mirror of NotificationSerializer for list responses
+class NotificationReadSerializer(ValuesSerializer):
+    columns = {
+        'id': 'id',
+        'actor': 'actor__username',
+        'verb': 'verb',
+        'actor_count': 'actor_count',
+        'summary': None,
+        'target_type': 'target_content_type__model',
+        'target_object_id': 'target_object_id',
+        'target': None,
+        'is_read': 'is_read',
+        'timestamp': 'timestamp',
+    }
+    formatters = {'timestamp': datetime_formatter}
+    extra = ('actor__username', 'verb', 'actor_count', 'target_content_type_id')
+
+    # str() of common targets, read as (lookup, format) instead of loading them
+    target_labels = {
+        'posts.post': ('title', '{}'),
+        'posts.comment': ('author__username', 'Comment by {}'),
+        'accounts.user': ('username', '{}'),
+    }
+
+    class Meta:
+        serializer = NotificationSerializer
+
+    def complete(self, items, rows):
+        targets = self.targets(rows) if 'target' in self.fields else {}
+        for item, row in zip(items, rows):
+            if 'summary' in item:
+                item['summary'] = summarize(row.actor__username, row.verb, row.actor_count)
+            if 'target' in item:
+                item['target'] = targets.get((row.target_content_type_id, row.target_object_id))
+            if 'target_type' in item and item['target_type'] is None:
+                # NotificationSerializer skips the field when there is no target
+                del item['target_type']
+
+    def targets(self, rows):
+        """``{(content type id, object id): label}`` for the targets of ``rows``."""
+        ids = {}
+        for row in rows:
+            if row.target_content_type_id is not None:
+                ids.setdefault(row.target_content_type_id, set()).add(row.target_object_id)
+
+        labels = {}
+        for content_type_id, object_ids in ids.items():
+            model = ContentType.objects.get_for_id(content_type_id).model_class()
+            label = self.target_labels.get(model._meta.label_lower)
+            if label is None:
+                found = ((obj.pk, str(obj)) for obj in model.objects.filter(pk__in=object_ids))
+            else:
+                lookup, template = label
+                found = (
+                    (pk, template.format(value))
+                    for pk, value in model.objects.filter(pk__in=object_ids).values_list('pk', lookup)
+                )
+            labels.update(((content_type_id, pk), text) for pk, text in found)
+        return labels
+
+
+# Mark Read Serializer
+class MarkReadSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        max_length=1000
+    )
+    cursor = serializers.CharField(required=False)
+
+    def validate(self, data):
+        if ('ids' in data) == ('cursor' in data):
+            raise serializers.ValidationError("Provide either ids or cursor")
+        if 'cursor' in data:
+            try:
+                data['position'], _ = KeysetPagination().parse_cursor(
+                    data['cursor'], Notification.objects.order_by('-timestamp', '-id')
+                )
+            except NotFound:
+                raise serializers.ValidationError({'cursor': "Invalid cursor"})
+        return data
@@ -1,3 +1,352 @@
-from django.test import TestCase
+import base64
+import json
+from datetime import timedelta
+from io import StringIO
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from posts.models import Post
+from social_media_api import query_plans
+from social_media_api.query_plans import QueryPlanAssertions
+from . import broker, pipeline
+from .models import Notification, NotificationEvent
+from .serializers import NotificationReadSerializer, NotificationSerializer
+from .views import notifications_for
+
+User = get_user_model()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class NotificationPipelineTests(APITestCase):
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='pass12345')
+        self.post = Post.objects.create(author=self.author, title='Post', content='text')
+        self.fans = [
+            User.objects.create_user(username=f'fan{i}', password='pass12345')
+            for i in range(3)
+        ]
+
+    def like(self, user):
+        self.client.force_authenticate(user)
+        return self.client.post(f'/api/posts/{self.post.id}/like/')
+
+    def test_likes_are_coalesced(self):
+        for fan in self.fans:
+            self.like(fan)
+
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor, self.fans[-1])
+        self.assertEqual(notification.actor_count, 3)
+        self.assertEqual(notification.summary, 'fan2 and 2 others liked your post')
+
+    def test_relike_does_not_notify_again(self):
+        self.like(self.fans[0])
+        self.like(self.fans[0])
+
+        self.assertEqual(Notification.objects.get().actor_count, 1)
+
+    def test_returning_actor_is_counted_once(self):
+        first, second = self.fans[:2]
+        self.like(first)
+        self.like(second)
+        self.client.force_authenticate(first)
+        self.client.post(f'/api/posts/{self.post.id}/unlike/')
+        self.like(first)
+
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor, first)
+        self.assertEqual(notification.actor_count, 2)
+
+    def test_events_without_target_are_coalesced(self):
+        for fan in self.fans[:2]:
+            pipeline.enqueue(self.author, fan, 'followed you')
+            pipeline.flush()
+
+        self.assertEqual(Notification.objects.get().actor_count, 2)
+
+    @override_settings(NOTIFICATIONS_MAX_ACTOR_IDS=2)
+    def test_actor_ids_keep_the_most_recent_actors(self):
+        for fan in self.fans:
+            self.like(fan)
+
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor_ids, [self.fans[1].id, self.fans[2].id])
+        self.assertEqual(notification.actor_count, 3)
+
+    @override_settings(NOTIFICATIONS_QUEUE='database')
+    def test_database_queue_is_drained_by_command(self):
+        for fan in self.fans:
+            self.like(fan)
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(NotificationEvent.objects.count(), 3)
+
+        call_command('drain_notifications', stdout=StringIO())
+
+        self.assertFalse(NotificationEvent.objects.exists())
+        self.assertEqual(Notification.objects.get().actor_count, 3)
+
+    def test_read_notifications_are_not_coalesced(self):
+        self.like(self.fans[0])
+        Notification.objects.update(is_read=True)
+
+        pipeline.enqueue(self.author, self.fans[1], 'liked your post', self.post)
+        pipeline.flush()
+
+        self.assertEqual(Notification.objects.count(), 2)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class UnreadNotificationTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='user', password='pass12345')
+        self.actor = User.objects.create_user(username='actor', password='pass12345')
+        self.notifications = [
+            Notification.objects.create(recipient=self.user, actor=self.actor, verb=f'did {i}')
+            for i in range(4)
+        ]
+        self.client.force_authenticate(self.user)
+
+    def unread(self):
+        return self.client.get('/api/notifications/unread-count/').data['unread']
+
+    def test_unread_count_is_cached_and_invalidated(self):
+        self.assertEqual(self.unread(), 4)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.unread(), 4)
+
+        pipeline.enqueue(self.user, self.actor, 'followed you')
+        pipeline.flush()
+        self.assertEqual(self.unread(), 5)
+
+    def test_mark_read_by_ids(self):
+        ids = [n.id for n in self.notifications[:2]]
+        with self.assertNumQueries(1):
+            response = self.client.post(
+                '/api/notifications/mark-read/', {'ids': ids}, format='json'
+            )
+        self.assertEqual(response.data['marked_read'], 2)
+        self.assertEqual(self.unread(), 2)
+
+    def test_mark_read_up_to_cursor(self):
+        page = self.client.get('/api/notifications/?page_size=2')
+        cursor = parse_qs(urlparse(page.data['next']).query)['cursor'][0]
+
+        response = self.client.post(
+            '/api/notifications/mark-read/', {'cursor': cursor}, format='json'
+        )
+
+        # The cursor points at the last item of the first page: it and
+        # everything older are marked read
+        self.assertEqual(response.data['marked_read'], 3)
+        self.assertEqual(
+            list(Notification.objects.filter(is_read=False)), [self.notifications[3]]
+        )
+
+    def test_mark_read_rejects_malformed_cursor_positions(self):
+        timestamp = self.notifications[0].timestamp.isoformat()
+        for position in (['yesterday', 1], [timestamp, {'id': 1}], [timestamp]):
+            data = json.dumps({'p': position, 'r': 0}).encode()
+            cursor = base64.urlsafe_b64encode(data).decode()
+            with self.subTest(position=position):
+                response = self.client.post(
+                    '/api/notifications/mark-read/', {'cursor': cursor}, format='json'
+                )
+                self.assertEqual(response.status_code, 400)
+
+    def test_mark_read_requires_ids_or_cursor(self):
+        response = self.client.post('/api/notifications/mark-read/', {}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_purge_deletes_old_read_notifications(self):
+        Notification.objects.filter(id=self.notifications[0].id).update(
+            is_read=True, timestamp=timezone.now() - timedelta(days=100)
+        )
+        Notification.objects.filter(id=self.notifications[1].id).update(
+            timestamp=timezone.now() - timedelta(days=100)
+        )
+
+        call_command('purge_notifications', days=90, batch_size=1, stdout=StringIO())
+
+        self.assertEqual(Notification.objects.count(), 3)
+        self.assertFalse(Notification.objects.filter(id=self.notifications[0].id).exists())
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class NotificationQueryBudgetTests(APITestCase):
+
+    def test_list_queries_do_not_grow_with_page_size(self):
+        user = User.objects.create_user(username='user', password='pass12345')
+        for i in range(20):
+            actor = User.objects.create_user(username=f'actor{i}', password='pass12345')
+            post = Post.objects.create(author=actor, title=f'Post {i}', content='text')
+            target = post if i % 2 else post.comments.create(author=actor, content='hi')
+            Notification.objects.create(recipient=user, actor=actor, verb='did', target=target)
+        self.client.force_authenticate(user)
+        # Warm the content type cache
+        self.client.get('/api/notifications/')
+
+        for page_size in (2, 20):
+            # notifications, then one prefetch per target type
+            with self.assertNumQueries(3):
+                response = self.client.get('/api/notifications/', {'page_size': page_size})
+            self.assertEqual(len(response.data['results']), page_size)
+
+    async def test_async_list_matches_sync_list(self):
+        user = await User.objects.acreate(username='user')
+        actor = await User.objects.acreate(username='actor')
+        post = await Post.objects.acreate(author=actor, title='Post', content='text')
+        for verb in ('liked your post', 'commented'):
+            await Notification.objects.acreate(recipient=user, actor=actor, verb=verb, target=post)
+        headers = {'Authorization': f'Token {(await Token.objects.acreate(user=user)).key}'}
+
+        sync = await sync_to_async(self.client.get)('/api/notifications/', headers=headers)
+        response = await self.async_client.get('/api/async/notifications/', headers=headers)
+
+        self.assertEqual(response.json(), sync.json())
+
+
+class NotificationReadSerializerTests(APITestCase):
+
+    def test_output_matches_model_serializer(self):
+        user = User.objects.create_user(username='user', password='pass12345')
+        actor = User.objects.create_user(username='actör', password='pass12345')
+        post = Post.objects.create(author=actor, title='Post', content='text')
+        deleted = Post.objects.create(author=actor, title='Gone', content='text')
+        comment = post.comments.create(author=actor, content='hi')
+        for target in (post, comment, actor, None, deleted):
+            Notification.objects.create(
+                recipient=user, actor=actor, verb='did', target=target, actor_count=3
+            )
+        deleted.delete()
+
+        notifications = notifications_for(user)
+        read_serializer = NotificationReadSerializer()
+        read_serializer.instance = list(read_serializer.rows(notifications))
+        expected = NotificationSerializer(notifications, many=True).data
+        self.assertEqual(
+            JSONRenderer().render(read_serializer.data), JSONRenderer().render(expected)
+        )
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, NOTIFICATIONS_QUEUE='database')
+class NotificationQueryPlanTests(QueryPlanAssertions, APITestCase):
+
+    def test_list_count_mark_read_and_pipeline_use_indexes(self):
+        user = User.objects.create_user(username='user', password='pass12345')
+        post = Post.objects.create(author=user, title='Post', content='text')
+        actors = [
+            User.objects.create_user(username=f'actor{i}', password='pass12345') for i in range(4)
+        ]
+        for actor in actors:
+            Notification.objects.create(recipient=user, actor=actor, verb='did', target=post)
+        self.client.force_authenticate(user)
+        cache.clear()
+
+        # The queue is drained whole
+        with self.assertIndexedQueries(allow=['notifications_notificationevent']):
+            first = self.client.get('/api/notifications/', {'page_size': 2})
+            self.client.get(first.data['next'])
+            self.client.get('/api/notifications/unread-count/')
+            self.client.post('/api/notifications/mark-read/', {'ids': [first.data['results'][0]['id']]})
+            self.client.post('/api/notifications/mark-read/', {'cursor': first.data['next']})
+            for actor in actors[:2]:
+                pipeline.enqueue(user, actor, 'liked your post', post)
+            pipeline.flush()
+
+
+    def test_coalescing_reads_only_the_matching_keys(self):
+        user = User.objects.create_user(username='user', password='pass12345')
+        actor = User.objects.create_user(username='actor', password='pass12345')
+        posts = [Post.objects.create(author=user, title=f'Post {i}', content='text') for i in range(2)]
+        for post in posts:
+            pipeline.enqueue(user, actor, 'liked your post', post)
+
+        with CaptureQueriesContext(connection) as queries:
+            pipeline.flush()
+
+        [lookup] = [
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT') and 'notifications_notification"' in query['sql']
+        ]
+        self.assertTrue(all(
+            'notif_unread_target' in step
+            for step in query_plans.explain(lookup) if step.startswith('SEARCH')
+        ))
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, NOTIFICATIONS_STREAM_KEEPALIVE=0.05)
+class NotificationStreamTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', password='pass12345')
+        self.actor = User.objects.create_user(username='actor', password='pass12345')
+        self.post = Post.objects.create(author=self.user, title='Post', content='text')
+        self.headers = {'Authorization': f'Token {Token.objects.create(user=self.user).key}'}
+
+    def notify(self, verb):
+        with self.captureOnCommitCallbacks(execute=True):
+            pipeline.enqueue(self.user, self.actor, verb, self.post)
+            pipeline.flush()
+
+    async def read_event(self, stream):
+        while True:
+            chunk = (await anext(stream)).decode()
+            if not chunk.startswith(':'):
+                return dict(line.split(': ', 1) for line in chunk.strip().split('\n'))
+
+    async def test_stream_pushes_new_notifications(self):
+        response = await self.async_client.get(
+            '/api/async/notifications/stream/', headers=self.headers
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+        # The first keepalive means the subscription is in place
+        self.assertEqual(await anext(stream), b': keepalive\n\n')
+
+        await sync_to_async(self.notify)('liked your post')
+        event = await self.read_event(stream)
+
+        self.assertEqual(event['event'], 'notification')
+        self.assertEqual(json.loads(event['data'])['summary'], 'actor liked your post')
+        await stream.aclose()
+
+    async def test_last_event_id_replays_missed_notifications(self):
+        await sync_to_async(self.notify)('liked your post')
+        first = await Notification.objects.aget()
+        await sync_to_async(self.notify)('commented on your post')
+
+        response = await self.async_client.get(
+            '/api/async/notifications/stream/',
+            headers={**self.headers, 'Last-Event-ID': broker.event_id(first)},
+        )
+        stream = response.streaming_content
+        event = await self.read_event(stream)
+
+        self.assertEqual(json.loads(event['data'])['verb'], 'commented on your post')
+        self.assertEqual(await anext(stream), b': keepalive\n\n')
+        await stream.aclose()
+
+    def test_stream_is_not_served_under_wsgi(self):
+        response = self.client.get('/api/async/notifications/stream/', headers=self.headers)
+        self.assertEqual(response.status_code, 501)
+
+    def test_nothing_is_loaded_without_listeners(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            pipeline.enqueue(self.user, self.actor, 'liked your post', self.post)
+            # recent notifications, insert
+            with self.assertNumQueries(2):
+                pipeline.write(pipeline.get_queue().pop(10))
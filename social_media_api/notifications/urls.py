@@ -1,6 +1,11 @@
 from django.urls import path
-from .views import NotificationListView
+from .views import NotificationListView, UnreadCountView, MarkReadView
+from . import async_views
 
 urlpatterns = [
     path('notifications/', NotificationListView.as_view()),
+    path('notifications/unread-count/', UnreadCountView.as_view()),
+    path('notifications/mark-read/', MarkReadView.as_view()),
+    path('async/notifications/', async_views.notification_list),
+    path('async/notifications/stream/', async_views.notification_stream),
 ]
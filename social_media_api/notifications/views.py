@@ -1,12 +1,73 @@
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.prefetch import GenericPrefetch
 from rest_framework import generics
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from posts.models import Comment, Post
+from social_media_api.pagination import KeysetPagination
+from social_media_api.read_serializers import ValuesReadMixin
+from . import counters
 from .models import Notification
+from .serializers import (
+    MarkReadSerializer, NotificationReadSerializer, NotificationSerializer,
+)
 
 
-class NotificationListView(generics.ListAPIView):
+def notification_queryset():
+    """Notifications with actors and targets loaded in bulk."""
+    return Notification.objects.select_related(
+        'actor', 'target_content_type'
+    ).prefetch_related(
+        GenericPrefetch('target', [
+            Post.objects.all(),
+            Comment.objects.select_related('author'),
+            get_user_model().objects.all(),
+        ])
+    )
+
+
+def notifications_for(user):
+    return notification_queryset().filter(recipient=user).order_by('-timestamp', '-id')
+
+
+class NotificationListView(ValuesReadMixin, generics.ListAPIView):
+    serializer_class = NotificationSerializer
+    read_serializer_classes = [NotificationReadSerializer]
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Notification.objects.filter(
-            recipient=self.request.user
-        ).order_by('-timestamp')
+        return notifications_for(self.request.user)
+
+
+class UnreadCountView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response({"unread": counters.unread_count(request.user)})
+
+
+class MarkReadView(APIView):
+    """
+    Mark notifications read with a single UPDATE, either by ``ids`` or
+    everything at or older than a ``cursor`` from the notification list.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = MarkReadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        notifications = Notification.objects.filter(recipient=request.user, is_read=False)
+        if 'ids' in serializer.validated_data:
+            notifications = notifications.filter(id__in=serializer.validated_data['ids'])
+        else:
+            newer = KeysetPagination.position_filter(
+                ['timestamp', 'id'], serializer.validated_data['position']
+            )
+            notifications = notifications.exclude(newer)
+
+        updated = notifications.update(is_read=True)
+        if updated:
+            counters.invalidate([request.user.pk])
+        return Response({"marked_read": updated})
@@ -4,3 +4,18 @@ from django.apps import AppConfig
 class PostsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'posts'
+
+    def ready(self):
+        from django.contrib.auth import get_user_model
+        from django.db.models.signals import post_delete, post_save, pre_save
+        from . import caching, search
+
+        for model in search.INDEXED_FIELDS:
+            post_save.connect(search.update_index, sender=model)
+            post_delete.connect(search.remove_from_index, sender=model)
+
+        User = get_user_model()
+        pre_save.connect(caching.remember_username, sender=User, dispatch_uid='posts.remember_username')
+        post_save.connect(
+            caching.rename_in_previews, sender=User, dispatch_uid='posts.rename_in_previews'
+        )
@@ -0,0 +1,42 @@
+"""
+Async variants of the feed and like endpoints, for ASGI deployments.
+
+They return the same payloads as the views in ``views.py`` but await the
+database and cache instead of holding a worker thread while they wait.
+"""
+from asgiref.sync import sync_to_async
+from django.shortcuts import aget_object_or_404
+
+from social_media_api.asynchronous import async_api_view, render
+from social_media_api.pagination import KeysetPagination
+from . import caching, likes, timeline
+from .models import Post
+from .serializers import PostSerializer
+
+
+def serialize_posts(posts):
+    return PostSerializer(posts, many=True).data
+
+
+@async_api_view(['GET'], throttle_scope='feed')
+async def feed(request):
+    sources = await sync_to_async(timeline.sources)(request.user)
+    paginator = KeysetPagination()
+    page = await paginator.apaginate_queryset(sources, request)
+    data = await caching.arepresentations(page, serialize_posts)
+    return paginator.get_paginated_response(data).data
+
+
+@async_api_view(['POST'])
+async def like_post(request, pk):
+    post = await aget_object_or_404(Post.objects.select_related('author'), pk=pk)
+    await sync_to_async(likes.like)(request.user, post)
+    return {"detail": "Post liked"}
+
+
+@async_api_view(['POST'])
+async def unlike_post(request, pk):
+    post = await aget_object_or_404(Post, pk=pk)
+    if not await sync_to_async(likes.unlike)(request.user, post):
+        return render({"detail": "Not liked yet"}, status=400)
+    return {"detail": "Post unliked"}
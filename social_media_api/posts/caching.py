@@ -0,0 +1,209 @@
+"""
+Read-through cache for serialized posts and comments, and for the preview
+of a post's newest comments shown with the post.
+
+Each representation is stored under ``<model>:<pk>`` together with a
+version fingerprint built from ``updated_at``, the row's counters and the
+author's username, which is embedded but changes without touching the row. A
+cached entry is only served while the fingerprint still matches the row, so
+a stale entry can never be returned; views also delete entries explicitly
+when they change a row so memory is released straight away.
+
+The same fingerprint is sent as the ``ETag``, letting clients revalidate
+with ``If-None-Match`` and receive ``304 Not Modified``. A post's comment
+preview is versioned by ``Post.comments_version``, which the comment views
+bump when they add, edit or delete a comment and which a commenter's
+rename bumps too. It is part of the post's ``ETag`` and of the preview's
+cache key, so serving a cached preview reads nothing but the post.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from .models import Comment, Post
+from .serializers import CommentReadSerializer
+
+
+def timeout():
+    return getattr(settings, 'POSTS_CACHE_TIMEOUT', 600)
+
+
+def cache_key(model, pk):
+    return f'{model._meta.label_lower}:{pk}'
+
+
+def version(instance):
+    parts = [instance.pk, instance.updated_at.timestamp(), instance.author.username]
+    parts += [getattr(instance, field) for field in getattr(instance, 'counter_fields', ())]
+    return hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest()
+
+
+def representations(instances, serialize):
+    """
+    Return the representation of each instance, serializing only the
+    instances whose cached copy is missing or out of date.
+    """
+    if not instances:
+        return []
+    keys, versions = _keys_and_versions(instances)
+    data, fresh = _merge(instances, keys, versions, cache.get_many(keys), serialize)
+    if fresh:
+        cache.set_many(fresh, timeout())
+    return data
+
+
+async def arepresentations(instances, serialize):
+    """``representations()`` using the async cache API."""
+    if not instances:
+        return []
+    keys, versions = _keys_and_versions(instances)
+    data, fresh = _merge(instances, keys, versions, await cache.aget_many(keys), serialize)
+    if fresh:
+        await cache.aset_many(fresh, timeout())
+    return data
+
+
+def _keys_and_versions(instances):
+    keys = [cache_key(type(instance), instance.pk) for instance in instances]
+    versions = [version(instance) for instance in instances]
+    return keys, versions
+
+
+def _merge(instances, keys, versions, cached, serialize):
+    """Fill in cache hits, serialize the misses and return them for storing."""
+    data = [None] * len(instances)
+    misses = []
+    for i, (key, current) in enumerate(zip(keys, versions)):
+        entry = cached.get(key)
+        if entry is not None and entry[0] == current:
+            data[i] = entry[1]
+        else:
+            misses.append(i)
+
+    fresh = {}
+    if misses:
+        serialized = serialize([instances[i] for i in misses])
+        for i, item in zip(misses, serialized):
+            data[i] = item
+            fresh[keys[i]] = (versions[i], item)
+    return data, fresh
+
+
+def invalidate(model, pks):
+    cache.delete_many([cache_key(model, pk) for pk in pks])
+
+
+def preview_size():
+    return getattr(settings, 'POSTS_COMMENT_PREVIEW_SIZE', 3)
+
+
+def preview_comments(post_id):
+    return Comment.objects.filter(post_id=post_id).order_by('-created_at', '-id')
+
+
+def preview_key(post_id, version):
+    return f'{cache_key(Post, post_id)}:comments:{version}'
+
+
+def comment_preview(post):
+    """
+    The newest ``POSTS_COMMENT_PREVIEW_SIZE`` comments of ``post``, as on
+    the first page of its comments, cached under its ``comments_version``.
+    """
+    key = preview_key(post.pk, post.comments_version)
+    data = cache.get(key)
+    if data is None:
+        serializer = CommentReadSerializer()
+        serializer.instance = list(serializer.rows(preview_comments(post.pk))[:preview_size()])
+        data = serializer.data
+        cache.set(key, data, timeout())
+    return data
+
+
+def remember_username(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Record the username a save is about to overwrite."""
+    instance._saved_username = None
+    if raw or instance._state.adding:
+        return
+    if update_fields is not None and 'username' not in update_fields:
+        return
+    instance._saved_username = (
+        sender.objects.filter(pk=instance.pk).values_list('username', flat=True).first()
+    )
+
+
+def rename_in_previews(sender, instance, created=False, **kwargs):
+    """Move the previews that may show a renamed user's comments to a new version."""
+    saved = getattr(instance, '_saved_username', None)
+    if created or saved is None or saved == instance.username:
+        return
+    Post.objects.filter(comments__author=instance).update(
+        comments_version=F('comments_version') + 1
+    )
+
+
+class CachedRepresentationMixin:
+    """
+    Serve ``list`` and ``retrieve`` from the representation cache, with
+    ``ETag``/``Last-Modified`` revalidation on ``retrieve``.
+    """
+
+    def serialize_many(self, instances):
+        return self.get_serializer(instances, many=True).data
+
+    def use_cache(self):
+        return True
+
+    def representations(self, instances):
+        if not self.use_cache():
+            return self.serialize_many(instances)
+        return representations(instances, self.serialize_many)
+
+    def detail_representation(self, instance):
+        return self.representations([instance])[0]
+
+    def representation_version(self, instance):
+        """The ``ETag`` of the ``retrieve`` response for ``instance``."""
+        return version(instance)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(self.representations(list(queryset)))
+        return self.get_paginated_response(self.representations(page))
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag = f'"{self.representation_version(instance)}"'
+        # Counters change without touching updated_at, so only the ETag
+        # can validate representations that include them
+        last_modified = None
+        if not getattr(instance, 'counter_fields', ()):
+            last_modified = int(instance.updated_at.timestamp())
+
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if not_modified is not None:
+            return not_modified
+
+        data = self.detail_representation(instance)
+        return Response(data, headers={
+            'ETag': etag,
+            'Last-Modified': http_date(instance.updated_at.timestamp()),
+        })
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        invalidate(type(serializer.instance), [serializer.instance.pk])
+
+    def perform_destroy(self, instance):
+        pk = instance.pk
+        super().perform_destroy(instance)
+        invalidate(type(instance), [pk])
@@ -0,0 +1,130 @@
+"""
+Sparse fieldsets for post lists and details.
+
+* ``?fields=id,title`` returns only the listed fields.
+* ``?exclude=content`` returns everything else.
+* ``?view=compact`` switches to ``PostCompactSerializer``: the title, a
+  ``snippet`` of the first ``POSTS_SNIPPET_LENGTH`` characters of the
+  content, and the counters.
+
+Large text columns that no requested field needs are deferred, and the
+compact view reads only the snippet's characters (``SUBSTR``), so long posts
+are neither loaded nor encoded when they are not shown. These responses
+skip the representation cache, which holds full representations only.
+"""
+from django.conf import settings
+from django.db.models.functions import Substr
+from rest_framework.exceptions import ValidationError
+
+# Serializer field: the large model column it reads
+LARGE_FIELDS = {'content': 'content'}
+
+VIEWS = ('full', 'compact')
+
+
+def snippet_length():
+    return getattr(settings, 'POSTS_SNIPPET_LENGTH', 200)
+
+
+def annotate_snippet(queryset):
+    """Read the snippet's characters, plus one to tell whether it was cut."""
+    return queryset.annotate(snippet_text=Substr('content', 1, snippet_length() + 1))
+
+
+def snippet_formatter():
+    length = snippet_length()
+
+    def format_snippet(text):
+        if len(text) > length:
+            return text[:length].rstrip() + '…'
+        return text
+
+    return format_snippet
+
+
+def parse_names(request, param):
+    value = request.query_params.get(param)
+    if value is None:
+        return None
+    return [name for name in (part.strip() for part in value.split(',')) if name]
+
+
+class SparseFieldsetMixin:
+    """
+    Apply ``?fields``, ``?exclude`` and ``?view`` to a view whose serializer
+    accepts ``fields``. Only safe requests are affected.
+    """
+    compact_serializer_class = None
+
+    def get_fieldset(self):
+        """Return ``(compact, field names or None)`` for this request."""
+        if not hasattr(self, '_fieldset'):
+            self._fieldset = self.parse_fieldset()
+        return self._fieldset
+
+    def parse_fieldset(self):
+        request = self.request
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return False, None
+
+        view = request.query_params.get('view', 'full')
+        if view not in VIEWS:
+            raise ValidationError({'view': f'Expected one of {", ".join(VIEWS)}.'})
+        compact = view == 'compact'
+
+        fields = parse_names(request, 'fields')
+        exclude = parse_names(request, 'exclude')
+        if fields is None and exclude is None:
+            return compact, None
+
+        declared = list(self.get_serializer_class(compact)().fields)
+        for param, names in (('fields', fields), ('exclude', exclude)):
+            unknown = sorted(set(names or ()) - set(declared))
+            if unknown:
+                raise ValidationError({param: f'Unknown fields: {", ".join(unknown)}.'})
+        if fields is not None:
+            declared = [name for name in declared if name in fields]
+        return compact, [name for name in declared if name not in (exclude or ())]
+
+    def is_sparse(self):
+        compact, fields = self.get_fieldset()
+        return compact or fields is not None
+
+    def use_cache(self):
+        return not self.is_sparse()
+
+    def get_serializer_class(self, compact=None):
+        if compact is None:
+            compact = self.get_fieldset()[0]
+        if compact:
+            return self.compact_serializer_class
+        return super().get_serializer_class()
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_fieldset()[1]
+        if fields is not None:
+            kwargs['fields'] = fields
+        return super().get_serializer(*args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        # Here rather than get_queryset(), which views tend to override
+        return self.sparse(super().filter_queryset(queryset))
+
+    def sparse(self, querysets):
+        """Slim a queryset, or a list of them, for this request."""
+        if not self.is_sparse():
+            return querysets
+        if isinstance(querysets, (list, tuple)):
+            return [self.slim(queryset) for queryset in querysets]
+        return self.slim(querysets)
+
+    def slim(self, queryset):
+        """Defer the large columns this request does not show."""
+        compact, fields = self.get_fieldset()
+        if fields is None:
+            fields = list(self.get_serializer_class(compact)().fields)
+        unused = [column for name, column in LARGE_FIELDS.items() if name not in fields]
+        if compact and 'snippet' in fields:
+            queryset = annotate_snippet(queryset)
+            unused = list(LARGE_FIELDS.values())
+        return queryset.defer(*unused) if unused else queryset
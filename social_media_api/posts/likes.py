@@ -0,0 +1,41 @@
+"""
+Liking and unliking a single post, shared by the sync and async views.
+"""
+from django.db import transaction
+from django.db.models import F
+
+from notifications import pipeline
+from social_media_api.counters import decrement
+from . import caching, trending
+from .models import Like, Post
+
+
+def like(user, post):
+    """Like ``post``. Returns False if ``user`` already liked it."""
+    with transaction.atomic():
+        _, created = Like.objects.get_or_create(user=user, post=post)
+        if created:
+            Post.objects.filter(pk=post.pk).update(likes_count=F('likes_count') + 1)
+            trending.record(Like, [post.pk])
+
+    if created:
+        caching.invalidate(Post, [post.pk])
+        pipeline.enqueue(
+            recipient=post.author,
+            actor=user,
+            verb='liked your post',
+            target=post
+        )
+    return created
+
+
+def unlike(user, post):
+    """Remove ``user``'s like. Returns False if there was none."""
+    with transaction.atomic():
+        deleted, _ = Like.objects.filter(user=user, post=post).delete()
+        if deleted:
+            Post.objects.filter(pk=post.pk).update(likes_count=decrement('likes_count'))
+
+    if deleted:
+        caching.invalidate(Post, [post.pk])
+    return bool(deleted)
@@ -0,0 +1,116 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from notifications.models import Notification
+from notifications.serializers import NotificationReadSerializer, NotificationSerializer
+from notifications.views import notification_queryset
+from posts import caching
+from posts.models import Comment, Post
+from posts.serializers import (
+    CommentReadSerializer, CommentSerializer, PostReadSerializer, PostSerializer,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Time a page of posts, comments and notifications through the ModelSerializer '
+        '(cold and from the representation cache) and the values() read serializer, and '
+        'check that both render the same JSON. Runs inside a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-sizes', type=int, nargs='+', default=[10, 50, 100])
+        parser.add_argument('--requests', type=int, default=50)
+
+    def handle(self, *args, page_sizes, requests, **options):
+        renderer = JSONRenderer()
+        with transaction.atomic():
+            size = max(page_sizes)
+            recipient = self.fixtures(size)
+            cases = [
+                (
+                    'posts', PostSerializer, PostReadSerializer,
+                    Post.objects.select_related('author').order_by('-created_at', '-id'), True,
+                ),
+                (
+                    'comments', CommentSerializer, CommentReadSerializer,
+                    Comment.objects.select_related('author').order_by('-created_at', '-id'), True,
+                ),
+                (
+                    'notifications', NotificationSerializer, NotificationReadSerializer,
+                    notification_queryset().filter(recipient=recipient)
+                    .order_by('-timestamp', '-id'),
+                    False,
+                ),
+            ]
+
+            self.stdout.write(
+                f'{"kind":<14} {"page":>5} {"ModelSerializer p50/p99":>24} '
+                f'{"cached p50/p99":>18} {"values p50/p99":>18}'
+            )
+            for name, serializer_class, read_class, queryset, cached in cases:
+                for page_size in page_sizes:
+                    def model():
+                        page = list(queryset[:page_size])
+                        return renderer.render(serializer_class(page, many=True).data)
+
+                    def from_cache():
+                        page = list(queryset[:page_size])
+                        data = caching.representations(
+                            page, lambda items: serializer_class(items, many=True).data
+                        )
+                        return renderer.render(data)
+
+                    def values():
+                        serializer = read_class()
+                        serializer.instance = list(serializer.rows(queryset)[:page_size])
+                        return renderer.render(serializer.data)
+
+                    if model() != values():
+                        raise CommandError(f'The {name} read serializer renders different JSON')
+                    cache.clear()
+                    if cached:
+                        from_cache()
+                    self.stdout.write(
+                        f'{name:<14} {page_size:>5} {self.latencies(model, requests):>24} '
+                        f'{self.latencies(from_cache, requests) if cached else "-":>18} '
+                        f'{self.latencies(values, requests):>18}'
+                    )
+
+            cache.clear()
+            transaction.set_rollback(True)
+
+    def fixtures(self, size):
+        User = get_user_model()
+        users = User.objects.bulk_create(
+            User(username=f'bench-serializers-{i}') for i in range(size + 1)
+        )
+        recipient, actors = users[0], users[1:]
+        posts = Post.objects.bulk_create(
+            Post(author=actor, title=f'Bench {i}', content='Lorem ipsum dolor sit amet. ' * 20)
+            for i, actor in enumerate(actors)
+        )
+        comments = Comment.objects.bulk_create(
+            Comment(post=post, author=actor, content='Nice post!')
+            for post, actor in zip(posts, reversed(actors))
+        )
+        Notification.objects.bulk_create(
+            Notification(recipient=recipient, actor=actor, verb='did', target=target)
+            for actor, target in zip(actors, posts[::2] + comments[1::2])
+        )
+        return recipient
+
+    def latencies(self, call, requests):
+        timings = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            call()
+            timings.append((time.perf_counter() - started) * 1000)
+        p99 = statistics.quantiles(timings, n=100)[98]
+        return f'{statistics.median(timings):.2f}/{p99:.2f}ms'
@@ -0,0 +1,102 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from posts import trending
+from posts.models import Like, Post
+from posts.views import PostViewSet
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the trending endpoint with a live GROUP BY over likes as the like table '
+        'grows. Runs inside a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--likes', type=int, nargs='+', default=[10000, 100000, 300000])
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=1000)
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--limit', type=int, default=20)
+
+    def handle(self, *args, likes, users, posts, requests, limit, **options):
+        if max(likes) > users * posts:
+            self.stderr.write(f'At most {users * posts} likes fit {users} users and {posts} posts')
+            return
+
+        factory = APIRequestFactory()
+        view = PostViewSet.as_view({'get': 'trending'})
+        with transaction.atomic():
+            user_ids, post_ids = self.fixtures(users, posts)
+            viewer = get_user_model().objects.get(pk=user_ids[0])
+            since = timezone.now() - timezone.timedelta(seconds=trending.window())
+
+            def endpoint():
+                request = factory.get('/api/posts/trending/', {'limit': limit})
+                force_authenticate(request, viewer)
+                response = view(request)
+                assert response.status_code == 200, response.status_code
+
+            def live():
+                list(
+                    Post.objects.select_related('author')
+                    .annotate(score=Count('likes', filter=Q(likes__created_at__gte=since)))
+                    .order_by('-score', '-id')[:limit]
+                )
+
+            written = 0
+            self.stdout.write(
+                f'{"likes":>10} {"recompute":>10} {"reload":>9} '
+                f'{"endpoint p50/p99":>18} {"live GROUP BY p50/p99":>23}'
+            )
+            for target in sorted(likes):
+                Like.objects.bulk_create(
+                    [
+                        Like(user_id=user_ids[i % users], post_id=post_ids[i // users])
+                        for i in range(written, target)
+                    ],
+                    batch_size=5000,
+                )
+                written = target
+
+                started = time.perf_counter()
+                trending.recompute()
+                recompute = time.perf_counter() - started
+                started = time.perf_counter()
+                trending.top_posts.reload()
+                reload = time.perf_counter() - started
+
+                self.stdout.write(
+                    f'{target:>10,} {recompute:>9.2f}s {reload * 1000:>7.1f}ms '
+                    f'{self.latencies(endpoint, requests):>18} {self.latencies(live, requests):>23}'
+                )
+
+            trending.top_posts.clear()
+            transaction.set_rollback(True)
+
+    def fixtures(self, users, posts):
+        User = get_user_model()
+        user_list = User.objects.bulk_create(
+            User(username=f'bench-trending-{i}') for i in range(users)
+        )
+        post_list = Post.objects.bulk_create(
+            Post(author=user_list[i % users], title=f'Bench {i}', content='')
+            for i in range(posts)
+        )
+        return [user.pk for user in user_list], [post.pk for post in post_list]
+
+    def latencies(self, call, requests):
+        timings = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            call()
+            timings.append((time.perf_counter() - started) * 1000)
+        p99 = statistics.quantiles(timings, n=100)[98]
+        return f'{statistics.median(timings):.2f}/{p99:.2f}ms'
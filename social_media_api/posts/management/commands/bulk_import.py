@@ -0,0 +1,225 @@
+import csv
+import datetime
+import json
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models, transaction
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+
+from accounts import graph
+from posts import threads, timeline
+from posts.models import Comment, Like, Post
+
+# Flushed in this order so parents are written before their children
+KINDS = ('users', 'follows', 'posts', 'comments', 'likes')
+
+# Columns read from the input; the rest get their model defaults
+COLUMNS = {
+    'users': ('id', 'username', 'email', 'password', 'bio', 'date_joined'),
+    'follows': ('from_user_id', 'to_user_id'),
+    'posts': ('id', 'author_id', 'title', 'content', 'created_at', 'updated_at'),
+    'comments': ('id', 'post_id', 'parent_id', 'author_id', 'content', 'created_at', 'updated_at'),
+    'likes': ('user_id', 'post_id', 'created_at'),
+}
+
+
+def convert_datetime(value):
+    # fromisoformat() is much cheaper than DateTimeField.to_python()
+    value = datetime.datetime.fromisoformat(value)
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return connection.ops.adapt_datetimefield_value(value)
+
+
+class Table:
+    """
+    A prepared ``INSERT`` for one model that turns input records into
+    parameter tuples, skipping model instances and ``bulk_create``.
+    """
+
+    def __init__(self, model, columns, defaults=None, fallbacks=None, ignore_conflicts=False):
+        self.model = model
+        defaults = defaults or {}
+        fallbacks = fallbacks or {}
+        fields = [
+            field for field in model._meta.concrete_fields
+            if not field.primary_key or field.attname in columns
+        ]
+
+        self.columns = []
+        for field in fields:
+            default = defaults[field.attname] if field.attname in defaults else field.get_default()
+            self.columns.append((
+                field.attname,
+                fallbacks.get(field.attname),
+                self.converter(field) if field.attname in columns else None,
+                field.get_db_prep_save(default, connection),
+            ))
+
+        on_conflict = OnConflict.IGNORE if ignore_conflicts else None
+        qn = connection.ops.quote_name
+        self.sql = ' '.join(filter(None, [
+            connection.ops.insert_statement(on_conflict=on_conflict),
+            qn(model._meta.db_table),
+            '(%s)' % ', '.join(qn(field.column) for field in fields),
+            'VALUES (%s)' % ', '.join(['%s'] * len(fields)),
+            connection.ops.on_conflict_suffix_sql(fields, on_conflict, None, None),
+        ]))
+
+    @staticmethod
+    def converter(field):
+        if isinstance(field, (models.IntegerField, models.ForeignKey)):
+            return int
+        if isinstance(field, (models.CharField, models.TextField)):
+            return str
+        if isinstance(field, models.DateTimeField):
+            return convert_datetime
+        return lambda value: field.get_db_prep_save(field.to_python(value), connection)
+
+    def row(self, record):
+        values = []
+        for name, fallback, convert, default in self.columns:
+            value = record.get(name) if convert else None
+            if value is None and fallback:
+                value = record.get(fallback)
+            values.append(default if value is None else convert(value))
+        return values
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk-load users, follows, posts, comments and likes from NDJSON or CSV files. '
+        'Each record has a "kind" (users, follows, posts, comments, likes) and the columns '
+        'listed in the README; ids are kept, and parents must come before their children. '
+        'Counters, the search index, timelines and trending scores are rebuilt once at the end.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+')
+        parser.add_argument('--fmt', choices=['ndjson', 'csv'], help='Default: from the file extension.')
+        parser.add_argument('--batch-size', type=int, default=20000)
+        parser.add_argument(
+            '--password', help='Password for imported users without one (hashed once). '
+                               'By default they cannot log in.',
+        )
+        parser.add_argument('--skip-counters', action='store_true')
+        parser.add_argument('--skip-search', action='store_true')
+        parser.add_argument('--skip-timelines', action='store_true')
+        parser.add_argument('--skip-trending', action='store_true')
+
+    def handle(self, *args, files, fmt, batch_size, password, **options):
+        self.User = get_user_model()
+        self.Follow = self.User.followers.through
+        self.password = make_password(password)
+        self.now = timezone.now()
+        self.batch_size = batch_size
+        self.buffers = {kind: [] for kind in KINDS}
+        self.counts = dict.fromkeys(KINDS, 0)
+        self.followed_ids = set()
+        timestamps = {'created_at': self.now, 'updated_at': self.now}
+        self.tables = {
+            'users': Table(self.User, COLUMNS['users'], defaults={'password': self.password}),
+            'follows': Table(self.Follow, COLUMNS['follows'], ignore_conflicts=True),
+            'posts': Table(
+                Post, COLUMNS['posts'], timestamps, fallbacks={'updated_at': 'created_at'}
+            ),
+            'comments': Table(
+                Comment, COLUMNS['comments'], timestamps, fallbacks={'updated_at': 'created_at'}
+            ),
+            # Repeated likes and follows are skipped rather than failing the batch
+            'likes': Table(Like, COLUMNS['likes'], timestamps, ignore_conflicts=True),
+        }
+
+        # PRAGMAs cannot be changed inside a transaction (e.g. under tests)
+        if connection.vendor == 'sqlite' and not connection.in_atomic_block:
+            with connection.cursor() as cursor:
+                # Trade durability for speed for the duration of the import
+                cursor.execute('PRAGMA synchronous = OFF')
+                cursor.execute('PRAGMA journal_mode = MEMORY')
+                cursor.execute('PRAGMA temp_store = MEMORY')
+                cursor.execute('PRAGMA cache_size = -262144')
+
+        self.started = self.reported = time.perf_counter()
+        # Like loaddata: check foreign keys once at the end instead of per row,
+        # in the same transaction so a dangling reference commits nothing
+        with connection.constraint_checks_disabled(), transaction.atomic():
+            for path in files:
+                for record in self.read(path, fmt or ('csv' if path.endswith('.csv') else 'ndjson')):
+                    self.add(record)
+            self.flush()
+            connection.check_constraints(
+                table_names=[table.model._meta.db_table for table in self.tables.values()]
+            )
+
+        elapsed = time.perf_counter() - self.started
+        total = sum(self.counts.values())
+        self.stdout.write(', '.join(f'{self.counts[kind]:,} {kind}' for kind in KINDS))
+        self.stdout.write(f'Imported {total:,} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/sec)')
+
+        self.finish(**options)
+
+    def read(self, path, fmt):
+        with open(path, newline='') as stream:
+            if fmt == 'csv':
+                for row in csv.DictReader(stream):
+                    yield {column: value for column, value in row.items() if value != ''}
+            else:
+                for number, line in enumerate(stream, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except ValueError as e:
+                        raise CommandError(f'{path}:{number}: {e}')
+
+    def add(self, record):
+        kind = record.get('kind')
+        if kind not in self.buffers:
+            raise CommandError(f'Unknown kind {kind!r}; expected one of {", ".join(KINDS)}')
+        if kind == 'follows':
+            self.followed_ids.update((int(record['follower_id']), int(record['followee_id'])))
+            record = {'from_user_id': record['followee_id'], 'to_user_id': record['follower_id']}
+        self.buffers[kind].append(self.tables[kind].row(record))
+        if len(self.buffers[kind]) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        with connection.cursor() as cursor:
+            for kind in KINDS:
+                rows = self.buffers[kind]
+                if rows:
+                    cursor.executemany(self.tables[kind].sql, rows)
+                    self.counts[kind] += len(rows)
+                    self.buffers[kind] = []
+
+        if time.perf_counter() - self.reported >= 1:
+            self.reported = time.perf_counter()
+            total = sum(self.counts.values())
+            rate = total / (self.reported - self.started)
+            self.stdout.write(f'{total:,} rows ({rate:,.0f} rows/sec)')
+
+    def finish(self, skip_counters, skip_search, skip_timelines, skip_trending, **options):
+        # Needed for threads to be read at all, so never skipped
+        threads.fill_paths()
+        if not skip_counters:
+            call_command('reconcile_counters', stdout=self.stdout)
+        if not skip_search:
+            call_command('rebuild_search_index', stdout=self.stdout)
+        if not skip_timelines:
+            written = timeline.rebuild()
+            self.stdout.write(f'Wrote {written:,} timeline entries')
+        if not skip_trending:
+            call_command('recompute_trending', stdout=self.stdout)
+
+        # Cached adjacency lists of users that gained follows are stale
+        cache.delete_many([
+            graph.cache_key(kind, user_id)
+            for user_id in self.followed_ids
+            for kind in (graph.FOLLOWING, graph.FOLLOWERS)
+        ])
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = (
+        'Fan out again the authors read on demand whose followers have dropped '
+        'TIMELINE_DEMOTE_MARGIN below TIMELINE_FANOUT_THRESHOLD, copying their recent '
+        'posts into their followers\' timelines in batches. Run it periodically.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=timeline.BATCH_SIZE)
+
+    def handle(self, *args, batch_size, **options):
+        authors = written = 0
+        for author in timeline.demotable().iterator():
+            written += timeline.demote(author, batch_size=batch_size)
+            authors += 1
+        self.stdout.write(f'Demoted {authors} authors, wrote {written} timeline entries')
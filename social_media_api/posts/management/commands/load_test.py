@@ -0,0 +1,51 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Send concurrent GET requests to a running server and report requests/sec and '
+        'latency per concurrency level, e.g. to compare /api/feed/ under gunicorn (WSGI) '
+        'with /api/async/feed/ under uvicorn (ASGI).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='Full URL to request, e.g. http://127.0.0.1:8000/api/async/feed/')
+        parser.add_argument('--token', required=True, help='Value of the Authorization header.')
+        parser.add_argument('--concurrency', default='1,8,32,64')
+        parser.add_argument('--requests', type=int, default=500, help='Requests per level.')
+        parser.add_argument('--timeout', type=float, default=30)
+
+    def handle(self, *args, url, token, concurrency, requests, timeout, **options):
+        def fetch(_):
+            started = time.perf_counter()
+            try:
+                with urlopen(Request(url, headers={'Authorization': token}), timeout=timeout) as response:
+                    response.read()
+                    status = response.status
+            except HTTPError as e:
+                status = e.code
+            return status, time.perf_counter() - started
+
+        fetch(None)
+        for workers in (int(level) for level in concurrency.split(',')):
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(fetch, range(requests)))
+            elapsed = time.perf_counter() - started
+
+            errors = sum(1 for status, _ in results if status != 200)
+            if errors == len(results):
+                raise CommandError(f'Every request failed (last status {results[-1][0]}).')
+            latencies = sorted(seconds * 1000 for _, seconds in results)
+            self.stdout.write(
+                f'concurrency {workers:>4}  {requests / elapsed:>8,.0f} req/s  '
+                f'p50 {statistics.median(latencies):>7.1f} ms  '
+                f'p95 {latencies[int(len(latencies) * 0.95) - 1]:>7.1f} ms  '
+                f'{errors} errors'
+            )
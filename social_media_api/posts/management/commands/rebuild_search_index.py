@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for posts and comments.'
+
+    def handle(self, *args, **options):
+        backend = search.get_backend()
+        for model in search.INDEXED_FIELDS:
+            backend.rebuild(model)
+            self.stdout.write(f'Rebuilt {model._meta.label} with {type(backend).__name__}')
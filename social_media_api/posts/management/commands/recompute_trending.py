@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild trending scores from the likes and comments of the last TRENDING_WINDOW '
+        'seconds. Run it every few minutes to account for unlikes and deleted comments.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=trending.BATCH_SIZE)
+
+    def handle(self, *args, batch_size, **options):
+        scored = trending.recompute(batch_size=batch_size)
+        self.stdout.write(f'Scored {scored} trending posts')
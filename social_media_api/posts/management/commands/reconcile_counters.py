@@ -0,0 +1,67 @@
+from functools import reduce
+from operator import or_
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Comment, Like, Post
+
+
+def count_of(model, field):
+    rows = model.objects.filter(**{field: OuterRef('pk')}).order_by()
+    return Coalesce(Subquery(rows.values(field).annotate(n=Count('pk')).values('n')), 0)
+
+
+class Command(BaseCommand):
+    help = 'Recompute denormalized like, comment and follower counters that have drifted.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, batch_size, **options):
+        User = get_user_model()
+        Follow = User.followers.through
+
+        targets = [
+            (Post, {
+                'likes_count': count_of(Like, 'post'),
+                'comments_count': count_of(Comment, 'post'),
+            }),
+            (User, {
+                'followers_count': count_of(Follow, 'from_user'),
+                'following_count': count_of(Follow, 'to_user'),
+            }),
+        ]
+
+        for model, counters in targets:
+            fixed = self.reconcile(model, counters, batch_size)
+            self.stdout.write(f'{model._meta.label}: fixed {fixed} rows')
+
+    def reconcile(self, model, counters, batch_size):
+        """Walk the table in primary key batches, rewriting only drifted rows."""
+        drift = reduce(or_, (~Q(**{field: F(f'actual_{field}')}) for field in counters))
+        actual = {f'actual_{field}': expression for field, expression in counters.items()}
+
+        fixed = 0
+        last_pk = 0
+        while True:
+            pks = list(
+                model.objects.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not pks:
+                return fixed
+            last_pk = pks[-1]
+
+            stale = list(
+                model.objects.filter(pk__in=pks)
+                .annotate(**actual)
+                .filter(drift)
+                .values_list('pk', flat=True)
+            )
+            if stale:
+                model.objects.filter(pk__in=stale).update(**counters)
+                fixed += len(stale)
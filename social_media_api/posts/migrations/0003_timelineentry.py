@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_timelines(apps, schema_editor):
+    User = apps.get_model('accounts', 'User')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    Follow = User._meta.get_field('followers').remote_field.through
+
+    for followee_id, follower_id in Follow.objects.values_list('from_user_id', 'to_user_id'):
+        posts = Post.objects.filter(author_id=followee_id).values_list('id', 'created_at')
+        TimelineEntry.objects.bulk_create(
+            [
+                TimelineEntry(user_id=follower_id, post_id=post_id, created_at=created_at)
+                for post_id, created_at in posts.order_by('-created_at')[:200]
+            ],
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0002_like'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-created_at'], name='posts_timeline_user_created')],
+                'unique_together': {('user', 'post')},
+            },
+        ),
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:16
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+
+    def count(model_name):
+        rows = apps.get_model('posts', model_name).objects.filter(post=OuterRef('pk')).order_by()
+        return Coalesce(Subquery(rows.values('post').annotate(n=Count('pk')).values('n')), 0)
+
+    Post.objects.update(likes_count=count('Like'), comments_count=count('Comment'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0003_timelineentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
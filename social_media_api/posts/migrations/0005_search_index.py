@@ -0,0 +1,43 @@
+from django.db import migrations
+
+INDEXED_FIELDS = {
+    'posts_post': ('title', 'content'),
+    'posts_comment': ('content',),
+}
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for table, fields in INDEXED_FIELDS.items():
+        columns = ', '.join(fields)
+        if vendor == 'sqlite':
+            schema_editor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5({columns})'
+            )
+            schema_editor.execute(
+                f'INSERT INTO {table}_fts (rowid, {columns}) SELECT id, {columns} FROM {table}'
+            )
+        elif vendor == 'mysql':
+            schema_editor.execute(
+                f'ALTER TABLE {table} ADD FULLTEXT INDEX {table}_fulltext ({columns})'
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for table in INDEXED_FIELDS:
+        if vendor == 'sqlite':
+            schema_editor.execute(f'DROP TABLE IF EXISTS {table}_fts')
+        elif vendor == 'mysql':
+            schema_editor.execute(f'ALTER TABLE {table} DROP INDEX {table}_fulltext')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_post_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
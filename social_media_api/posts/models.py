@@ -1,10 +1,12 @@
 from django.db import models
 from django.conf import settings
 
+from social_media_api.counters import CounterFieldsMixin
+
 User = settings.AUTH_USER_MODEL
 
 
-class Post(models.Model):
+class Post(CounterFieldsMixin, models.Model):
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -15,6 +17,21 @@ class Post(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Denormalized counters, kept in step with F() updates and
+    # reconciled by the reconcile_counters command
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+    counter_fields = ('likes_count', 'comments_count')
+    # Bumped whenever the comment preview may have changed (posts/caching.py)
+    comments_version = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Keyset pages of all posts and of one author's posts
+            models.Index(fields=['-created_at', '-id'], name='posts_post_created'),
+            models.Index(fields=['author', '-created_at', '-id'], name='posts_post_author_created'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -34,6 +51,41 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Replies: ``path`` holds the ids from the thread's root down to this
+    # comment, each zero-padded to PATH_DIGITS (posts/threads.py)
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='replies'
+    )
+    path = models.CharField(max_length=255, default='', editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+
+    PATH_DIGITS = 10
+    MAX_DEPTH = 255 // PATH_DIGITS - 1
+
+    class Meta:
+        indexes = [
+            # Keyset pages of all comments and of one post's comments
+            models.Index(fields=['-created_at', '-id'], name='posts_comment_created'),
+            models.Index(fields=['post', '-created_at', '-id'], name='posts_comment_post_created'),
+            # A thread or subtree is one range of paths
+            models.Index(fields=['post', 'path'], name='posts_comment_thread'),
+        ]
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        if adding and self.parent_id is not None:
+            self.depth = self.parent.depth + 1
+        super().save(*args, **kwargs)
+        if adding and not self.path:
+            # The comment's own id is part of its path
+            parent_path = self.parent.path if self.parent_id is not None else ''
+            self.path = f'{parent_path}{self.pk:0{self.PATH_DIGITS}d}'
+            Comment.objects.filter(pk=self.pk).update(path=self.path)
+
     def __str__(self):
         return f"Comment by {self.author}"
 
@@ -53,6 +105,56 @@ class Like(models.Model):
 
     class Meta:
         unique_together = ('user', 'post')
+        indexes = [
+            # Recent likes, read by recompute_trending
+            models.Index(fields=['created_at'], name='posts_like_created'),
+        ]
 
     def __str__(self):
         return f"{self.user} likes {self.post}"
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    # Copied from the post so a feed read is a single index range scan
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(
+                fields=['user', '-created_at', '-post'],
+                name='posts_timeline_user_created',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.post} in {self.user}'s timeline"
+
+
+class TrendingScore(models.Model):
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending_score'
+    )
+    # log2 of the post's time-decayed like and comment weight (posts/trending.py)
+    score = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score', '-post'], name='posts_trending_score'),
+        ]
+
+    def __str__(self):
+        return f"{self.post} trending at {self.score:.2f}"
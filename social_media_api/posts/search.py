@@ -0,0 +1,175 @@
+"""
+Full-text search for posts and comments.
+
+* SQLite: an FTS5 table per model (``posts_post_fts``) whose rowid is the
+  row's primary key, kept in sync by the signal handlers below and ranked
+  with ``bm25()``.
+* MySQL: a ``FULLTEXT`` index maintained by MySQL itself, queried in
+  boolean mode and ranked by relevance.
+* Anything else falls back to ``icontains`` scans.
+
+Every term is matched as a prefix, so ``?search=djan`` finds "Django".
+Set ``SEARCH_BACKEND`` to a dotted path to plug in another backend.
+"""
+import re
+from functools import reduce
+from operator import and_, or_
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
+
+from .models import Comment, Post
+
+INDEXED_FIELDS = {
+    Post: ('title', 'content'),
+    Comment: ('content',),
+}
+
+
+def fts_table(model):
+    return f'{model._meta.db_table}_fts'
+
+
+def split_terms(query):
+    return re.findall(r'\w+', query)
+
+
+class SearchBackend:
+    """Plain ``icontains`` matching, ordered by recency."""
+
+    def search(self, queryset, query):
+        fields = INDEXED_FIELDS[queryset.model]
+        terms = split_terms(query)
+        if not terms:
+            return queryset.none()
+        condition = reduce(and_, (
+            reduce(or_, (Q(**{f'{field}__icontains': term}) for field in fields))
+            for term in terms
+        ))
+        return queryset.filter(condition)
+
+    def index(self, instance):
+        pass
+
+    def remove(self, instance):
+        pass
+
+    def rebuild(self, model):
+        pass
+
+
+class SQLiteSearchBackend(SearchBackend):
+
+    def search(self, queryset, query):
+        terms = split_terms(query)
+        if not terms:
+            return queryset.none()
+        match = ' '.join(f'"{term}"*' for term in terms)
+        table = fts_table(queryset.model)
+        base = queryset.model._meta.db_table
+
+        # Join the index once: the MATCH scan yields both the rows and their
+        # rank. bm25() is lower for better matches.
+        return (
+            queryset.extra(
+                tables=[table],
+                where=[f'{table}.rowid = {base}.id', f'{table} MATCH %s'],
+                params=[match],
+            )
+            .annotate(search_rank=RawSQL(f'bm25({table})', (), output_field=FloatField()))
+            .order_by('search_rank', '-id')
+        )
+
+    def index(self, instance):
+        model = type(instance)
+        table = fts_table(model)
+        fields = INDEXED_FIELDS[model]
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {table} WHERE rowid = %s', [instance.pk])
+            cursor.execute(
+                f'INSERT INTO {table} (rowid, {", ".join(fields)}) '
+                f'VALUES (%s, {", ".join(["%s"] * len(fields))})',
+                [instance.pk] + [getattr(instance, field) for field in fields],
+            )
+
+    def remove(self, instance):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {fts_table(type(instance))} WHERE rowid = %s', [instance.pk])
+
+    def rebuild(self, model):
+        table = fts_table(model)
+        columns = ', '.join(INDEXED_FIELDS[model])
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {table}')
+            cursor.execute(
+                f'INSERT INTO {table} (rowid, {columns}) '
+                f'SELECT id, {columns} FROM {model._meta.db_table}'
+            )
+
+
+class MySQLSearchBackend(SearchBackend):
+
+    def search(self, queryset, query):
+        terms = split_terms(query)
+        if not terms:
+            return queryset.none()
+        match = ' '.join(f'+{term}*' for term in terms)
+        base = queryset.model._meta.db_table
+        columns = ', '.join(f'{base}.{field}' for field in INDEXED_FIELDS[queryset.model])
+
+        relevance = RawSQL(f'MATCH ({columns}) AGAINST (%s IN BOOLEAN MODE)', (match,))
+        return (
+            queryset.annotate(search_rank=relevance)
+            .filter(search_rank__gt=0)
+            .order_by('-search_rank', '-id')
+        )
+
+    def rebuild(self, model):
+        with connection.cursor() as cursor:
+            cursor.execute(f'OPTIMIZE TABLE {model._meta.db_table}')
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'mysql': MySQLSearchBackend,
+}
+
+
+def get_backend():
+    path = getattr(settings, 'SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    return BACKENDS.get(connection.vendor, SearchBackend)()
+
+
+def update_index(sender, instance, **kwargs):
+    get_backend().index(instance)
+
+
+def remove_from_index(sender, instance, **kwargs):
+    get_backend().remove(instance)
+
+
+class FullTextSearchFilter(BaseFilterBackend):
+    """Drop-in replacement for ``SearchFilter`` using the search backend."""
+    search_param = api_settings.SEARCH_PARAM
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        return get_backend().search(queryset, query)
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.search_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Full-text search terms, matched as prefixes.',
+            'schema': {'type': 'string'},
+        }]
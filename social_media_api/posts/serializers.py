@@ -1,8 +1,21 @@
 from rest_framework import serializers
 from .models import Post, Comment
+from social_media_api.read_serializers import ValuesSerializer, datetime_formatter
+from .fieldsets import annotate_snippet, snippet_formatter, snippet_length
+
+
+class SparseFieldsMixin:
+    """Accepts ``fields`` to keep only some of the declared fields."""
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
 
 #Post Serializer
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     author = serializers.ReadOnlyField(source='author.username')
 
     class Meta:
@@ -14,7 +27,34 @@ class PostSerializer(serializers.ModelSerializer):
             'content',
             'created_at',
             'updated_at',
+            'likes_count',
+            'comments_count',
         ]
+        read_only_fields = ['likes_count', 'comments_count']
+
+#Compact Post Serializer
+class PostCompactSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    author = serializers.ReadOnlyField(source='author.username')
+    snippet = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Post
+        fields = [
+            'id',
+            'author',
+            'title',
+            'snippet',
+            'created_at',
+            'likes_count',
+            'comments_count',
+        ]
+
+    def get_snippet(self, post):
+        # Annotated by posts.fieldsets with one character too many
+        text = getattr(post, 'snippet_text', None)
+        if text is None:
+            text = post.content[:snippet_length() + 1]
+        return snippet_formatter()(text)
 
 #Comment Serializer
 class CommentSerializer(serializers.ModelSerializer):
@@ -25,8 +65,129 @@ class CommentSerializer(serializers.ModelSerializer):
         fields = [
             'id',
             'post',
+            'parent',
+            'depth',
             'author',
             'content',
             'created_at',
             'updated_at',
         ]
+
+    def validate(self, data):
+        if self.instance is not None:
+            # Paths are fixed when a comment is written
+            for field in ('post', 'parent'):
+                if field in data and data[field] != getattr(self.instance, field):
+                    raise serializers.ValidationError({field: "Comments cannot be moved"})
+            return data
+
+        parent = data.get('parent')
+        if parent is not None:
+            if parent.post_id != data['post'].id:
+                raise serializers.ValidationError({'parent': "Reply to a comment on the same post"})
+            if parent.depth >= Comment.MAX_DEPTH:
+                raise serializers.ValidationError({'parent': "Replies are nested too deeply"})
+        return data
+
+#Read-only mirrors of the serializers above for list responses
+class PostReadSerializer(ValuesSerializer):
+    columns = {
+        'id': 'id',
+        'author': 'author__username',
+        'title': 'title',
+        'content': 'content',
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+        'likes_count': 'likes_count',
+        'comments_count': 'comments_count',
+    }
+    formatters = {'created_at': datetime_formatter, 'updated_at': datetime_formatter}
+
+    class Meta:
+        serializer = PostSerializer
+
+
+class PostCompactReadSerializer(ValuesSerializer):
+    columns = {
+        'id': 'id',
+        'author': 'author__username',
+        'title': 'title',
+        'snippet': 'snippet_text',
+        'created_at': 'created_at',
+        'likes_count': 'likes_count',
+        'comments_count': 'comments_count',
+    }
+    formatters = {'snippet': snippet_formatter, 'created_at': datetime_formatter}
+
+    class Meta:
+        serializer = PostCompactSerializer
+
+    def rows(self, queryset):
+        if 'snippet' in self.fields and 'snippet_text' not in queryset.query.annotations:
+            queryset = annotate_snippet(queryset)
+        return super().rows(queryset)
+
+
+class CommentReadSerializer(ValuesSerializer):
+    columns = {
+        'id': 'id',
+        'post': 'post_id',
+        'parent': 'parent_id',
+        'depth': 'depth',
+        'author': 'author__username',
+        'content': 'content',
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+    }
+    formatters = {'created_at': datetime_formatter, 'updated_at': datetime_formatter}
+
+    class Meta:
+        serializer = CommentSerializer
+
+#Like Batch Serializer
+class LikeBatchSerializer(serializers.Serializer):
+    like = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        max_length=500
+    )
+    unlike = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        max_length=500
+    )
+
+    def validate(self, data):
+        like = set(data.get('like', []))
+        unlike = set(data.get('unlike', []))
+        if not like and not unlike:
+            raise serializers.ValidationError("Provide post ids to like or unlike")
+        if like & unlike:
+            raise serializers.ValidationError("A post cannot be liked and unliked at once")
+        return {'like': like, 'unlike': unlike}
+
+#Trending Query Serializer
+class TrendingQuerySerializer(serializers.Serializer):
+    # Capped at TRENDING_SIZE by posts.trending.TopK
+    limit = serializers.IntegerField(min_value=1, default=20)
+
+#Feed Query Serializer
+class FeedQuerySerializer(serializers.Serializer):
+    # The whole feed in one streamed response instead of a page
+    stream = serializers.BooleanField(default=False)
+
+#Comment Query Serializer
+class CommentQuerySerializer(serializers.Serializer):
+    # A post's top-level comments, with ``depth`` levels of replies nested
+    post = serializers.IntegerField(required=False)
+    depth = serializers.IntegerField(min_value=0, max_value=Comment.MAX_DEPTH, default=0)
+
+    def validate(self, data):
+        if data['depth'] and 'post' not in data:
+            raise serializers.ValidationError({'depth': "Only available with post"})
+        return data
+
+#Thread Query Serializer
+class ThreadQuerySerializer(serializers.Serializer):
+    # Levels of replies below the comment; the whole thread by default
+    depth = serializers.IntegerField(min_value=0, max_value=Comment.MAX_DEPTH, required=False)
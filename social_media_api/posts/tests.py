@@ -1,3 +1,1187 @@
-from django.test import TestCase
+import base64
+import csv
+import io
+import json
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from io import StringIO
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.db.models import QuerySet
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from accounts import graph
+from accounts.authentication import token_cache
+from notifications.models import Notification, NotificationEvent
+from social_media_api import query_plans
+from social_media_api.query_plans import QueryPlanAssertions
+from social_media_api.renderers import FastJSONRenderer
+
+from . import caching, timeline, trending
+from .models import Comment, Like, Post, TimelineEntry, TrendingScore
+from .serializers import (
+    CommentReadSerializer, CommentSerializer, PostCompactReadSerializer, PostCompactSerializer,
+    PostReadSerializer, PostSerializer,
+)
+
+User = get_user_model()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class TimelineTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.reader = User.objects.create_user(username='reader', password='pass12345')
+        self.author = User.objects.create_user(username='author', password='pass12345')
+        self.client.force_authenticate(self.reader)
+
+    def follow(self, user):
+        return self.client.post(f'/api/accounts/follow/{user.id}/')
+
+    def test_new_posts_are_fanned_out_to_followers(self):
+        self.follow(self.author)
+        self.client.force_authenticate(self.author)
+        self.client.post('/api/posts/', {'title': 'Hello', 'content': 'World'})
+
+        self.assertEqual(TimelineEntry.objects.filter(user=self.reader).count(), 1)
+
+    def test_follow_backfills_and_unfollow_trims(self):
+        Post.objects.create(author=self.author, title='Old', content='post')
+
+        self.follow(self.author)
+        response = self.client.get('/api/feed/')
+        self.assertEqual([post['title'] for post in response.data['results']], ['Old'])
+
+        self.client.post(f'/api/accounts/unfollow/{self.author.id}/')
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.client.get('/api/feed/').data['results'], [])
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=1)
+    def test_popular_authors_are_merged_on_read(self):
+        self.follow(self.author)
+        Post.objects.create(author=self.author, title='Pulled', content='post')
+
+        response = self.client.get('/api/feed/')
+
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual([post['title'] for post in response.data['results']], ['Pulled'])
+
+    def titles(self):
+        return [post['title'] for post in self.client.get('/api/feed/').data['results']]
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=2)
+    def test_author_crossing_above_the_threshold_is_not_listed_twice(self):
+        self.follow(self.author)
+        self.client.force_authenticate(self.author)
+        self.client.post('/api/posts/', {'title': 'Pushed', 'content': 'post'})
+
+        fan = User.objects.create_user(username='fan', password='pass12345')
+        self.client.force_authenticate(fan)
+        self.follow(self.author)
+        self.client.force_authenticate(self.reader)
+
+        self.assertTrue(TimelineEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.titles(), ['Pushed'])
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=3, TIMELINE_DEMOTE_MARGIN=1)
+    def test_author_dropping_below_the_margin_is_fanned_out_by_command(self):
+        fans = [User.objects.create_user(username=f'fan{i}', password='pass12345') for i in range(2)]
+        for user in (self.reader, *fans):
+            self.client.force_authenticate(user)
+            self.follow(self.author)
+        Post.objects.create(author=self.author, title='Pulled', content='post')
+
+        # Just below the threshold the author is still read on demand
+        self.client.post(f'/api/accounts/unfollow/{self.author.id}/')
+        call_command('demote_authors', stdout=StringIO())
+        self.client.force_authenticate(self.reader)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.titles(), ['Pulled'])
+
+        self.client.force_authenticate(fans[0])
+        self.client.post(f'/api/accounts/unfollow/{self.author.id}/')
+        self.assertFalse(TimelineEntry.objects.exists())
+        out = StringIO()
+        call_command('demote_authors', batch_size=1, stdout=out)
+
+        self.assertIn('Demoted 1 authors, wrote 1 timeline entries', out.getvalue())
+        self.author.refresh_from_db()
+        self.assertFalse(self.author.pull_author)
+        self.client.force_authenticate(self.reader)
+        self.assertTrue(TimelineEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.titles(), ['Pulled'])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class KeysetPaginationTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader', password='pass12345')
+        self.client.force_authenticate(self.user)
+        self.posts = [
+            Post.objects.create(author=self.user, title=f'Post {i}', content='text')
+            for i in range(5)
+        ]
+
+    def titles(self, response):
+        return [post['title'] for post in response.data['results']]
+
+    def test_next_and_previous_cursors_walk_the_list(self):
+        first = self.client.get('/api/posts/?page_size=2')
+        self.assertEqual(self.titles(first), ['Post 4', 'Post 3'])
+        self.assertIsNone(first.data['previous'])
+
+        second = self.client.get(first.data['next'])
+        self.assertEqual(self.titles(second), ['Post 2', 'Post 1'])
+
+        last = self.client.get(second.data['next'])
+        self.assertEqual(self.titles(last), ['Post 0'])
+        self.assertIsNone(last.data['next'])
+
+        back = self.client.get(last.data['previous'])
+        self.assertEqual(self.titles(back), ['Post 2', 'Post 1'])
+
+    def test_no_count_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/posts/?page_size=2')
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get('/api/posts/?cursor=garbage')
+        self.assertEqual(response.status_code, 404)
+
+    def test_malformed_cursor_positions_are_not_found(self):
+        created_at = self.posts[0].created_at.isoformat()
+        for position in (['yesterday', self.posts[0].id], [created_at, {'id': 1}], [created_at]):
+            data = json.dumps({'p': position, 'r': 0}).encode()
+            cursor = base64.urlsafe_b64encode(data).decode()
+            with self.subTest(position=position):
+                response = self.client.get('/api/posts/', {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=2)
+    def test_feed_pages_merge_timeline_and_pulled_authors(self):
+        pushed = User.objects.create_user(username='pushed', password='pass12345')
+        pulled = User.objects.create_user(username='pulled', password='pass12345')
+        pulled.followers.add(User.objects.create_user(username='fan', password='pass12345'))
+        for user in (pushed, pulled):
+            self.client.post(f'/api/accounts/follow/{user.id}/')
+
+        for i in range(3):
+            for author in (pushed, pulled):
+                self.client.force_authenticate(author)
+                self.client.post('/api/posts/', {'title': f'{author} {i}', 'content': 'text'})
+        self.client.force_authenticate(self.user)
+
+        seen = []
+        url = '/api/feed/?page_size=4'
+        while url:
+            response = self.client.get(url)
+            seen += response.data['results']
+            url = response.data['next']
+
+        self.assertEqual([post['title'] for post in seen], [
+            'pulled 2', 'pushed 2', 'pulled 1', 'pushed 1', 'pulled 0', 'pushed 0',
+        ])
+
+        # The same posts in a single streamed array, read a few at a time
+        with self.settings(TIMELINE_STREAM_CHUNK_SIZE=4):
+            response = self.client.get('/api/feed/', {'stream': 'true'})
+            self.assertEqual(response['Content-Type'], 'application/json')
+            self.assertEqual(json.loads(b''.join(response.streaming_content)), seen)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class CounterTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader', password='pass12345')
+        self.author = User.objects.create_user(username='author', password='pass12345')
+        self.post = Post.objects.create(author=self.author, title='Post', content='text')
+        self.client.force_authenticate(self.user)
+
+    def test_likes_and_comments_are_counted(self):
+        self.client.post(f'/api/posts/{self.post.id}/like/')
+        self.client.post(f'/api/posts/{self.post.id}/like/')
+        self.client.post('/api/comments/', {'post': self.post.id, 'content': 'Nice'})
+
+        response = self.client.get(f'/api/posts/{self.post.id}/')
+        self.assertEqual(response.data['likes_count'], 1)
+        self.assertEqual(response.data['comments_count'], 1)
+
+        self.client.post(f'/api/posts/{self.post.id}/unlike/')
+        self.client.delete(f'/api/comments/{Comment.objects.get().id}/')
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.comments_count), (0, 0))
+
+    def test_saving_a_stale_instance_keeps_counters(self):
+        self.client.post(f'/api/posts/{self.post.id}/like/')
+
+        self.post.title = 'Edited'
+        self.post.save()
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+
+    def test_follow_counts(self):
+        self.client.post(f'/api/accounts/follow/{self.author.id}/')
+        self.client.post(f'/api/accounts/follow/{self.author.id}/')
+
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 1)
+        self.assertEqual(self.client.get('/api/accounts/profile/').data['following_count'], 1)
+
+        self.client.post(f'/api/accounts/unfollow/{self.author.id}/')
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 0)
+
+    def test_drifted_counters_stop_at_zero(self):
+        self.post.likes.create(user=self.user)
+        self.author.followers.add(self.user)
+        Comment.objects.create(post=self.post, author=self.user, content='Nice')
+
+        for path in (
+            f'/api/posts/{self.post.id}/unlike/', f'/api/accounts/unfollow/{self.author.id}/'
+        ):
+            self.assertEqual(self.client.post(path).status_code, 200)
+        self.client.delete(f'/api/comments/{Comment.objects.get().id}/')
+
+        self.post.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.comments_count), (0, 0))
+        self.assertEqual(self.author.followers_count, 0)
+
+    def test_reconcile_counters_fixes_drift(self):
+        self.post.likes.create(user=self.user)
+        self.author.followers.add(self.user)
+        Post.objects.filter(pk=self.post.pk).update(comments_count=7)
+
+        out = StringIO()
+        call_command('reconcile_counters', batch_size=1, stdout=out)
+
+        self.post.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.comments_count), (1, 0))
+        self.assertEqual(self.author.followers_count, 1)
+        self.assertIn('posts.Post: fixed 1 rows', out.getvalue())
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, TIMELINE_FANOUT_THRESHOLD=3)
+class QueryBudgetTests(APITestCase):
+    """Each list endpoint issues a fixed number of queries whatever the page size."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader', password='pass12345')
+        authors = [
+            User.objects.create_user(username=f'author{i}', password='pass12345')
+            for i in range(4)
+        ]
+        # author0 is popular enough to be merged into feeds on read
+        for fan in authors[1:]:
+            fan.follow(authors[0])
+        for author in authors:
+            self.user.follow(author)
+
+        for i in range(25):
+            author = authors[i % len(authors)]
+            post = Post.objects.create(author=author, title=f'Post {i}', content='text')
+            timeline.fan_out(post)
+            Comment.objects.create(post=post, author=authors[(i + 1) % len(authors)], content='hi')
+
+        self.client.force_authenticate(self.user)
+
+    def assertQueryBudget(self, url, budget):
+        for page_size in (2, 20):
+            with self.assertNumQueries(budget):
+                response = self.client.get(url, {'page_size': page_size})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), page_size)
+
+    def test_post_list(self):
+        self.assertQueryBudget('/api/posts/', 1)
+
+    def test_comment_list(self):
+        self.assertQueryBudget('/api/comments/', 1)
+
+    def test_feed(self):
+        # pulled authors, timeline page, pulled authors' page
+        self.assertQueryBudget('/api/feed/', 3)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class SearchTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader', password='pass12345')
+        self.client.force_authenticate(self.user)
+
+    def search(self, url, query, **params):
+        response = self.client.get(url, {'search': query, **params})
+        return [item['id'] for item in response.data['results']], response
+
+    def test_prefix_match_and_ranking(self):
+        weak = Post.objects.create(author=self.user, title='Notes', content='some django tips')
+        strong = Post.objects.create(author=self.user, title='Django', content='django django')
+        Post.objects.create(author=self.user, title='Flask', content='nothing related')
+
+        ids, _ = self.search('/api/posts/', 'djan')
+
+        self.assertEqual(ids, [strong.id, weak.id])
+
+    def test_index_is_scanned_once(self):
+        Post.objects.create(author=self.user, title='Django', content='django')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.search('/api/posts/', 'djan')
+
+        [sql] = [query['sql'] for query in queries if 'MATCH' in query['sql']]
+        scans = [step for step in query_plans.explain(sql) if 'posts_post_fts' in step]
+        self.assertEqual(len(scans), 1)
+
+    def test_index_follows_updates_and_deletes(self):
+        post = Post.objects.create(author=self.user, title='Old title', content='text')
+        post.title = 'Fresh title'
+        post.save()
+
+        self.assertEqual(self.search('/api/posts/', 'old')[0], [])
+        self.assertEqual(self.search('/api/posts/', 'fresh')[0], [post.id])
+
+        post.delete()
+        self.assertEqual(self.search('/api/posts/', 'fresh')[0], [])
+
+    def test_ranked_results_paginate(self):
+        for i in range(5):
+            Post.objects.create(author=self.user, title=f'Python {i}', content='python ' * i)
+
+        ids, response = self.search('/api/posts/', 'python', page_size=2)
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            ids += [item['id'] for item in response.data['results']]
+
+        self.assertEqual(sorted(ids), sorted(Post.objects.values_list('id', flat=True)))
+
+    def test_comment_search(self):
+        post = Post.objects.create(author=self.user, title='Post', content='text')
+        comment = Comment.objects.create(post=post, author=self.user, content='Great answer')
+
+        self.assertEqual(self.search('/api/comments/', 'answ')[0], [comment.id])
+
+    def test_rebuild_search_index(self):
+        post = Post.objects.create(author=self.user, title='Rebuilt', content='text')
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM posts_post_fts')
+
+        call_command('rebuild_search_index', stdout=StringIO())
+
+        self.assertEqual(self.search('/api/posts/', 'rebuilt')[0], [post.id])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class RepresentationCacheTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader', password='pass12345')
+        self.post = Post.objects.create(author=self.user, title='Post', content='text')
+        self.url = f'/api/posts/{self.post.id}/'
+        self.client.force_authenticate(self.user)
+
+    def test_etag_revalidation(self):
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.client.post(f'/api/posts/{self.post.id}/like/')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['likes_count'], 1)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_cached_representation_is_reused_until_the_row_changes(self):
+        self.client.get(self.url)
+        self.assertIsNotNone(cache.get(caching.cache_key(Post, self.post.id)))
+
+        self.client.patch(self.url, {'title': 'Edited'})
+        self.assertIsNone(cache.get(caching.cache_key(Post, self.post.id)))
+        self.assertEqual(self.client.get('/api/posts/').data['results'][0]['title'], 'Edited')
+
+    def test_author_rename_changes_the_etag(self):
+        Comment.objects.create(post=self.post, author=self.user, content='hi')
+        etag = self.client.get(self.url)['ETag']
+        self.client.get('/api/posts/')
+
+        self.client.patch('/api/accounts/profile/', {'username': 'renamed'})
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['author'], 'renamed')
+        self.assertEqual(response.data['comments_preview'][0]['author'], 'renamed')
+        self.assertEqual(self.client.get('/api/posts/').data['results'][0]['author'], 'renamed')
+
+    def test_comment_last_modified(self):
+        comment = Comment.objects.create(post=self.post, author=self.user, content='hi')
+        url = f'/api/comments/{comment.id}/'
+        last_modified = self.client.get(url)['Last-Modified']
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class BatchLikeTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader', password='pass12345')
+        self.author = User.objects.create_user(username='author', password='pass12345')
+        self.posts = [
+            Post.objects.create(author=self.author, title=f'Post {i}', content='text')
+            for i in range(4)
+        ]
+        self.client.force_authenticate(self.user)
+
+    def batch(self, **data):
+        return self.client.post('/api/likes/batch/', data, format='json')
+
+    def test_batch_like_and_unlike(self):
+        ids = [post.id for post in self.posts]
+        self.client.post(f'/api/posts/{ids[0]}/like/')
+
+        response = self.batch(like=[ids[0], ids[1], ids[2], 999], unlike=[ids[3]])
+        self.assertEqual(response.data, {'liked': [ids[1], ids[2]], 'unliked': [], 'not_found': [999]})
+
+        response = self.batch(like=[ids[3]], unlike=[ids[0], ids[1]])
+        self.assertEqual(response.data, {'liked': [ids[3]], 'unliked': [ids[0], ids[1]], 'not_found': []})
+
+        counts = dict(Post.objects.values_list('id', 'likes_count'))
+        self.assertEqual(counts, {ids[0]: 0, ids[1]: 0, ids[2]: 1, ids[3]: 1})
+        self.assertEqual(
+            sorted(self.user.likes.values_list('post_id', flat=True)), [ids[2], ids[3]]
+        )
+
+    def test_batch_notifies_in_bulk(self):
+        self.batch(like=[post.id for post in self.posts])
+
+        self.assertEqual(
+            Notification.objects.filter(recipient=self.author, actor=self.user).count(), 4
+        )
+
+    def test_batch_counts_only_inserted_likes(self):
+        ids = [post.id for post in self.posts[:2]]
+        read = Like.objects.select_for_update
+
+        def racing_read(*args, **kwargs):
+            # Another request likes the first post right after it is read as not liked
+            Like.objects.create(user=self.user, post=self.posts[0])
+            return read(*args, **kwargs).exclude(post=self.posts[0])
+
+        with mock.patch.object(Like.objects, 'select_for_update', side_effect=racing_read):
+            response = self.batch(like=ids)
+
+        self.assertEqual(response.data['liked'], [ids[1]])
+        self.assertEqual(dict(Post.objects.values_list('id', 'likes_count')), {
+            ids[0]: 0, ids[1]: 1, self.posts[2].id: 0, self.posts[3].id: 0,
+        })
+        self.assertEqual(Notification.objects.filter(recipient=self.author).count(), 1)
+
+    def test_batch_locks_the_likes_it_unlikes(self):
+        self.client.post(f'/api/posts/{self.posts[0].id}/like/')
+        locked = []
+        select_for_update = QuerySet.select_for_update
+
+        def record(queryset, *args, **kwargs):
+            locked.append(queryset.model)
+            return select_for_update(queryset, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, 'select_for_update', record):
+            response = self.batch(unlike=[self.posts[0].id])
+
+        self.assertEqual(locked, [Like])
+        self.assertEqual(response.data['unliked'], [self.posts[0].id])
+
+    def test_batch_rejects_conflicting_ids(self):
+        response = self.batch(like=[self.posts[0].id], unlike=[self.posts[0].id])
+        self.assertEqual(response.status_code, 400)
+
+
+# request_finished fires on another thread under the async client, where the
+# in-memory test database is locked by the test transaction
+@override_settings(
+    SECURE_SSL_REDIRECT=False, TIMELINE_FANOUT_THRESHOLD=2, NOTIFICATIONS_QUEUE='database'
+)
+class AsyncViewTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.reader = User.objects.create_user(username='reader', password='pass12345')
+        self.authors = [
+            User.objects.create_user(username=f'author{i}', password='pass12345') for i in range(2)
+        ]
+        # author1 is followed by both others, so their posts are pulled on read
+        self.reader.follow(self.authors[0])
+        self.reader.follow(self.authors[1])
+        self.authors[0].follow(self.authors[1])
+        for i in range(6):
+            self.client.force_authenticate(self.authors[i % 2])
+            self.client.post('/api/posts/', {'title': f'Post {i}', 'content': 'text'})
+        self.client.force_authenticate(None)
+        self.headers = {'Authorization': f'Token {Token.objects.create(user=self.reader).key}'}
+
+    async def test_feed_matches_sync_feed(self):
+        url = '/api/feed/?page_size=4'
+        sync = await sync_to_async(self.client.get)(url, headers=self.headers)
+        response = await self.async_client.get('/api/async/feed/?page_size=4', headers=self.headers)
+
+        data = response.json()
+        self.assertEqual(data['results'], sync.json()['results'])
+        cursor = parse_qs(urlparse(data['next']).query)['cursor'][0]
+        response = await self.async_client.get(
+            '/api/async/feed/', {'page_size': 4, 'cursor': cursor}, headers=self.headers
+        )
+        self.assertEqual(
+            [post['title'] for post in response.json()['results']], ['Post 1', 'Post 0']
+        )
+
+    async def test_like_and_unlike(self):
+        post = await Post.objects.afirst()
+        url = f'/api/async/posts/{post.id}'
+
+        response = await self.async_client.post(f'{url}/like/', headers=self.headers)
+        self.assertEqual(response.json(), {'detail': 'Post liked'})
+        await post.arefresh_from_db()
+        self.assertEqual(post.likes_count, 1)
+        self.assertEqual(await NotificationEvent.objects.acount(), 1)
+
+        await self.async_client.post(f'{url}/unlike/', headers=self.headers)
+        response = await self.async_client.post(f'{url}/unlike/', headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+    async def test_streamed_feed_is_sent_a_chunk_at_a_time(self):
+        def stream():
+            response = self.client.get('/api/feed/?stream=true', headers=self.headers)
+            return json.loads(b''.join(response.streaming_content))
+
+        with self.settings(TIMELINE_STREAM_CHUNK_SIZE=4):
+            expected = await sync_to_async(stream)()
+            response = await self.async_client.get('/api/feed/?stream=true', headers=self.headers)
+
+            # Django sends an async body under ASGI without buffering it first
+            self.assertTrue(response.is_async)
+            chunks = [chunk async for chunk in response.streaming_content]
+        # The brackets, then one chunk of four posts and one of two
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(json.loads(b''.join(chunks)), expected)
+
+    async def test_errors_use_drf_format(self):
+        response = await self.async_client.get('/api/async/feed/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Token')
+
+        response = await self.async_client.post('/api/async/posts/999/like/', headers=self.headers)
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('detail', response.json())
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, EXPORT_CHUNK_SIZE=2)
+class ExportTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', password='pass12345')
+        other = User.objects.create_user(username='other', password='pass12345')
+        self.posts = [
+            Post.objects.create(author=self.user, title=f'Post {i}', content='a, "quoted"\nline')
+            for i in range(3)
+        ]
+        theirs = Post.objects.create(author=other, title='Theirs', content='text')
+        Comment.objects.create(author=self.user, post=theirs, content='nice')
+        Comment.objects.create(author=other, post=self.posts[0], content='thanks')
+        self.client.force_authenticate(self.user)
+        self.client.post(f'/api/posts/{theirs.id}/like/')
+
+    def export(self, **params):
+        response = self.client.get('/api/export/', params)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson_export(self):
+        lines = [json.loads(line) for line in self.export().splitlines()]
+
+        kinds = [line['kind'] for line in lines]
+        self.assertEqual(kinds, ['posts'] * 3 + ['comments', 'likes'])
+        self.assertEqual(lines[0]['content'], 'a, "quoted"\nline')
+
+    def test_csv_export_of_selected_kinds(self):
+        content = self.export(fmt='csv', kinds='comments,posts')
+
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual([row['kind'] for row in rows], ['posts'] * 3 + ['comments'])
+        self.assertEqual(rows[3]['content'], 'nice')
+        self.assertEqual(rows[0]['content'], 'a, "quoted"\nline')
+
+    def test_rejects_unknown_kinds(self):
+        response = self.client.get('/api/export/', {'kinds': 'passwords'})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_export_streams_asynchronously_under_asgi(self):
+        token = await Token.objects.acreate(user=self.user)
+        response = await self.async_client.get(
+            '/api/export/', {'fmt': 'csv'}, headers={'Authorization': f'Token {token.key}'}
+        )
+
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual(content, await sync_to_async(self.export)(fmt='csv'))
+
+    def test_management_command(self):
+        out = StringIO()
+        call_command('export_user_data', 'user', kinds='likes', stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['kind'], 'likes')
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class BulkImportTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as stream:
+            stream.write(content)
+        return path
+
+    def test_import_ndjson_and_csv(self):
+        records = [
+            {'kind': 'users', 'id': 501, 'username': 'ann'},
+            {'kind': 'users', 'id': 502, 'username': 'bob'},
+            {'kind': 'follows', 'follower_id': 502, 'followee_id': 501},
+            {'kind': 'follows', 'follower_id': 502, 'followee_id': 501},
+            {'kind': 'posts', 'id': 601, 'author_id': 501, 'title': 'Imported django post',
+             'content': 'text', 'created_at': '2024-05-01T10:00:00+00:00'},
+        ]
+        ndjson = self.write('seed.ndjson', ''.join(json.dumps(record) + '\n' for record in records))
+        rows = (
+            'kind,id,post_id,parent_id,author_id,user_id,content\n'
+            'comments,701,601,,502,,hello\n'
+            'comments,702,601,701,501,,hi\n'
+            'comments,703,601,702,502,,bye\n'
+            'likes,,601,,,502,\n'
+        )
+        csv_path = self.write('more.csv', rows)
+
+        # Warm bob's cached following list, which the import must invalidate
+        self.assertEqual(list(graph.following(502)), [])
+        call_command('bulk_import', ndjson, csv_path, password='pass12345', stdout=StringIO())
+
+        post = Post.objects.get(id=601)
+        self.assertEqual(post.created_at.isoformat(), '2024-05-01T10:00:00+00:00')
+        self.assertEqual((post.likes_count, post.comments_count), (1, 3))
+        self.assertEqual(
+            list(Comment.objects.order_by('id').values_list('path', 'depth')),
+            [('0000000701', 0), ('00000007010000000702', 1), ('000000070100000007020000000703', 2)],
+        )
+        self.assertEqual(User.objects.get(id=501).followers_count, 1)
+        self.assertTrue(User.objects.get(id=502).check_password('pass12345'))
+        self.assertEqual(list(graph.following(502)), [501])
+        self.assertTrue(TimelineEntry.objects.filter(user_id=502, post_id=601).exists())
+
+        self.client.force_authenticate(User.objects.get(id=502))
+        response = self.client.get('/api/posts/', {'search': 'djan'})
+        self.assertEqual([p['id'] for p in response.data['results']], [601])
+
+    def test_dangling_references_are_rejected(self):
+        path = self.write('bad.ndjson', ''.join(json.dumps(record) + '\n' for record in [
+            {'kind': 'users', 'id': 501, 'username': 'ann'},
+            {'kind': 'posts', 'id': 601, 'author_id': 999, 'title': 't', 'content': 'c'},
+        ]))
+        # The user is flushed in a batch of its own before the bad post
+        with self.assertRaises(IntegrityError):
+            call_command('bulk_import', path, batch_size=1, stdout=StringIO())
+
+        self.assertFalse(User.objects.filter(id=501).exists())
+        self.assertFalse(Post.objects.filter(id=601).exists())
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class TrendingTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        trending.top_posts.clear()
+        self.user = User.objects.create_user(username='trender', password='pass12345')
+        self.quiet, self.liked, self.discussed = Post.objects.bulk_create(
+            Post(author=self.user, title=title, content='') for title in ('quiet', 'liked', 'discussed')
+        )
+        self.client.force_authenticate(self.user)
+
+    def scores(self):
+        return dict(TrendingScore.objects.values_list('post_id', 'score'))
+
+    def test_likes_and_comments_rank_posts(self):
+        self.client.post(f'/api/posts/{self.liked.id}/like/')
+        self.client.post('/api/comments/', {'post': self.discussed.id, 'content': 'Nice'})
+
+        response = self.client.get('/api/posts/trending/')
+        self.assertEqual([post['title'] for post in response.data], ['discussed', 'liked'])
+        response = self.client.get('/api/posts/trending/', {'limit': 1})
+        self.assertEqual([post['title'] for post in response.data], ['discussed'])
+
+    def test_scores_add_up_and_decay(self):
+        now = timezone.now()
+        earlier = now - timedelta(seconds=trending.half_life())
+        trending.record(Like, [self.liked.id], at=now)
+        trending.record(Like, [self.liked.id], at=now)
+        # Two likes one half-life ago weigh as much as one like now
+        trending.record(Like, [self.quiet.id, self.discussed.id], at=earlier)
+        trending.record(Like, [self.discussed.id], at=earlier)
+
+        scores = self.scores()
+        self.assertAlmostEqual(scores[self.liked.id], trending.event_score(1, now) + 1)
+        self.assertAlmostEqual(scores[self.discussed.id], trending.event_score(1, now))
+        self.assertLess(scores[self.quiet.id], scores[self.discussed.id])
+
+    def test_recompute_matches_incremental_scores_and_drops_unliked_posts(self):
+        self.client.post(f'/api/posts/{self.liked.id}/like/')
+        self.client.post(f'/api/posts/{self.quiet.id}/like/')
+        self.client.post(f'/api/posts/{self.quiet.id}/unlike/')
+        self.client.post('/api/comments/', {'post': self.discussed.id, 'content': 'Nice'})
+        incremental = self.scores()
+
+        call_command('recompute_trending', stdout=StringIO())
+
+        scores = self.scores()
+        self.assertEqual(set(scores), {self.liked.id, self.discussed.id})
+        for post_id, score in scores.items():
+            self.assertAlmostEqual(score, incremental[post_id], places=3)
+
+
+LIMITED = {
+    **settings.REST_FRAMEWORK,
+    'DEFAULT_THROTTLE_RATES': {'auth': '1/hour', 'write': '2/hour', 'search': '1/hour', 'feed': '1/hour'},
+}
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, REST_FRAMEWORK=LIMITED)
+class ThrottleTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.user = User.objects.create_user(username='hammer', password='pass12345')
+        self.post = Post.objects.create(author=self.user, title='Post', content='text')
+        self.client.force_authenticate(self.user)
+
+    def test_writes_are_limited_per_user(self):
+        first = self.client.post(f'/api/posts/{self.post.id}/like/')
+        self.assertEqual(
+            (first['X-RateLimit-Limit'], first['X-RateLimit-Remaining'], first['X-RateLimit-Reset']),
+            ('2', '1', '0'),
+        )
+        self.client.post(f'/api/posts/{self.post.id}/unlike/')
+
+        response = self.client.post(f'/api/posts/{self.post.id}/like/')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['X-RateLimit-Remaining'], '0')
+        self.assertGreater(int(response['Retry-After']), 0)
+        # Reads and other users are not affected
+        self.assertEqual(self.client.get('/api/posts/').status_code, 200)
+        self.client.force_authenticate(User.objects.create_user(username='other', password='pass12345'))
+        self.assertEqual(self.client.post(f'/api/posts/{self.post.id}/like/').status_code, 200)
+
+    def test_search_feed_and_login_scopes(self):
+        for url in ('/api/posts/?search=post', '/api/feed/'):
+            self.assertEqual(self.client.get(url).status_code, 200)
+            self.assertEqual(self.client.get(url).status_code, 429)
+        self.assertNotIn('X-RateLimit-Limit', self.client.get('/api/posts/'))
+
+        self.client.force_authenticate(None)
+        credentials = {'username': 'hammer', 'password': 'pass12345'}
+        self.assertEqual(self.client.post('/api/accounts/login/', credentials).status_code, 200)
+        self.assertEqual(self.client.post('/api/accounts/login/', credentials).status_code, 429)
+
+    async def test_async_feed_shares_the_feed_limit(self):
+        token = await Token.objects.acreate(user=self.user)
+        headers = {'Authorization': f'Token {token.key}'}
+        self.assertEqual((await self.async_client.get('/api/async/feed/', headers=headers)).status_code, 200)
+
+        response = await sync_to_async(self.client.get)('/api/feed/')
+        self.assertEqual(response.status_code, 429)
+        response = await self.async_client.get('/api/async/feed/', headers=headers)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, TIMELINE_FANOUT_THRESHOLD=3)
+class QueryPlanTests(QueryPlanAssertions, APITestCase):
+    """The main queries behind each post endpoint are served by indexes."""
+
+    def setUp(self):
+        cache.clear()
+        trending.top_posts.clear()
+        self.user = User.objects.create_user(username='reader', password='pass12345')
+        self.authors = [
+            User.objects.create_user(username=f'author{i}', password='pass12345')
+            for i in range(4)
+        ]
+        # author0 is popular enough to be merged into feeds on read
+        for fan in self.authors[1:]:
+            fan.follow(self.authors[0])
+        for author in self.authors:
+            self.user.follow(author)
+        for i in range(8):
+            post = Post.objects.create(author=self.authors[i % 4], title=f'Post {i}', content='text')
+            timeline.fan_out(post)
+            Comment.objects.create(post=post, author=self.user, content='hi')
+        self.post = post
+        self.client.force_authenticate(self.user)
+
+    def get_pages(self, url, **params):
+        first = self.client.get(url, {'page_size': 2, **params})
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(self.client.get(first.data['next']).status_code, 200)
+
+    def test_lists(self):
+        with self.assertIndexedQueries():
+            self.get_pages('/api/posts/')
+            self.get_pages('/api/comments/')
+            self.get_pages('/api/feed/')
+
+    def test_search(self):
+        # Matches are ordered by relevance, which no index can provide
+        with self.assertIndexedQueries(allow_sort=True):
+            self.get_pages('/api/posts/', search='post')
+            self.get_pages('/api/comments/', search='hi')
+
+    def test_detail_likes_and_comments(self):
+        url = f'/api/posts/{self.post.id}'
+        with self.assertIndexedQueries():
+            self.client.get(f'{url}/')
+            self.client.post(f'{url}/like/')
+            self.client.post(f'{url}/unlike/')
+            self.client.post('/api/likes/batch/', {'like': [self.post.id]}, format='json')
+            comment = self.client.post('/api/comments/', {'post': self.post.id, 'content': 'Hi'})
+            self.client.delete(f"/api/comments/{comment.data['id']}/")
+
+    def test_trending_and_export(self):
+        self.client.post(f'/api/posts/{self.post.id}/like/')
+        # Recomputing clears the score table on purpose, but reads only recent events
+        with self.assertIndexedQueries(allow=['posts_trendingscore']):
+            call_command('recompute_trending', stdout=StringIO())
+        with self.assertIndexedQueries():
+            self.client.get('/api/posts/trending/')
+            b''.join(self.client.get('/api/export/').streaming_content)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, POSTS_SNIPPET_LENGTH=10)
+class SparseFieldsetTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader', password='pass12345')
+        author = User.objects.create_user(username='writer', password='pass12345')
+        self.post = Post.objects.create(author=author, title='Long', content='word ' * 1000)
+        Post.objects.create(author=author, title='Short', content='tiny')
+        self.client.force_authenticate(self.user)
+        self.client.post(f'/api/accounts/follow/{author.id}/')
+
+    def get(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response, ' '.join(query['sql'] for query in queries)
+
+    def test_fields_and_exclude(self):
+        response, sql = self.get('/api/posts/', fields='id,title')
+        self.assertEqual(response.data['results'][0], {'id': self.post.id + 1, 'title': 'Short'})
+        self.assertNotIn('"posts_post"."content"', sql)
+
+        response, sql = self.get(f'/api/posts/{self.post.id}/', exclude='content,updated_at')
+        self.assertNotIn('content', response.data)
+        self.assertIn('likes_count', response.data)
+        self.assertNotIn('"posts_post"."content"', sql)
+
+        # The full representation is still served from the cache afterwards
+        response, _ = self.get(f'/api/posts/{self.post.id}/')
+        self.assertEqual(response.data['content'], self.post.content)
+
+    def test_compact_view_reads_only_the_snippet(self):
+        for url in ('/api/posts/', '/api/feed/'):
+            response, sql = self.get(url, view='compact')
+            long, short = response.data['results'][1], response.data['results'][0]
+            self.assertEqual(long['snippet'], 'word word…')
+            self.assertEqual(short['snippet'], 'tiny')
+            self.assertNotIn('content', long)
+            # Only the snippet's characters are read
+            column = '"posts_post"."content"'
+            self.assertEqual(sql.count(column), sql.count(f'SUBSTR({column}, 1, 11)'))
+
+        response, _ = self.get('/api/posts/', view='compact', fields='id,snippet')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'snippet'})
+
+    def test_unknown_fields_are_rejected(self):
+        for params in ({'fields': 'id,secret'}, {'exclude': 'nope'}, {'view': 'tiny'}):
+            self.assertEqual(self.client.get('/api/posts/', params).status_code, 400)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, POSTS_SNIPPET_LENGTH=10)
+class ReadSerializerTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader', password='pass12345')
+        author = User.objects.create_user(username='wrîter', password='pass12345')
+        self.posts = [
+            Post.objects.create(author=author, title='Long', content='wörd ' * 100),
+            Post.objects.create(author=author, title='"Quoted"', content='tiny\n<b>'),
+        ]
+        Post.objects.filter(pk=self.posts[0].pk).update(likes_count=3, comments_count=1)
+        Comment.objects.create(post=self.posts[0], author=self.user, content='Nice 👍')
+        Comment.objects.create(post=self.posts[1], author=author, content='')
+        self.client.force_authenticate(self.user)
+
+    def assertSameJSON(self, serializer_class, read_serializer_class, queryset, **kwargs):
+        read_serializer = read_serializer_class(**kwargs)
+        rows = list(read_serializer.rows(queryset))
+        read_serializer.instance = rows
+        expected = serializer_class(list(queryset), many=True, **kwargs).data
+        self.assertEqual(JSONRenderer().render(read_serializer.data), JSONRenderer().render(expected))
+
+    def test_output_matches_model_serializers(self):
+        posts = Post.objects.select_related('author').order_by('-created_at', '-id')
+        comments = Comment.objects.select_related('author').order_by('-created_at', '-id')
+        for tz in ('UTC', 'Asia/Kolkata'):
+            with self.subTest(tz=tz), timezone.override(tz):
+                self.assertSameJSON(PostSerializer, PostReadSerializer, posts)
+                self.assertSameJSON(
+                    PostSerializer, PostReadSerializer, posts, fields=['id', 'updated_at']
+                )
+                self.assertSameJSON(PostCompactSerializer, PostCompactReadSerializer, posts)
+                self.assertSameJSON(CommentSerializer, CommentReadSerializer, comments)
+
+    def test_list_endpoints_read_rows(self):
+        for url, serializer_class, queryset in (
+            ('/api/posts/', PostSerializer, Post.objects.order_by('-created_at', '-id')),
+            ('/api/comments/', CommentSerializer, Comment.objects.order_by('-created_at', '-id')),
+        ):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, {'page_size': 1})
+            self.assertEqual(
+                response.data['results'], serializer_class(queryset[:1], many=True).data
+            )
+            # Only the author's username is read, not the whole user row
+            sql = ' '.join(query['sql'] for query in queries)
+            self.assertNotIn('"accounts_user"."password"', sql)
+            # Keyset pagination still reads its position from the rows
+            response = self.client.get(response.data['next'])
+            self.assertEqual(len(response.data['results']), 1)
+
+
+class RendererTests(APITestCase):
+
+    def test_fast_renderer_matches_drf(self):
+        data = {
+            'text': 'naïve "quotes" \u2028 </script>',
+            'when': timezone.now(),
+            'amount': Decimal('1.50'),
+            'nested': [{'id': 1, 'ok': True, 'none': None, 'ratio': 0.1}],
+            2: 'non-string key',
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(
+            FastJSONRenderer().render(data, 'application/json; indent=2'),
+            JSONRenderer().render(data, 'application/json; indent=2'),
+        )
+
+    def test_stream_writes_one_array(self):
+        chunks = [[{'id': 1}, {'id': 2}], [], [{'id': 3}]]
+        self.assertEqual(
+            b''.join(FastJSONRenderer().stream(iter(chunks))), b'[{"id":1},{"id":2},{"id":3}]'
+        )
+        self.assertEqual(b''.join(FastJSONRenderer().stream(iter([]))), b'[]')
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class CommentThreadTests(QueryPlanAssertions, APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader', password='pass12345')
+        self.post = Post.objects.create(author=self.user, title='Post', content='text')
+        self.client.force_authenticate(self.user)
+
+    def comment(self, content, parent=None, post=None):
+        response = self.client.post('/api/comments/', {
+            'post': (post or self.post).id, 'content': content, 'parent': parent or '',
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data['id']
+
+    def contents(self, nodes):
+        return [(node['content'], self.contents(node['replies'])) for node in nodes]
+
+    def test_thread_is_one_range_query(self):
+        root = self.comment('root')
+        first = self.comment('first', root)
+        self.comment('second', root)
+        self.comment('nested', first)
+        self.comment('other root')
+
+        with self.assertIndexedQueries(), self.assertNumQueries(2):
+            response = self.client.get(f'/api/comments/{root}/thread/')
+        self.assertEqual(response.data['depth'], 0)
+        self.assertEqual(self.contents([response.data]), [
+            ('root', [('first', [('nested', [])]), ('second', [])]),
+        ])
+
+        response = self.client.get(f'/api/comments/{first}/thread/', {'depth': 0})
+        self.assertEqual(self.contents([response.data]), [('first', [])])
+
+    def test_post_lists_top_level_comments_with_replies(self):
+        roots = [self.comment(f'root {i}') for i in range(3)]
+        self.comment('reply', roots[0])
+        self.comment('deep', self.comment('reply', roots[2]))
+        self.comment('elsewhere', post=Post.objects.create(author=self.user, title='B', content='c'))
+
+        with self.assertIndexedQueries():
+            first = self.client.get(
+                '/api/comments/', {'post': self.post.id, 'depth': 1, 'page_size': 2}
+            )
+            second = self.client.get(first.data['next'])
+        self.assertEqual(self.contents(first.data['results']), [
+            ('root 2', [('reply', [])]), ('root 1', []),
+        ])
+        self.assertEqual(self.contents(second.data['results']), [('root 0', [('reply', [])])])
+
+        # Without depth the top-level comments come on their own
+        response = self.client.get('/api/comments/', {'post': self.post.id})
+        self.assertEqual(
+            [comment['content'] for comment in response.data['results']],
+            ['root 2', 'root 1', 'root 0'],
+        )
+        self.assertNotIn('replies', response.data['results'][0])
+        self.assertEqual(self.client.get('/api/comments/', {'depth': 1}).status_code, 400)
+
+    def test_replies_stay_on_their_post_and_in_place(self):
+        root = self.comment('root')
+        other = Post.objects.create(author=self.user, title='Other', content='text')
+        response = self.client.post(
+            '/api/comments/', {'post': other.id, 'content': 'x', 'parent': root}
+        )
+        self.assertEqual(response.status_code, 400)
+
+        reply = self.comment('reply', root)
+        response = self.client.patch(f'/api/comments/{reply}/', {'parent': ''})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.patch(f'/api/comments/{reply}/', {'content': 'edited'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_deleting_a_comment_deletes_its_replies(self):
+        root = self.comment('root')
+        self.comment('nested', self.comment('reply', root))
+        self.comment('kept')
+
+        self.client.delete(f'/api/comments/{root}/')
+
+        self.assertEqual(list(Comment.objects.values_list('content', flat=True)), ['kept'])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, POSTS_COMMENT_PREVIEW_SIZE=2)
+class PostCommentsTests(QueryPlanAssertions, APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader', password='pass12345')
+        self.post = Post.objects.create(author=self.user, title='Post', content='text')
+        other = Post.objects.create(author=self.user, title='Other', content='text')
+        self.client.force_authenticate(self.user)
+        for i in range(3):
+            self.client.post('/api/comments/', {'post': self.post.id, 'content': f'comment {i}'})
+        self.client.post('/api/comments/', {'post': other.id, 'content': 'elsewhere'})
+
+    def contents(self, comments):
+        return [comment['content'] for comment in comments]
+
+    def test_comments_are_paged_by_index(self):
+        url = f'/api/posts/{self.post.id}/comments/'
+        with self.assertIndexedQueries():
+            first = self.client.get(url, {'page_size': 2})
+            second = self.client.get(first.data['next'])
+        self.assertEqual(self.contents(first.data['results']), ['comment 2', 'comment 1'])
+        self.assertEqual(self.contents(second.data['results']), ['comment 0'])
+        self.assertIsNone(second.data['next'])
+        self.assertEqual(self.client.get('/api/posts/999/comments/').status_code, 404)
+
+    def test_detail_embeds_a_cached_preview(self):
+        url = f'/api/posts/{self.post.id}/'
+        response = self.client.get(url)
+        self.assertEqual(
+            self.contents(response.data['comments_preview']), ['comment 2', 'comment 1']
+        )
+        self.assertEqual(response.data['comments_preview'][0]['author'], 'reader')
+
+        # Only the post is read once the preview is cached
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url).data, response.data)
+
+        latest = Comment.objects.get(content='comment 2')
+        self.client.patch(f'/api/comments/{latest.id}/', {'content': 'edited'})
+        self.assertEqual(
+            self.contents(self.client.get(url).data['comments_preview']), ['edited', 'comment 1']
+        )
+        self.client.delete(f'/api/comments/{latest.id}/')
+        self.assertEqual(
+            self.contents(self.client.get(url).data['comments_preview']), ['comment 1', 'comment 0']
+        )
+
+        # Sparse responses leave it out
+        self.assertNotIn('comments_preview', self.client.get(url, {'view': 'compact'}).data)
+
+    def test_comment_edit_changes_the_post_etag(self):
+        url = f'/api/posts/{self.post.id}/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        comment = Comment.objects.get(content='comment 1')
+        self.client.patch(f'/api/comments/{comment.id}/', {'content': 'edited'})
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.contents(response.data['comments_preview']), ['comment 2', 'edited'])
+
+    def test_commenter_rename_changes_the_preview(self):
+        commenter = User.objects.create_user(username='commenter', password='pass12345')
+        self.client.force_authenticate(commenter)
+        self.client.post('/api/comments/', {'post': self.post.id, 'content': 'late'})
+        url = f'/api/posts/{self.post.id}/'
+        etag = self.client.get(url)['ETag']
+
+        self.client.patch('/api/accounts/profile/', {'username': 'renamed'})
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['comments_preview'][0]['author'], 'renamed')
@@ -0,0 +1,93 @@
+"""
+Comment threads as materialized paths.
+
+A comment's ``path`` is the ids from its thread's root down to the comment
+itself, each zero-padded to ``Comment.PATH_DIGITS`` digits. Sorted by path,
+a thread lists depth first with replies oldest first, and a comment's
+subtree is the range of paths starting with its own, so a whole thread (or
+its first few levels) is one range read of the ``(post, path)`` index
+however deep or wide it is. ``nest()`` turns those rows into nested
+``replies`` in a single pass.
+"""
+from django.db.models import CharField, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Concat, LPad
+
+from .models import Comment
+
+# Sorts after every digit, closing the range of paths under a prefix
+PATH_END = '~'
+
+
+def root_path(pk):
+    """The path of a top-level comment."""
+    return f'{pk:0{Comment.PATH_DIGITS}d}'
+
+
+def subtree(comment, depth=None):
+    """``comment`` and its replies up to ``depth`` levels below it, in thread order."""
+    comments = Comment.objects.filter(
+        post_id=comment.post_id, path__gte=comment.path, path__lt=comment.path + PATH_END
+    )
+    if depth is not None:
+        comments = comments.filter(depth__lte=comment.depth + depth)
+    return comments.select_related('author').order_by('path')
+
+
+def replies(post_id, root_ids, depth):
+    """
+    The replies to the top-level comments ``root_ids`` of a post, up to
+    ``depth`` levels, in thread order. The range spans every thread between
+    the first and the last root; ``nest()`` drops the ones not asked for.
+    """
+    paths = [root_path(pk) for pk in root_ids]
+    return (
+        Comment.objects.filter(
+            post_id=post_id,
+            path__gt=min(paths),
+            path__lt=max(paths) + PATH_END,
+            depth__range=(1, depth),
+        )
+        .select_related('author')
+        .order_by('path')
+    )
+
+
+def nest(parents, items, rows):
+    """
+    Return copies of the representations ``parents`` with ``items`` (the
+    representations of ``rows``, in thread order) nested under them as
+    ``replies``. Items outside the parents' subtrees are dropped.
+    """
+    tree = [{**parent, 'replies': []} for parent in parents]
+    nodes = {node['id']: node for node in tree}
+    for item, row in zip(items, rows):
+        # Thread order puts every parent before its replies
+        parent = nodes.get(row.parent_id)
+        if parent is not None:
+            node = nodes[row.id] = {**item, 'replies': []}
+            parent['replies'].append(node)
+    return tree
+
+
+def segment():
+    return LPad(Cast('id', CharField()), Comment.PATH_DIGITS, Value('0'))
+
+
+def fill_paths():
+    """
+    Set the path and depth of comments written without them (by bulk
+    imports), one level at a time. Returns the number of comments updated.
+    """
+    updated = Comment.objects.filter(path='', parent=None).update(path=segment(), depth=0)
+    depth = 0
+    while True:
+        parent_path = Comment.objects.filter(pk=OuterRef('parent_id')).values('path')
+        level = (
+            Comment.objects.filter(path='', parent__depth=depth)
+            .exclude(parent__path='')
+            .update(path=Concat(Subquery(parent_path), segment()), depth=depth + 1)
+        )
+        if not level:
+            return updated
+        updated += level
+        depth += 1
@@ -0,0 +1,247 @@
+"""
+Materialized home timelines.
+
+New posts are pushed into every follower's timeline when they are created
+(fan-out on write), so reading a page of a feed is a single index range
+scan over ``TimelineEntry``. Authors with at least
+``TIMELINE_FANOUT_THRESHOLD`` followers are never fanned out; their posts
+are merged in when the feed is read instead (fan-out on read).
+
+An author stays on the read side until their followers drop
+``TIMELINE_DEMOTE_MARGIN`` below the threshold, so an account hovering
+around it does not switch back and forth. Switching back copies their
+recent posts into every follower's timeline, which the ``demote_authors``
+command does in batches outside of requests.
+"""
+import heapq
+from operator import attrgetter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+
+from .models import Post, TimelineEntry
+
+BATCH_SIZE = 1000
+
+
+def fanout_threshold():
+    return getattr(settings, 'TIMELINE_FANOUT_THRESHOLD', 10000)
+
+
+def demote_margin():
+    return getattr(settings, 'TIMELINE_DEMOTE_MARGIN', 1000)
+
+
+def backfill_size():
+    return getattr(settings, 'TIMELINE_BACKFILL_SIZE', 200)
+
+
+def max_length():
+    return getattr(settings, 'TIMELINE_MAX_LENGTH', 800)
+
+
+def stream_chunk_size():
+    return getattr(settings, 'TIMELINE_STREAM_CHUNK_SIZE', 500)
+
+
+def is_pull_author(author):
+    return author.pull_author or author.followers_count >= fanout_threshold()
+
+
+def pull_author_ids(user):
+    # Followed authors whose posts are read on demand instead of fanned out
+    return list(
+        user.following.filter(Q(pull_author=True) | Q(followers_count__gte=fanout_threshold()))
+        .values_list('id', flat=True)
+    )
+
+
+def promote(author):
+    """Mark ``author`` as read on demand once they reach the threshold."""
+    if author.pull_author or author.followers_count < fanout_threshold():
+        return False
+    get_user_model().objects.filter(pk=author.pk).update(pull_author=True)
+    author.pull_author = True
+    return True
+
+
+def follower_ids(author_id):
+    """Read from the follow table itself, which the graph cache may lag behind."""
+    Follow = get_user_model().followers.through
+    return Follow.objects.filter(from_user_id=author_id).values_list('to_user_id', flat=True)
+
+
+def fan_out(post):
+    """Push a new post into the timelines of its author's followers."""
+    if is_pull_author(post.author):
+        return 0
+
+    entries = [
+        TimelineEntry(user_id=follower_id, post=post, created_at=post.created_at)
+        for follower_id in follower_ids(post.author_id)
+    ]
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=BATCH_SIZE, ignore_conflicts=True
+    )
+    return len(entries)
+
+
+def demotable():
+    """Pull authors whose followers have fallen the margin below the threshold."""
+    return get_user_model().objects.filter(
+        pull_author=True, followers_count__lt=fanout_threshold() - demote_margin()
+    )
+
+
+def demote(author, batch_size=BATCH_SIZE):
+    """
+    Copy the recent posts of a pull author into their followers' timelines,
+    ``batch_size`` entries at a time, trimming each timeline to its cap, and
+    then fan their new posts out again. Until the flag is cleared the feed
+    reads their posts on demand, so followers never see them twice.
+    Returns the number of entries written.
+    """
+    posts = list(
+        Post.objects.filter(author=author)
+        .order_by('-created_at', '-id')
+        .values_list('id', 'created_at')[:backfill_size()]
+    )
+    written = 0
+    if posts:
+        for follower_id in follower_ids(author.pk).iterator(chunk_size=batch_size):
+            entries = [
+                TimelineEntry(user_id=follower_id, post_id=post_id, created_at=created_at)
+                for post_id, created_at in posts
+            ]
+            TimelineEntry.objects.bulk_create(entries, batch_size=batch_size, ignore_conflicts=True)
+            trim(follower_id)
+            written += len(entries)
+    get_user_model().objects.filter(pk=author.pk).update(pull_author=False)
+    author.pull_author = False
+    return written
+
+
+def backfill(follower, followee):
+    """Copy a newly followed author's recent posts into the follower's timeline."""
+    if is_pull_author(followee):
+        return 0
+
+    posts = (
+        Post.objects.filter(author=followee)
+        .order_by('-created_at', '-id')
+        .values_list('id', 'created_at')[:backfill_size()]
+    )
+    entries = [
+        TimelineEntry(user=follower, post_id=post_id, created_at=created_at)
+        for post_id, created_at in posts
+    ]
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=BATCH_SIZE, ignore_conflicts=True
+    )
+    trim(follower)
+    return len(entries)
+
+
+def remove_author(follower, followee):
+    """Drop an unfollowed author's posts from the follower's timeline."""
+    return TimelineEntry.objects.filter(user=follower, post__author=followee).delete()[0]
+
+
+def trim(user):
+    """
+    Keep only the newest ``TIMELINE_MAX_LENGTH`` entries of a timeline.
+    ``user`` is a user or a user id.
+    """
+    oldest_kept = (
+        TimelineEntry.objects.filter(user=user)
+        .order_by('-created_at', '-post_id')
+        .values_list('created_at', flat=True)[max_length() - 1:max_length()]
+    )
+    cutoff = oldest_kept.first()
+    if cutoff is None:
+        return 0
+    return TimelineEntry.objects.filter(user=user, created_at__lt=cutoff).delete()[0]
+
+
+def rebuild(batch_size=BATCH_SIZE):
+    """
+    Fill every timeline from the follow table in one pass, keeping each
+    user's newest ``TIMELINE_MAX_LENGTH`` posts. Used after bulk imports,
+    which skip fan-out. Returns the number of entries written.
+    """
+    Follow = get_user_model().followers.through
+    newest_first = [F('from_user__posts__created_at').desc(), F('from_user__posts__id').desc()]
+    rows = (
+        Follow.objects.filter(
+            from_user__followers_count__lt=fanout_threshold(),
+            from_user__pull_author=False,
+            from_user__posts__isnull=False,
+        )
+        .annotate(
+            entry_post_id=F('from_user__posts__id'),
+            entry_created_at=F('from_user__posts__created_at'),
+            rank=Window(RowNumber(), partition_by=F('to_user_id'), order_by=newest_first),
+        )
+        .filter(rank__lte=max_length())
+        .values_list('to_user_id', 'entry_post_id', 'entry_created_at')
+    )
+
+    written = 0
+    batch = []
+    for user_id, post_id, created_at in rows.iterator(chunk_size=batch_size):
+        batch.append(TimelineEntry(user_id=user_id, post_id=post_id, created_at=created_at))
+        if len(batch) == batch_size:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            written += len(batch)
+            batch = []
+    TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+    return written + len(batch)
+
+
+def sources(user):
+    """
+    Return the querysets that make up ``user``'s home feed.
+
+    Both are ordered by ``(feed_at, feed_id)`` so a keyset paginator can
+    merge them into a single page.
+    """
+    ordering = ('-feed_at', '-feed_id')
+    pulled = pull_author_ids(user)
+    pushed = Post.objects.filter(timeline_entries__user=user)
+    if pulled:
+        # Posts fanned out before their author crossed the threshold are
+        # read from the pull query instead, once
+        pushed = pushed.exclude(author_id__in=pulled)
+    querysets = [
+        pushed.select_related('author')
+        .annotate(
+            feed_at=F('timeline_entries__created_at'),
+            feed_id=F('timeline_entries__post_id'),
+        )
+        .order_by(*ordering)
+    ]
+
+    if pulled:
+        querysets.append(
+            Post.objects.filter(author_id__in=pulled)
+            .select_related('author')
+            .annotate(feed_at=F('created_at'), feed_id=F('id'))
+            .order_by(*ordering)
+        )
+
+    return querysets
+
+
+def merged(querysets, chunk_size=None):
+    """
+    Iterate over the results of ``sources()`` newest first, reading
+    ``chunk_size`` rows at a time from each source.
+    """
+    chunk_size = chunk_size or stream_chunk_size()
+    return heapq.merge(
+        *(queryset.iterator(chunk_size=chunk_size) for queryset in querysets),
+        key=attrgetter('feed_at', 'feed_id'),
+        reverse=True,
+    )
@@ -0,0 +1,147 @@
+"""
+Trending posts.
+
+A post's trending score adds up its likes and comments, each weighted by
+``WEIGHTS`` and halved every ``TRENDING_HALF_LIFE`` seconds since it
+happened. Scores are stored in ``TrendingScore`` as
+
+    log2(sum(weight * 2 ** ((event_time - EPOCH) / half_life)))
+
+which orders posts the same way as the decayed sum at any moment, so
+stored scores never have to be rewritten as time passes: a new like or
+comment only adds to its post's score (``record``). Keeping the log stops
+the sum from overflowing.
+
+``recompute_trending`` rebuilds the table from the last
+``TRENDING_WINDOW`` seconds of events, which accounts for unlikes and
+deleted comments and drops posts that have gone quiet. Each worker keeps
+the best ``TRENDING_SIZE`` post ids in memory (``TopK``) and reloads them
+with one index scan every ``TRENDING_REFRESH`` seconds, so serving the
+list costs O(K) however large the like table grows.
+"""
+import datetime
+import math
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Abs, Greatest, Log, Power
+from django.utils import timezone
+
+from .models import Comment, Like, TrendingScore
+
+EPOCH = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+WEIGHTS = {Like: 1, Comment: 3}
+
+BATCH_SIZE = 1000
+
+
+def half_life():
+    return getattr(settings, 'TRENDING_HALF_LIFE', 43200)
+
+
+def window():
+    return getattr(settings, 'TRENDING_WINDOW', 432000)
+
+
+def size():
+    return getattr(settings, 'TRENDING_SIZE', 100)
+
+
+def event_score(weight, at):
+    """The score of a single event of ``weight`` that happened at ``at``."""
+    return (at - EPOCH).total_seconds() / half_life() + math.log2(weight)
+
+
+def log_add(expression, value):
+    """SQL for ``log2(2 ** expression + 2 ** value)`` that cannot overflow."""
+    value = Value(value, output_field=FloatField())
+    return Greatest(expression, value) + Log(
+        2, Value(1.0) + Power(2, -Abs(expression - value)), output_field=FloatField()
+    )
+
+
+def record(model, post_ids, at=None):
+    """Add a new ``Like`` or ``Comment`` to the score of each post in ``post_ids``."""
+    post_ids = set(post_ids)
+    if not post_ids:
+        return
+    value = event_score(WEIGHTS[model], at or timezone.now())
+    with transaction.atomic():
+        existing = set(
+            TrendingScore.objects.filter(post_id__in=post_ids).values_list('post_id', flat=True)
+        )
+        TrendingScore.objects.filter(post_id__in=existing).update(
+            score=log_add(F('score'), value)
+        )
+        # A concurrent first event for the same post can win the insert;
+        # the next recompute restores the lost weight
+        TrendingScore.objects.bulk_create(
+            [TrendingScore(post_id=pk, score=value) for pk in post_ids - existing],
+            ignore_conflicts=True,
+        )
+
+
+def recompute(now=None, batch_size=BATCH_SIZE):
+    """Rebuild every score from the events in the window. Returns the row count."""
+    now = now or timezone.now()
+    since = now - datetime.timedelta(seconds=window())
+    totals = defaultdict(float)
+    # Sum relative to now so the powers stay small, then shift to EPOCH
+    for model, weight in WEIGHTS.items():
+        events = model.objects.filter(created_at__gte=since).values_list('post_id', 'created_at')
+        for post_id, created_at in events.iterator(chunk_size=batch_size):
+            totals[post_id] += weight * 2 ** ((created_at - now).total_seconds() / half_life())
+
+    offset = event_score(1, now)
+    with transaction.atomic():
+        TrendingScore.objects.all().delete()
+        TrendingScore.objects.bulk_create(
+            [
+                TrendingScore(post_id=post_id, score=offset + math.log2(total))
+                for post_id, total in totals.items()
+            ],
+            batch_size=batch_size,
+        )
+    return len(totals)
+
+
+class TopK:
+    """The ids of the best-scored posts, best first, reloaded periodically."""
+
+    def __init__(self):
+        self._ids = []
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def interval(self):
+        return getattr(settings, 'TRENDING_REFRESH', 30)
+
+    def reload(self):
+        ids = list(
+            TrendingScore.objects.order_by('-score', '-post_id')
+            .values_list('post_id', flat=True)[:size()]
+        )
+        with self._lock:
+            self._ids = ids
+            self._loaded_at = time.monotonic()
+
+    def _refresh(self):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.interval():
+            self.reload()
+
+    def get(self, limit):
+        self._refresh()
+        return self._ids[:limit]
+
+    def clear(self):
+        with self._lock:
+            self._ids = []
+            self._loaded_at = None
+
+
+top_posts = TopK()
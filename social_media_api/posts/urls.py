@@ -5,8 +5,10 @@ from .views import (
     CommentViewSet,
     FeedView,
     like_post,
-    unlike_post
+    unlike_post,
+    batch_likes
 )
+from . import async_views
 
 router = DefaultRouter()
 router.register(r'posts', PostViewSet)
@@ -18,4 +20,8 @@ urlpatterns += [
     path('feed/', FeedView.as_view()),
     path('posts/<int:pk>/like/', like_post),
     path('posts/<int:pk>/unlike/', unlike_post),
+    path('likes/batch/', batch_likes),
+    path('async/feed/', async_views.feed),
+    path('async/posts/<int:pk>/like/', async_views.like_post),
+    path('async/posts/<int:pk>/unlike/', async_views.unlike_post),
 ]
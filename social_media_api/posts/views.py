@@ -1,71 +1,253 @@
-from rest_framework import viewsets, generics, permissions, filters
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.http import StreamingHttpResponse
+from rest_framework import viewsets, generics, permissions
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes
 
 from .models import Post, Comment, Like
-from .serializers import PostSerializer, CommentSerializer
+from .serializers import (
+    PostSerializer, PostCompactSerializer, CommentSerializer, LikeBatchSerializer,
+    TrendingQuerySerializer, FeedQuerySerializer, CommentQuerySerializer, ThreadQuerySerializer,
+    PostReadSerializer, PostCompactReadSerializer, CommentReadSerializer,
+)
 from .permissions import IsOwnerOrReadOnly
-from notifications.models import Notification
-
-
-class PostViewSet(viewsets.ModelViewSet):
-    queryset = Post.objects.all().order_by('-created_at')
+from . import caching, likes, threads, timeline, trending
+from .caching import CachedRepresentationMixin
+from .fieldsets import SparseFieldsetMixin
+from .search import FullTextSearchFilter
+from notifications import pipeline
+from social_media_api.asynchronous import aiterate, is_asgi
+from social_media_api.counters import decrement
+from social_media_api.read_serializers import ValuesReadMixin
+from social_media_api.renderers import FastJSONRenderer
+
+
+class PostViewSet(
+    ValuesReadMixin, SparseFieldsetMixin, CachedRepresentationMixin, viewsets.ModelViewSet
+):
+    queryset = Post.objects.select_related('author').order_by('-created_at', '-id')
     serializer_class = PostSerializer
+    compact_serializer_class = PostCompactSerializer
+    read_serializer_classes = [PostReadSerializer, PostCompactReadSerializer]
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrReadOnly]
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['title', 'content']
+    filter_backends = [FullTextSearchFilter]
 
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
-
-
-class CommentViewSet(viewsets.ModelViewSet):
-    queryset = Comment.objects.all().order_by('-created_at')
+        post = serializer.save(author=self.request.user)
+        timeline.fan_out(post)
+
+    def representation_version(self, instance):
+        version = super().representation_version(instance)
+        if self.is_sparse():
+            return version
+        # Comment edits change the preview without touching the post
+        return f'{version}-{instance.comments_version}'
+
+    def detail_representation(self, instance):
+        data = super().detail_representation(instance)
+        if self.is_sparse():
+            return data
+        preview = caching.comment_preview(instance)
+        return {**data, 'comments_preview': preview}
+
+    @action(detail=True)
+    def comments(self, request, pk=None):
+        """The post's comments, newest first, in keyset pages."""
+        post = generics.get_object_or_404(Post.objects.only('id'), pk=pk)
+        serializer = CommentReadSerializer()
+        comments = Comment.objects.filter(post=post).order_by('-created_at', '-id')
+        serializer.instance = self.paginate_queryset(serializer.rows(comments))
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False)
+    def trending(self, request):
+        """The most liked and commented posts, recent activity counting most."""
+        query = TrendingQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        ids = trending.top_posts.get(query.validated_data['limit'])
+        posts = self.sparse(self.get_queryset()).order_by().in_bulk(ids)
+        # Posts deleted since the last reload drop out
+        ranked = [posts[pk] for pk in ids if pk in posts]
+        return Response(self.representations(ranked))
+
+
+class CommentViewSet(ValuesReadMixin, CachedRepresentationMixin, viewsets.ModelViewSet):
+    queryset = Comment.objects.select_related('author').order_by('-created_at', '-id')
     serializer_class = CommentSerializer
+    read_serializer_classes = [CommentReadSerializer]
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrReadOnly]
+    filter_backends = [FullTextSearchFilter]
+
+    def get_query(self):
+        """The validated ``?post`` and ``?depth`` of a list request."""
+        if not hasattr(self, '_query'):
+            query = CommentQuerySerializer(data=self.request.query_params)
+            query.is_valid(raise_exception=True)
+            self._query = query.validated_data
+        return self._query
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list' and 'post' in self.get_query():
+            queryset = queryset.filter(post_id=self.get_query()['post'], parent=None)
+        return queryset
+
+    def representations(self, instances):
+        data = super().representations(instances)
+        depth = self.get_query()['depth'] if self.action == 'list' else 0
+        if not depth or not data:
+            return data
+        serializer = CommentReadSerializer()
+        rows = list(serializer.rows(threads.replies(
+            self.get_query()['post'], [item['id'] for item in data], depth
+        )))
+        serializer.instance = rows
+        return threads.nest(data, serializer.data, rows)
+
+    @action(detail=True)
+    def thread(self, request, pk=None):
+        """This comment with its replies nested ``?depth`` levels deep (all by default)."""
+        query = ThreadQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        comment = self.get_object()
+        serializer = CommentReadSerializer()
+        rows = list(serializer.rows(threads.subtree(comment, query.validated_data.get('depth'))))
+        serializer.instance = rows
+        data = serializer.data
+        return Response(threads.nest(data[:1], data[1:], rows[1:])[0])
 
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        with transaction.atomic():
+            comment = serializer.save(author=self.request.user)
+            Post.objects.filter(pk=comment.post_id).update(
+                comments_count=F('comments_count') + 1,
+                comments_version=F('comments_version') + 1,
+            )
+            trending.record(Comment, [comment.post_id])
+        caching.invalidate(Post, [comment.post_id])
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            super().perform_update(serializer)
+            Post.objects.filter(pk=serializer.instance.post_id).update(
+                comments_version=F('comments_version') + 1
+            )
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            # Replies are deleted with the comment
+            removed = threads.subtree(instance).count()
+            super().perform_destroy(instance)
+            Post.objects.filter(pk=instance.post_id).update(
+                comments_count=decrement('comments_count', removed),
+                comments_version=F('comments_version') + 1,
+            )
+        caching.invalidate(Post, [instance.post_id])
+
+
+class FeedView(
+    ValuesReadMixin, SparseFieldsetMixin, CachedRepresentationMixin, generics.ListAPIView
+):
+    serializer_class = PostSerializer
+    compact_serializer_class = PostCompactSerializer
+    read_serializer_classes = [PostReadSerializer, PostCompactReadSerializer]
+    permission_classes = [IsAuthenticated]
+    throttle_scope = 'feed'
 
+    def get_queryset(self):
+        return timeline.sources(self.request.user)
 
-class FeedView(generics.GenericAPIView):
-    permission_classes = [IsAuthenticated]
+    def list(self, request, *args, **kwargs):
+        query = FeedQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        if not query.validated_data['stream']:
+            return super().list(request, *args, **kwargs)
 
-    def get(self, request):
-        following_users = request.user.following.all()
-        posts = Post.objects.filter(author__in=following_users).order_by('-created_at')
-        serializer = PostSerializer(posts, many=True)
-        return Response(serializer.data)
+        # Every post, read, serialized and written out a chunk at a time
+        rows = timeline.merged(self.filter_queryset(self.get_queryset()))
+        chunks = iter(lambda: list(islice(rows, timeline.stream_chunk_size())), [])
+        data = (self.representations(chunk) for chunk in chunks)
+        content = FastJSONRenderer().stream(data)
+        if is_asgi(request):
+            # Each chunk is read and rendered in a worker thread, then sent
+            content = aiterate(content)
+        return StreamingHttpResponse(content, content_type='application/json')
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def like_post(request, pk):
     post = generics.get_object_or_404(Post, pk=pk)
-
-    like = Like.objects.get_or_create(user=request.user, post=post)
-
-    if post.author != request.user:
-        Notification.objects.create(
-            recipient=post.author,
-            actor=request.user,
-            verb='liked your post',
-            target=post
-        )
-
+    likes.like(request.user, post)
     return Response({"detail": "Post liked"})
-    
+
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def unlike_post(request, pk):
     post = generics.get_object_or_404(Post, pk=pk)
-
-    like = Like.objects.filter(user=request.user, post=post)
-
-    if not like.exists():
+    if not likes.unlike(request.user, post):
         return Response({"detail": "Not liked yet"}, status=400)
-
-    like.delete()
     return Response({"detail": "Post unliked"})
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def batch_likes(request):
+    """
+    Like and unlike many posts at once:
+    ``{"like": [1, 2], "unlike": [3]}``.
+    """
+    serializer = LikeBatchSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    like_ids = serializer.validated_data['like']
+    unlike_ids = serializer.validated_data['unlike']
+
+    posts = {
+        post.id: post
+        for post in Post.objects.filter(id__in=like_ids | unlike_ids)
+        .select_related('author')
+        .only('id', 'author__id')
+    }
+
+    with transaction.atomic():
+        # Locked until commit, so the likes read here are the ones deleted below
+        liked = set(
+            Like.objects.select_for_update()
+            .filter(user=request.user, post_id__in=posts)
+            .values_list('post_id', flat=True)
+        )
+        to_like = sorted(pk for pk in like_ids if pk in posts and pk not in liked)
+        to_unlike = sorted(pk for pk in unlike_ids if pk in liked)
+
+        try:
+            with transaction.atomic():
+                Like.objects.bulk_create([Like(user=request.user, post_id=pk) for pk in to_like])
+        except IntegrityError:
+            # Another request liked some of these posts since the read above:
+            # keep only the likes this one adds
+            to_like = [
+                pk for pk in to_like
+                if Like.objects.get_or_create(user=request.user, post_id=pk)[1]
+            ]
+        Post.objects.filter(id__in=to_like).update(likes_count=F('likes_count') + 1)
+        trending.record(Like, to_like)
+
+        Like.objects.filter(user=request.user, post_id__in=to_unlike).delete()
+        Post.objects.filter(id__in=to_unlike).update(likes_count=decrement('likes_count'))
+
+    caching.invalidate(Post, to_like + to_unlike)
+    pipeline.enqueue_many([
+        pipeline.make_event(posts[pk].author, request.user, 'liked your post', posts[pk])
+        for pk in to_like
+    ])
+
+    return Response({
+        "liked": to_like,
+        "unliked": to_unlike,
+        "not_found": sorted((like_ids | unlike_ids) - set(posts)),
+    })
@@ -0,0 +1,95 @@
+"""
+Helpers for the async views served under ``/api/async/``.
+
+DRF's ``APIView`` only runs synchronously, so the async views are plain
+Django coroutines. ``async_api_view`` gives them the parts of DRF they
+need: the configured authenticators and throttles, ``request.query_params``,
+JSON rendering and ``APIException`` handling.
+
+``aiterate()`` lets a synchronous view stream under ASGI: Django reads a
+synchronous ``StreamingHttpResponse`` body to the end before an ASGI
+server sends any of it, but sends an asynchronous one as it is produced.
+"""
+from functools import wraps
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, HttpResponseBase
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from rest_framework.exceptions import APIException, AuthenticationFailed, NotAuthenticated, NotFound
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .renderers import FastJSONRenderer
+from .throttling import check_throttles
+
+
+def is_asgi(request):
+    """Whether ``request`` (a Django or DRF request) is served under ASGI."""
+    return isinstance(getattr(request, '_request', request), ASGIRequest)
+
+
+async def aiterate(iterator):
+    """Yield the items of a synchronous ``iterator``, advancing it in a worker thread."""
+    done = object()
+    # Thread sensitive, so every step runs on the thread holding its cursors
+    step = sync_to_async(next)
+    while (item := await step(iterator, done)) is not done:
+        yield item
+
+
+def render(data, status=200):
+    return HttpResponse(
+        FastJSONRenderer().render(data), status=status, content_type='application/json'
+    )
+
+
+def handle_exception(request, exc):
+    """Render ``exc`` the way DRF's default exception handler does."""
+    detail = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    response = render(detail, status=exc.status_code)
+    if isinstance(exc, (NotAuthenticated, AuthenticationFailed)) and request.authenticators:
+        header = request.authenticators[0].authenticate_header(request)
+        if header:
+            response['WWW-Authenticate'] = header
+    if getattr(exc, 'wait', None):
+        response['Retry-After'] = '%d' % exc.wait
+    return response
+
+
+def _authenticate(request, view):
+    # Reading .user runs the authenticators; token cache misses query the database
+    if request.user.is_authenticated:
+        check_throttles(request, view)
+    return request
+
+
+def async_api_view(methods, throttle_scope=None):
+    """Wrap an ``async def view(request, ...)`` that returns data or a response."""
+    # What the throttles see as the view
+    throttled_view = SimpleNamespace(throttle_scope=throttle_scope)
+
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            request = Request(request, authenticators=[
+                authentication() for authentication in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+            ])
+            try:
+                await sync_to_async(_authenticate)(request, throttled_view)
+                if not request.user.is_authenticated:
+                    raise NotAuthenticated()
+                response = await view(request, *args, **kwargs)
+            except Http404 as exc:
+                return handle_exception(request, NotFound(*exc.args))
+            except APIException as exc:
+                return handle_exception(request, exc)
+            if isinstance(response, HttpResponseBase):
+                return response
+            return render(response)
+
+        return csrf_exempt(require_http_methods(methods)(wrapper))
+
+    return decorator
@@ -0,0 +1,30 @@
+"""
+Denormalized counters.
+
+Counter columns (``followers_count``, ``likes_count``, ...) are only written
+with ``F()`` updates, so concurrent requests cannot overwrite each other's
+increments. ``CounterFieldsMixin`` keeps ``save()`` from writing them back
+from a stale instance, and ``decrement()`` stops at zero, so a counter that
+has drifted below the true count (until ``reconcile_counters`` fixes it)
+never breaks its column's non-negative check.
+"""
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+
+class CounterFieldsMixin:
+    """Leave the model's ``counter_fields`` out of ``save()`` on updates."""
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+def decrement(field, amount=1):
+    """``field - amount``, but never below zero."""
+    return Greatest(F(field) - amount, 0)
@@ -0,0 +1,157 @@
+"""
+Streaming export of a user's data.
+
+Rows are read with ``values().iterator(chunk_size=...)`` and written
+out one line at a time, so memory use stays flat however long the user's
+history is. Used by ``GET /api/export/`` and ``manage.py export_user_data``.
+
+Under ASGI the view streams ``aexport()``, which reads with ``aiterator()``:
+Django buffers a synchronous iterator completely before an ASGI server
+sends any of it.
+"""
+import csv
+import datetime
+import json
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework import serializers
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
+
+from notifications.models import Notification
+from posts.models import Comment, Like, Post
+from .asynchronous import is_asgi
+
+# kind: (queryset for a user, exported columns)
+KINDS = {
+    'posts': (
+        lambda user: Post.objects.filter(author=user).order_by('id'),
+        ('id', 'title', 'content', 'created_at', 'updated_at', 'likes_count', 'comments_count'),
+    ),
+    'comments': (
+        lambda user: Comment.objects.filter(author=user).order_by('id'),
+        ('id', 'post_id', 'content', 'created_at', 'updated_at'),
+    ),
+    'likes': (
+        lambda user: Like.objects.filter(user=user).order_by('id'),
+        ('id', 'post_id', 'created_at'),
+    ),
+    'notifications': (
+        lambda user: Notification.objects.filter(recipient=user).order_by('id'),
+        ('id', 'actor__username', 'verb', 'target_content_type__model', 'target_object_id',
+         'actor_count', 'is_read', 'timestamp'),
+    ),
+}
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def chunk_size():
+    return getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+
+def rows(user, kinds):
+    """Yield ``(kind, {column: value})`` for every exported row."""
+    for kind in kinds:
+        queryset, columns = KINDS[kind]
+        for row in queryset(user).values(*columns).iterator(chunk_size=chunk_size()):
+            yield kind, row
+
+
+async def arows(user, kinds):
+    """Async version of ``rows()``."""
+    for kind in kinds:
+        queryset, columns = KINDS[kind]
+        # values(), not values_list(), whose aiterator() runs its query on the event loop
+        async for row in queryset(user).values(*columns).aiterator(chunk_size=chunk_size()):
+            yield kind, row
+
+
+def encode(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+def ndjson():
+    def line(kind, row):
+        row = {column: encode(value) for column, value in row.items()}
+        return json.dumps({'kind': kind, **row}) + '\n'
+    return None, line
+
+
+class _Line:
+    """File-like object that hands back what ``csv.writer`` writes."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(kinds):
+    columns = ['kind'] + list(dict.fromkeys(
+        column for kind in kinds for column in KINDS[kind][1]
+    ))
+    writer = csv.DictWriter(_Line(), fieldnames=columns)
+
+    def line(kind, row):
+        return writer.writerow({'kind': kind, **{column: encode(value) for column, value in row.items()}})
+    return writer.writeheader(), line
+
+
+def formatter(fmt, kinds):
+    """Return the header line of a ``fmt`` export (or None) and a function formatting a row."""
+    return csv_lines(kinds) if fmt == 'csv' else ndjson()
+
+
+def export(user, fmt='ndjson', kinds=None):
+    """Return an iterator over the lines of ``user``'s export."""
+    kinds = kinds or list(KINDS)
+    header, line = formatter(fmt, kinds)
+    if header is not None:
+        yield header
+    for kind, row in rows(user, kinds):
+        yield line(kind, row)
+
+
+async def aexport(user, fmt='ndjson', kinds=None):
+    """Async version of ``export()``."""
+    kinds = kinds or list(KINDS)
+    header, line = formatter(fmt, kinds)
+    if header is not None:
+        yield header
+    async for kind, row in arows(user, kinds):
+        yield line(kind, row)
+
+
+class ExportQuerySerializer(serializers.Serializer):
+    # Not "format": DRF reserves that for content negotiation
+    fmt = serializers.ChoiceField(choices=list(FORMATS), default='ndjson')
+    kinds = serializers.MultipleChoiceField(choices=list(KINDS), required=False)
+
+    def to_internal_value(self, data):
+        if 'kinds' in data:
+            data = {**data.dict(), 'kinds': data['kinds'].split(',')}
+        return super().to_internal_value(data)
+
+
+# Export view
+class ExportView(APIView):
+    """Stream the current user's posts, comments, likes and notifications."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        serializer = ExportQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        fmt = serializer.validated_data['fmt']
+        kinds = [kind for kind in KINDS if kind in serializer.validated_data.get('kinds', KINDS)]
+
+        lines = (aexport if is_asgi(request) else export)(request.user, fmt, kinds)
+        response = StreamingHttpResponse(lines, content_type=FORMATS[fmt])
+        response['Content-Disposition'] = (
+            f'attachment; filename="{request.user.username}-export.{fmt}"'
+        )
+        return response
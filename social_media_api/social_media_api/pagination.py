@@ -0,0 +1,215 @@
+"""
+Keyset (cursor) pagination.
+
+Pages are selected with a ``WHERE (created_at, id) < (last seen)`` range on
+the queryset's ordering instead of ``OFFSET``, and no ``COUNT(*)`` is issued,
+so every page costs the same regardless of how deep the client has scrolled.
+"""
+import base64
+import binascii
+import datetime
+import heapq
+import json
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    # Used when the queryset is unordered. The last field must be unique,
+    # and every field must be readable as an attribute of the results.
+    ordering = ('-created_at', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        Paginate a queryset, or a list of querysets sharing the same
+        ordering whose results are merged into a single page.
+        """
+        pages = self.get_pages(queryset, request)
+        try:
+            return self.build_page([list(page) for page in pages])
+        except ValidationError:
+            raise NotFound(self.invalid_cursor_message)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """``paginate_queryset()`` for async views, using the async ORM."""
+        pages = self.get_pages(queryset, request)
+        try:
+            return self.build_page([[obj async for obj in page] for page in pages])
+        except ValidationError:
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_pages(self, queryset, request):
+        """Return one unevaluated, sliced page per source queryset."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        sources = queryset if isinstance(queryset, (list, tuple)) else [queryset]
+        self.ordering = self.get_ordering(sources[0])
+        self.position, self.reverse = self.decode_cursor(request, sources[0])
+
+        ordering = self.ordering
+        if self.reverse:
+            ordering = [self.flip(field) for field in ordering]
+
+        pages = []
+        for source in sources:
+            source = source.order_by(*ordering)
+            if self.position is not None:
+                source = source.filter(self.position_filter(ordering, self.position))
+            pages.append(source[:self.page_size + 1])
+        return pages
+
+    def build_page(self, pages):
+        """Merge the evaluated pages and work out the next/previous links."""
+        if len(pages) == 1:
+            results = pages[0]
+        else:
+            results = list(heapq.merge(
+                *pages,
+                key=self.get_position,
+                reverse=self.ordering[0].startswith('-') != self.reverse,
+            ))[:self.page_size + 1]
+
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.reverse:
+            results.reverse()
+            self.has_next, self.has_previous = self.position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.position is not None
+
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, queryset):
+        ordering = list(queryset.query.order_by) or list(self.ordering)
+        if not all(isinstance(field, str) for field in ordering):
+            raise ValueError('Keyset pagination requires ordering by field names.')
+        return ordering
+
+    @staticmethod
+    def ordering_field(queryset, field):
+        """The model field (or annotation output field) ``queryset`` orders by."""
+        name = field.lstrip('-')
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        if name == 'pk':
+            return queryset.model._meta.pk
+        return queryset.model._meta.get_field(name)
+
+    def get_position(self, obj):
+        return tuple(getattr(obj, field.lstrip('-')) for field in self.ordering)
+
+    @staticmethod
+    def flip(field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+    @staticmethod
+    def position_filter(ordering, position):
+        """
+        Build ``(f1, f2, ...) > (v1, v2, ...)`` for the given ordering.
+
+        The leading ``f1 >= v1`` term lets the database seek straight to
+        the position with an index range scan.
+        """
+        conditions = []
+        for i, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition = Q(**{f'{name}__{lookup}': position[i]})
+            for previous, value in zip(ordering[:i], position[:i]):
+                condition &= Q(**{previous.lstrip('-'): value})
+            conditions.append(condition)
+
+        first = ordering[0].lstrip('-')
+        seek = 'lte' if ordering[0].startswith('-') else 'gte'
+        return Q(**{f'{first}__{seek}': position[0]}) & reduce(or_, conditions)
+
+    def encode_cursor(self, position, reverse=False):
+        values = [
+            value.isoformat() if isinstance(value, datetime.datetime) else value
+            for value in position
+        ]
+        data = json.dumps({'p': values, 'r': int(reverse)}, separators=(',', ':'))
+        cursor = base64.urlsafe_b64encode(data.encode()).decode()
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request, queryset):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        return self.parse_cursor(cursor, queryset)
+
+    def parse_cursor(self, cursor, queryset):
+        """
+        Return the ``(position, reverse)`` pair stored in an opaque cursor
+        for the ordering of ``queryset``, with each value converted by the
+        field it is compared to.
+        """
+        ordering = self.get_ordering(queryset)
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            values, reverse = data['p'], bool(data['r'])
+            if not isinstance(values, list) or len(values) != len(ordering):
+                raise ValueError(cursor)
+            position = []
+            for field, value in zip(ordering, values):
+                if value is None or isinstance(value, (dict, list)):
+                    raise ValueError(cursor)
+                position.append(self.ordering_field(queryset, field).to_python(value))
+        except (binascii.Error, TypeError, ValueError, KeyError, ValidationError, FieldDoesNotExist):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.get_position(self.page[-1]))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.get_position(self.page[0]), reverse=True)
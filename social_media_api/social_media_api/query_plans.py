@@ -0,0 +1,78 @@
+"""
+Query plan checks for the test suite.
+
+``QueryPlanAssertions.assertIndexedQueries()`` records every query run in
+its block, asks SQLite for each one's ``EXPLAIN QUERY PLAN`` and fails if
+any step reads a whole table or sorts rows in a temporary B-tree. Scanning
+an index in order (``SCAN ... USING INDEX``) is allowed: with a ``LIMIT``
+it stops after one page. Other databases skip the check.
+"""
+import re
+import unittest
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+STATEMENTS = ('SELECT', 'UPDATE', 'DELETE', 'WITH')
+
+# A table read without an index; index, virtual table and subquery scans are fine
+TABLE_SCAN = re.compile(r'^SCAN (?!\()(?P<table>\w+)\b(?!.* USING (COVERING )?INDEX| VIRTUAL TABLE)')
+TEMP_SORT = re.compile(r'^USE TEMP B-TREE FOR (?P<clause>.+)')
+
+
+def explain(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def problems(plan, allow=(), allow_sort=False):
+    """The steps of ``plan`` that scan a table (not in ``allow``) or sort."""
+    found = []
+    for step in plan:
+        scan = TABLE_SCAN.match(step)
+        if (scan and scan['table'] not in allow) or (TEMP_SORT.match(step) and not allow_sort):
+            found.append(step)
+    return found
+
+
+class QueryPlanAssertions:
+
+    def assertIndexedQueries(self, allow=(), allow_sort=False):
+        """
+        Fail if a query in the block scans a table or sorts without an index.
+        ``allow`` names tables that are small enough to scan; ``allow_sort``
+        accepts sorts on computed values, such as search relevance.
+        """
+        return _IndexedQueriesContext(self, allow, allow_sort)
+
+
+class _IndexedQueriesContext(CaptureQueriesContext):
+
+    def __init__(self, test_case, allow, allow_sort):
+        super().__init__(connection)
+        self.test_case = test_case
+        self.allow = allow
+        self.allow_sort = allow_sort
+
+    def __enter__(self):
+        if connection.vendor != 'sqlite':
+            raise unittest.SkipTest('Query plans are checked on SQLite only')
+        return super().__enter__()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        super().__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            return
+        failures = []
+        for query in self.captured_queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith(STATEMENTS):
+                continue
+            found = problems(explain(sql), self.allow, self.allow_sort)
+            if found:
+                failures.append(f'{sql}\n    ' + '\n    '.join(found))
+        if failures:
+            self.test_case.fail(
+                f'{len(failures)} queries are not served by an index:\n\n' + '\n\n'.join(failures)
+            )
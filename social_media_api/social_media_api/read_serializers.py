@@ -0,0 +1,133 @@
+"""
+Read-only serializers that build list responses straight from table rows.
+
+``ModelSerializer`` builds a model instance per row and then calls one field
+object per attribute to turn it back into primitives, which dominates list
+requests once pages hold more than a few dozen items. A ``ValuesSerializer``
+selects only the columns it shows with ``values_list()`` and turns each row
+tuple into a dict in one pass, formatting only the columns that need it
+(datetimes). Its output is the same JSON as the ``ModelSerializer`` it
+mirrors (``Meta.serializer``).
+
+Views opt in with ``ValuesReadMixin`` and ``read_serializer_classes``. Only
+``list`` requests whose serializer has a mirror take this path; they skip
+the representation cache, since building a dict from a row costs less than
+fingerprinting and unpickling a cached one. ``python manage.py
+bench_serializers`` compares both paths.
+"""
+from django.utils import timezone
+
+SAFE_READS = ('GET', 'HEAD')
+
+
+def datetime_formatter():
+    """
+    Format datetimes like DRF's ``DateTimeField`` (ISO 8601, ``Z`` for UTC)
+    in the timezone active now.
+    """
+    tz = timezone.get_current_timezone()
+
+    def format_datetime(value):
+        value = value.astimezone(tz).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+
+    return format_datetime
+
+
+class ValuesSerializer:
+    """
+    Serialize ``values_list()`` rows made by ``rows()``.
+
+    ``columns`` maps each output field, in output order, to the lookup it is
+    read from; fields whose lookup is ``None`` are filled in by
+    ``complete()``. ``formatters`` maps fields to factories returning the
+    function applied to their non-null values.
+    """
+    columns = {}
+    formatters = {}
+    # Lookups selected after the output columns for complete()
+    extra = ()
+
+    class Meta:
+        serializer = None
+
+    def __init__(self, instance=None, many=True, fields=None, context=None):
+        self.instance = instance
+        self.fields = {name: None for name in self.columns if fields is None or name in fields}
+        self.context = context or {}
+
+    def rows(self, queryset):
+        """The rows of ``queryset`` to serialize, including its ordering."""
+        lookups = [self.columns[name] for name in self.fields if self.columns[name]]
+        lookups += [lookup for lookup in self.extra if lookup not in lookups]
+        for field in queryset.query.order_by:
+            # Read as row attributes by the keyset paginator
+            if isinstance(field, str) and field.lstrip('-') not in lookups:
+                lookups.append(field.lstrip('-'))
+        # Related objects are read as columns instead
+        return queryset.prefetch_related(None).values_list(*lookups, named=True)
+
+    @property
+    def data(self):
+        selected = [name for name in self.fields if self.columns[name]]
+        formatted = [
+            (name, factory()) for name, factory in self.formatters.items() if name in self.fields
+        ]
+        if len(selected) == len(self.fields):
+            items = [dict(zip(selected, row)) for row in self.instance]
+        else:
+            # Keep computed fields in their place
+            items = []
+            for row in self.instance:
+                item = self.fields.copy()
+                item.update(zip(selected, row))
+                items.append(item)
+
+        for item in items:
+            for name, format_value in formatted:
+                value = item[name]
+                if value is not None:
+                    item[name] = format_value(value)
+        self.complete(items, self.instance)
+        return items
+
+    def complete(self, items, rows):
+        """Fill in the computed fields of ``items`` from their ``rows``."""
+
+
+class ValuesReadMixin:
+    """
+    Serialize ``list`` responses with the ``ValuesSerializer`` in
+    ``read_serializer_classes`` that mirrors the view's serializer, if any.
+    """
+    read_serializer_classes = ()
+
+    def reads_values(self):
+        if self.request is None or self.request.method not in SAFE_READS:
+            return False
+        return getattr(self, 'action', 'list') == 'list'
+
+    def get_serializer_class(self, *args, **kwargs):
+        serializer_class = super().get_serializer_class(*args, **kwargs)
+        if self.reads_values():
+            for read_class in self.read_serializer_classes:
+                if read_class.Meta.serializer is serializer_class:
+                    return read_class
+        return serializer_class
+
+    def uses_values(self):
+        return issubclass(self.get_serializer_class(), ValuesSerializer)
+
+    def use_cache(self):
+        return not self.uses_values() and super().use_cache()
+
+    def filter_queryset(self, queryset):
+        querysets = super().filter_queryset(queryset)
+        if not self.uses_values():
+            return querysets
+        serializer = self.get_serializer(many=True)
+        if isinstance(querysets, (list, tuple)):
+            return [serializer.rows(queryset) for queryset in querysets]
+        return serializer.rows(querysets)
@@ -0,0 +1,68 @@
+"""
+JSON rendering for API responses.
+
+``FastJSONRenderer`` encodes with ``orjson`` when it is installed, which is
+several times faster than the standard library on large lists, and falls
+back to DRF's own encoding otherwise (and for pretty-printed output). Both
+produce the same bytes for the data the serializers return; one difference
+is that ``orjson`` writes ``NaN`` as ``null`` where the standard library
+refuses it.
+
+``stream()`` writes a JSON array chunk by chunk from an iterator of lists,
+so a long list can be sent with ``StreamingHttpResponse`` without building
+the whole body in memory.
+"""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Escaped by DRF so the output is also valid JavaScript
+LINE_SEPARATORS = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+
+
+class FastJSONRenderer(JSONRenderer):
+
+    def __init__(self):
+        self.default = self.encoder_class().default
+
+    def uses_orjson(self, indent):
+        # orjson always writes compact UTF-8
+        return orjson is not None and indent is None and self.compact and not self.ensure_ascii
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if not self.uses_orjson(indent):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            # Datetimes go through DRF's encoder, which formats them differently
+            ret = orjson.dumps(
+                data,
+                default=self.default,
+                option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+            )
+        except TypeError:
+            # orjson.JSONEncodeError, e.g. for integers wider than 64 bits
+            return super().render(data, accepted_media_type, renderer_context)
+        for separator, escaped in LINE_SEPARATORS:
+            if separator in ret:
+                ret = ret.replace(separator, escaped)
+        return ret
+
+    def stream(self, chunks):
+        """Yield a JSON array of the items of each list in ``chunks``."""
+        yield b'['
+        first = True
+        for chunk in chunks:
+            if not chunk:
+                continue
+            # Render the chunk as an array and drop its brackets
+            items = self.render(chunk)[1:-1]
+            yield items if first else b',' + items
+            first = False
+        yield b']'
@@ -1,3 +1,4 @@
+from datetime import timedelta
 from pathlib import Path
 import os
 
@@ -38,6 +39,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'social_media_api.throttling.RateLimitHeadersMiddleware',
 ]
 
 
@@ -99,20 +101,120 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Profile picture variants (accounts/images.py)
+PROFILE_PICTURE_SIZES = {'small': 64, 'medium': 256, 'large': 512}
+PROFILE_PICTURE_WORKERS = 2
+PROFILE_PICTURE_INLINE = False
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+if os.environ.get('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+
+# Serialized post/comment representations (posts/caching.py)
+POSTS_CACHE_TIMEOUT = 600
+# Newest comments embedded in GET /api/posts/{id}/
+POSTS_COMMENT_PREVIEW_SIZE = 3
+
+# Length of post snippets in ?view=compact lists (posts/fieldsets.py)
+POSTS_SNIPPET_LENGTH = 200
+
+# Follow graph adjacency lists (accounts/graph.py)
+GRAPH_CACHE_TIMEOUT = 3600
+GRAPH_SUGGESTION_SAMPLE = 500
+
+# Streaming data export (social_media_api/export.py)
+EXPORT_CHUNK_SIZE = 2000
+
 # Production storage placeholder (e.g. AWS S3)
 DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'accounts.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    # orjson when installed (social_media_api/renderers.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'social_media_api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'social_media_api.pagination.KeysetPagination',
     'PAGE_SIZE': 10,
+    # Sliding window rate limits per scope (social_media_api/throttling.py)
+    'DEFAULT_THROTTLE_CLASSES': [
+        'social_media_api.throttling.AuthRateThrottle',
+        'social_media_api.throttling.WriteRateThrottle',
+        'social_media_api.throttling.SearchRateThrottle',
+        'social_media_api.throttling.FeedRateThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'auth': '20/min',
+        'write': '120/min',
+        'search': '60/min',
+        'feed': '300/min',
+    },
+}
+
+# Token authentication cache (accounts/authentication.py)
+AUTH_TOKEN_CACHE_SIZE = 10000
+AUTH_TOKEN_CACHE_TTL = 60
+
+# Stateless JWT authentication (accounts/tokens.py). 'token' or 'jwt'; in
+# jwt mode login and registration issue access/refresh pairs and
+# existing DRF tokens keep working.
+AUTH_MODE = os.environ.get('AUTH_MODE', 'token')
+if AUTH_MODE == 'jwt':
+    REST_FRAMEWORK['DEFAULT_AUTHENTICATION_CLASSES'].insert(
+        0, 'accounts.tokens.StatelessJWTAuthentication'
+    )
+AUTH_REVOCATION_REFRESH = 10
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=15),
+    'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
+    'TOKEN_REFRESH_SERIALIZER': 'accounts.tokens.RevocableTokenRefreshSerializer',
 }
 
+# Home timelines (posts/timeline.py)
+TIMELINE_FANOUT_THRESHOLD = 10000
+# Followers below the threshold before demote_authors fans an author out again
+TIMELINE_DEMOTE_MARGIN = 1000
+TIMELINE_BACKFILL_SIZE = 200
+TIMELINE_MAX_LENGTH = 800
+# Rows read and rendered at a time by GET /api/feed/?stream=true
+TIMELINE_STREAM_CHUNK_SIZE = 500
+
+# Trending posts (posts/trending.py). Changing the half-life needs a
+# recompute_trending run.
+TRENDING_HALF_LIFE = 43200
+TRENDING_WINDOW = 432000
+TRENDING_SIZE = 100
+TRENDING_REFRESH = 30
+
+# Notification pipeline (notifications/pipeline.py): 'memory' or 'database'
+NOTIFICATIONS_QUEUE = os.environ.get('NOTIFICATIONS_QUEUE', 'memory')
+NOTIFICATIONS_COALESCE_WINDOW = 3600
+# Recent actors remembered per notification so repeat actions are not recounted
+NOTIFICATIONS_MAX_ACTOR_IDS = 100
+NOTIFICATIONS_UNREAD_CACHE_TIMEOUT = 300
+
+# Live notification stream (notifications/broker.py)
+NOTIFICATIONS_BROKER = os.environ.get(
+    'NOTIFICATIONS_BROKER', 'notifications.broker.MemoryBroker'
+)
+NOTIFICATIONS_STREAM_KEEPALIVE = 15
+NOTIFICATIONS_STREAM_BACKLOG = 100
+NOTIFICATIONS_STREAM_QUEUE_SIZE = 100
+
 
 SECURE_BROWSER_XSS_FILTER = True
 SECURE_CONTENT_TYPE_NOSNIFF = True
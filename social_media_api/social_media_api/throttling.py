@@ -0,0 +1,198 @@
+"""
+Per-scope rate limits backed by the shared cache.
+
+Each throttle counts requests with a sliding window counter: one counter
+per client per fixed window, with the previous window's count weighted by
+how much of it still overlaps the sliding window. The current counter is
+bumped with the cache's atomic ``incr`` (so every worker sharing
+``REDIS_URL`` sees the same count), and the previous window's count is
+memoized in-process once the window has closed, which leaves a single
+cache operation per throttled request. Nothing is written to the database.
+
+Scopes and their rates (``DEFAULT_THROTTLE_RATES``):
+
+* ``auth``: login and registration, per client IP.
+* ``write``: every other unsafe request, per user.
+* ``search``: requests with a ``search`` query, per user.
+* ``feed``: home feed reads, per user.
+
+Views opt into the ``auth`` and ``feed`` scopes with ``throttle_scope``.
+``RateLimitHeadersMiddleware`` reports the tightest applicable limit as
+``X-RateLimit-Limit``, ``X-RateLimit-Remaining`` and ``X-RateLimit-Reset``
+(seconds until the client regains a request).
+"""
+import math
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.cache import cache
+from rest_framework.exceptions import Throttled
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+DURATIONS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def increment(key, timeout):
+    """Atomically add one to ``key``, creating it if needed."""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        if cache.add(key, 1, timeout):
+            return 1
+        return cache.incr(key)
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    scope = None
+    timer = time.time
+
+    # Counts of each scope's last closed window, which no longer change:
+    # {scope: (window, {cache key: count})}
+    _closed = {}
+
+    def applies(self, request, view):
+        raise NotImplementedError
+
+    def get_rate(self):
+        # Read per request so changes to REST_FRAMEWORK take effect
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+        if rate is None:
+            return None
+        num, period = rate.split('/')
+        return int(num), DURATIONS[period[0]]
+
+    def client(self, request):
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+    def allow_request(self, request, view):
+        rate = self.applies(request, view) and self.get_rate()
+        if not rate:
+            return True
+        self.num_requests, self.duration = rate
+
+        now = self.timer()
+        window, self.elapsed = divmod(now / self.duration, 1)
+        prefix = f'throttle:{self.scope}:{self.client(request)}:'
+        self.previous = self.closed_count(prefix, int(window))
+        key = f'{prefix}{int(window)}'
+        self.current = increment(key, math.ceil(self.duration * 2))
+
+        allowed = self.estimate() <= self.num_requests
+        if not allowed:
+            # Rejected requests do not use up the quota
+            cache.decr(key)
+            self.current -= 1
+        self.record(request)
+        return allowed
+
+    def closed_count(self, prefix, window):
+        closed, counts = self._closed.get(self.scope, (None, None))
+        if closed != window - 1:
+            # The window moved on; forget the counts of older ones
+            counts = {}
+            self._closed[self.scope] = (window - 1, counts)
+        key = f'{prefix}{window - 1}'
+        if key not in counts:
+            counts[key] = cache.get(key, 0)
+        return counts[key]
+
+    def estimate(self):
+        return self.previous * (1 - self.elapsed) + self.current
+
+    def wait(self):
+        """Seconds until one more request fits."""
+        room = self.num_requests - self.current - 1
+        if room >= 0 and self.previous:
+            # Wait for enough of the previous window to slide out
+            return max(1 - room / self.previous - self.elapsed, 0) * self.duration
+        # Wait for the next window, where this one's count is discounted
+        needed = max(1 - (self.num_requests - 1) / self.current, 0) if self.current else 0
+        return (1 - self.elapsed + needed) * self.duration
+
+    def record(self, request):
+        """Keep the tightest limit seen for the rate limit headers."""
+        remaining = max(self.num_requests - math.ceil(self.estimate()), 0)
+        status = getattr(request._request, 'rate_limit', None)
+        if status is None or remaining < status[1]:
+            reset = 0 if remaining else self.wait()
+            request._request.rate_limit = (self.num_requests, remaining, math.ceil(reset))
+
+
+def _scope(view):
+    return getattr(view, 'throttle_scope', None)
+
+
+class AuthRateThrottle(SlidingWindowThrottle):
+    scope = 'auth'
+
+    def applies(self, request, view):
+        return _scope(view) == 'auth'
+
+    def client(self, request):
+        # Per address, so a client cannot dodge the limit by switching accounts
+        return f'ip:{self.get_ident(request)}'
+
+
+class WriteRateThrottle(SlidingWindowThrottle):
+    scope = 'write'
+
+    def applies(self, request, view):
+        return request.method not in SAFE_METHODS and _scope(view) != 'auth'
+
+
+class SearchRateThrottle(SlidingWindowThrottle):
+    scope = 'search'
+
+    def applies(self, request, view):
+        return bool(request.query_params.get(api_settings.SEARCH_PARAM))
+
+
+class FeedRateThrottle(SlidingWindowThrottle):
+    scope = 'feed'
+
+    def applies(self, request, view):
+        return _scope(view) == 'feed'
+
+
+def check_throttles(request, view):
+    """``APIView.check_throttles`` for views that are not ``APIView``s."""
+    durations = [
+        throttle.wait()
+        for throttle in (throttle() for throttle in api_settings.DEFAULT_THROTTLE_CLASSES)
+        if not throttle.allow_request(request, view)
+    ]
+    if durations:
+        raise Throttled(max(durations))
+
+
+def add_headers(request, response):
+    status = getattr(request, 'rate_limit', None)
+    if status is not None:
+        limit, remaining, reset = status
+        response['X-RateLimit-Limit'] = str(limit)
+        response['X-RateLimit-Remaining'] = str(remaining)
+        response['X-RateLimit-Reset'] = str(reset)
+    return response
+
+
+class RateLimitHeadersMiddleware:
+    """Copy the limit recorded by the throttles onto the response."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return add_headers(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return add_headers(request, await self.get_response(request))